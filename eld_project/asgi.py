@@ -13,4 +13,16 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eld_project.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from version1.events import VIOLATION_STREAM_PATH, violation_stream  # noqa: E402
+from version1.jobs import start_sync_scheduler  # noqa: E402
+
+start_sync_scheduler()
+
+
+async def application(scope, receive, send):
+    # The violation stream is a long-lived response, served outside Django.
+    if scope["type"] == "http" and scope["path"] == VIOLATION_STREAM_PATH:
+        return await violation_stream(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "version1.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -75,12 +76,43 @@ WSGI_APPLICATION = "eld_project.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# DB_ENGINE selects the profile: "sqlite" (default) or "postgresql".
+DB_ENGINE = config("DB_ENGINE", default="sqlite")
+
+if DB_ENGINE == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": config("DB_NAME", default="eld"),
+            "USER": config("DB_USER", default="postgres"),
+            "PASSWORD": config("DB_PASSWORD", default=""),
+            "HOST": config("DB_HOST", default="localhost"),
+            "PORT": config("DB_PORT", default=5432, cast=int),
+            # Keep connections open between requests instead of reconnecting.
+            "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", default=600, cast=int),
+            "OPTIONS": {
+                "connect_timeout": config("DB_CONNECT_TIMEOUT", default=10, cast=int)
+            },
+        }
     }
-}
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": config("DB_NAME", default=str(BASE_DIR / "db.sqlite3")),
+            "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", default=600, cast=int),
+            # Seconds a writer waits for the lock before "database is locked".
+            "OPTIONS": {"timeout": config("SQLITE_BUSY_TIMEOUT", default=20, cast=int)},
+        }
+    }
+
+# Applied to every new SQLite connection. WAL lets reads run while the sync
+# holds its write transaction.
+SQLITE_JOURNAL_MODE = config("SQLITE_JOURNAL_MODE", default="wal")
+SQLITE_SYNCHRONOUS = config("SQLITE_SYNCHRONOUS", default="normal")
+
+# Check persistent connections before each request and drop dead ones.
+DB_CONN_HEALTH_CHECKS = config("DB_CONN_HEALTH_CHECKS", default=True, cast=bool)
 
 
 # Password validation
@@ -131,8 +163,48 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Prolog creds
 PROLOG_CLIENT_ID = config("PROLOG_CLIENT_ID", cast=str)
 PROLOG_CLIENT_SECRET = config("PROLOG_CLIENT_SECRET", cast=str)
+PROLOGS_TOKEN_URL = config(
+    "PROLOGS_TOKEN_URL", default="https://identity-stage.prologs.us/connect/token"
+)
+PROLOGS_BASE_URL = config(
+    "PROLOGS_BASE_URL", default="https://publicapi-stage.prologs.us"
+)
+PROLOGS_TOKEN_FILE = config("PROLOGS_TOKEN_FILE", default="token.json")
+# Pages of a collection fetched at once by the syncs, 0 streams each
+# collection in a single request instead
+PROLOGS_PAGE_CONCURRENCY = config("PROLOGS_PAGE_CONCURRENCY", default=0, cast=int)
+PROLOGS_PAGE_SIZE = config("PROLOGS_PAGE_SIZE", default=1000, cast=int)
 
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "rest_framework.schemas.coreapi.AutoSchema"
 }
+
+
+# Worker processes for batch HOS violation checks, 0 uses every CPU
+HOS_BATCH_WORKERS = config("HOS_BATCH_WORKERS", default=0, cast=int)
+
+# Days of truck position history kept by the sync, 0 keeps everything
+TRUCK_POSITION_RETENTION_DAYS = config(
+    "TRUCK_POSITION_RETENTION_DAYS", default=30, cast=int
+)
+
+# Seconds a rendered read response is kept for its sync generation
+SYNC_CACHE_TIMEOUT = config("SYNC_CACHE_TIMEOUT", default=300, cast=int)
+
+# Seconds between background syncs of trucks and drivers, 0 disables them
+SYNC_INTERVAL = config("SYNC_INTERVAL", default=0, cast=int)
+# Seconds without a heartbeat after which a queued or running sync job is
+# considered dead; jobs beat every 30 seconds while their process is alive
+SYNC_JOB_TIMEOUT = config("SYNC_JOB_TIMEOUT", default=300, cast=int)
+
+# Rows per INSERT ... ON CONFLICT statement written by the sync
+SYNC_UPSERT_BATCH_SIZE = config("SYNC_UPSERT_BATCH_SIZE", default=500, cast=int)
+# Chunks with at least this many changed rows are loaded through COPY on
+# PostgreSQL, 0 disables it
+SYNC_COPY_MIN_ROWS = config("SYNC_COPY_MIN_ROWS", default=200, cast=int)
+
+# Directory of the memory-mapped fleet snapshots published after each sync
+# and served by the list, detail and violation endpoints. Off by default; set
+# it to a directory outside the source tree to enable them
+FLEET_SNAPSHOT_DIR = config("FLEET_SNAPSHOT_DIR", default="")
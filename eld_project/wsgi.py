@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'eld_project.settings')
 
 application = get_wsgi_application()
+
+from version1.jobs import start_sync_scheduler  # noqa: E402
+
+start_sync_scheduler()
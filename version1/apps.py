@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
 
 
 class Version1Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'version1'
+
+    def ready(self):
+        from version1.db import check_connection_health, configure_sqlite
+
+        connection_created.connect(configure_sqlite)
+        request_started.connect(check_connection_health)
@@ -0,0 +1,377 @@
+"""
+Benchmarks of the HOS, planner, sync and list paths over a seeded synthetic
+fleet.
+
+Each case runs once for wall time and query count and, unless memory
+tracking is off, a second time under tracemalloc for peak memory, with its
+setup repeated untimed before each run. Results are plain dicts so runs can
+be saved as JSON and compared with ``compare_results``.
+"""
+import gc
+import platform
+import random
+import subprocess
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.test import APIClient
+from version1.models import Driver, Truck
+from version1.prologs_stub import PrologsStubServer, generate_drivers, generate_trucks
+from version1.utils import (
+    _plan_schedule_offsets,
+    check_fleet_hos_compliance,
+    check_hos_violation,
+    db_update_drivers,
+    db_update_trucks,
+    plan_driving_schedule,
+)
+
+DUTY_STATUSES = ["D", "ODND", "OFF", "SB"]
+
+
+def generate_duty_log(entries: int, seed: int = 0, start: datetime = None) -> dict:
+    """
+    A check_hos_violation payload with ``entries`` consecutive duty statuses
+    of random status and length, timestamps as ISO-8601 strings.
+    """
+    rng = random.Random(seed)
+    pickup_time = start = start or datetime(2024, 1, 1, tzinfo=timezone.utc)
+    duty_statuses = []
+
+    for _ in range(entries):
+        end = start + timedelta(minutes=rng.randint(15, 600))
+        duty_statuses.append(
+            {
+                "status": rng.choice(DUTY_STATUSES),
+                "start_time": start.isoformat().replace("+00:00", "Z"),
+                "end_time": end.isoformat().replace("+00:00", "Z"),
+            }
+        )
+        start = end
+
+    return {
+        "pickup_time": pickup_time,
+        "dropoff_time": start,
+        "truck_type": "property",
+        "duty_statuses": duty_statuses,
+    }
+
+
+def generate_schedule_requests(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    pickup = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    requests = []
+
+    for _ in range(count):
+        pickup += timedelta(minutes=rng.randint(0, 240))
+        requests.append(
+            {
+                "pickup_time": pickup,
+                "dropoff_time": pickup + timedelta(minutes=rng.randint(60, 4320)),
+                "loading_time": rng.choice([0, 30, 60, 120]),
+                "truck_type": rng.choice(["property", "passenger"]),
+            }
+        )
+
+    return requests
+
+
+class Case:
+    def __init__(self, name, size, run, setup=None, **params):
+        self.name = name
+        self.size = size
+        self.run = run
+        self.setup = setup
+        self.params = params
+
+
+def measure(case: Case, track_memory: bool = True) -> dict:
+    """
+    Time one case and count its queries, then rerun it under tracemalloc
+    for its peak memory.
+    """
+    queries = [0]
+
+    def count_query(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    if case.setup:
+        case.setup()
+    gc.collect()
+    with connection.execute_wrapper(count_query):
+        started = time.perf_counter()
+        case.run()
+        seconds = time.perf_counter() - started
+
+    peak_memory = None
+    if track_memory:
+        if case.setup:
+            case.setup()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            case.run()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "name": case.name,
+        "size": case.size,
+        "params": case.params,
+        "seconds": round(seconds, 6),
+        "per_item_us": round(seconds / max(case.size, 1) * 1e6, 3),
+        "queries": queries[0],
+        "peak_memory_bytes": peak_memory,
+    }
+
+
+def hos_violation_cases(log_entries):
+    for entries in log_entries:
+        payload = generate_duty_log(entries)
+        yield Case(
+            "check_hos_violation",
+            entries,
+            lambda payload=payload: check_hos_violation(**payload),
+        )
+
+
+def planner_cases(count):
+    requests = generate_schedule_requests(count)
+
+    def plan_all():
+        for request in requests:
+            plan_driving_schedule(**request)
+
+    yield Case(
+        "plan_driving_schedule",
+        count,
+        plan_all,
+        setup=_plan_schedule_offsets.cache_clear,
+        cache="cold",
+    )
+    yield Case("plan_driving_schedule", count, plan_all, cache="warm")
+
+
+def checked(sync):
+    """
+    Run a db_update_* function, failing the benchmark instead of timing a
+    sync that returned False.
+    """
+
+    def run():
+        result = sync()
+        assert result, f"{sync.__name__} failed"
+        return result
+
+    run.__name__ = sync.__name__
+    return run
+
+
+def sync_cases(server, size, seed):
+    """
+    Syncs against canned ProLogs payloads: a first load into empty tables, a
+    resync where nothing changed and one where every driver changed.
+    """
+    trucks = generate_trucks(size, seed=seed)
+    drivers = generate_drivers(size, truck_count=size, seed=seed)
+    changed_drivers = generate_drivers(size, truck_count=size, seed=seed + 1)
+
+    def serve(truck_records, driver_records):
+        server.collections["/api/v1/trucks"] = truck_records
+        server.collections["/api/v1/drivers"] = driver_records
+
+    def empty_tables():
+        serve(trucks, drivers)
+        Driver.objects.all().delete()
+        Truck.objects.all().delete()
+
+    update_trucks = checked(db_update_trucks)
+    update_drivers = checked(db_update_drivers)
+
+    def load_trucks():
+        empty_tables()
+        update_trucks()
+
+    def changed():
+        serve(trucks, drivers)
+        update_drivers()
+        serve(trucks, changed_drivers)
+
+    yield Case(
+        "db_update_trucks", size, update_trucks, setup=empty_tables, state="empty"
+    )
+    yield Case("db_update_trucks", size, update_trucks, state="unchanged")
+    yield Case(
+        "db_update_drivers", size, update_drivers, setup=load_trucks, state="empty"
+    )
+    yield Case("db_update_drivers", size, update_drivers, state="unchanged")
+    yield Case(
+        "db_update_drivers", size, update_drivers, setup=changed, state="changed"
+    )
+
+
+def load_fleet(server, size, seed):
+    Driver.objects.all().delete()
+    Truck.objects.all().delete()
+    server.collections["/api/v1/trucks"] = generate_trucks(size, seed=seed)
+    server.collections["/api/v1/drivers"] = generate_drivers(
+        size, truck_count=size, seed=seed
+    )
+    checked(db_update_trucks)()
+    checked(db_update_drivers)()
+
+
+def fleet_cases(size):
+    """
+    Reads over the fleet left in the database by the sync cases.
+    """
+    client = APIClient()
+
+    def get(path):
+        def run():
+            response = client.get(path)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            assert response.status_code == 200, response.status_code
+
+        return run
+
+    yield Case("check_fleet_hos_compliance", size, check_fleet_hos_compliance)
+    for view in ["trucks", "drivers"]:
+        for label, path in [
+            ("full", f"/api/v1/{view}/"),
+            ("page", f"/api/v1/{view}/?page_size=100&cursor={size // 2}"),
+            ("stream", f"/api/v1/{view}/?stream=true"),
+        ]:
+            yield Case(
+                f"list_{view}", size, get(path), setup=cache.clear, mode=label
+            )
+
+
+def run_benchmarks(
+    sizes, log_entries, suites, seed=0, track_memory=True, report=None
+) -> dict:
+    """
+    Run the selected suites and return the results with run metadata.
+
+    :param suites: names out of "hos", "planner", "sync" and "fleet"; the
+        fleet suite reads the data loaded by the sync suite
+    :param report: optional callable receiving each result as it completes
+    """
+    results = []
+
+    def run(cases):
+        for case in cases:
+            result = measure(case, track_memory)
+            results.append(result)
+            if report is not None:
+                report(result)
+
+    if "hos" in suites:
+        run(hos_violation_cases(log_entries))
+    if "planner" in suites:
+        for size in sizes:
+            run(planner_cases(size))
+
+    if "sync" in suites or "fleet" in suites:
+        server = PrologsStubServer()
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        stub_settings = {
+            "PROLOGS_BASE_URL": server.base_url,
+            "PROLOGS_TOKEN_URL": server.token_url,
+            # Never persist the stub's token over the real one.
+            "PROLOGS_TOKEN_FILE": None,
+        }
+        saved_settings = {name: getattr(settings, name) for name in stub_settings}
+        for name, value in stub_settings.items():
+            setattr(settings, name, value)
+        try:
+            for size in sizes:
+                if "sync" in suites:
+                    run(sync_cases(server, size, seed))
+                else:
+                    load_fleet(server, size, seed)
+                if "fleet" in suites:
+                    run(fleet_cases(size))
+        finally:
+            for name, value in saved_settings.items():
+                setattr(settings, name, value)
+            server.shutdown()
+            server.server_close()
+            server_thread.join()
+
+    return {"meta": run_metadata(seed, track_memory), "results": results}
+
+
+def run_metadata(seed, track_memory) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+
+    return {
+        "commit": commit or None,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": connection.vendor,
+        "seed": seed,
+        "track_memory": track_memory,
+    }
+
+
+def _result_key(result) -> tuple:
+    return (
+        result["name"],
+        result["size"],
+        tuple(sorted(result["params"].items())),
+    )
+
+
+def compare_results(baseline: dict, current: dict, threshold: float = 1.2) -> list:
+    """
+    Match the results of two runs by case and report how time, queries and
+    peak memory moved.
+
+    :param threshold: ratio above which a slower or larger result counts as
+        a regression
+    :return: list of dicts with the two values and ratio per metric and a
+        ``regressed`` flag
+    """
+    previous = {_result_key(result): result for result in baseline["results"]}
+    comparisons = []
+
+    for result in current["results"]:
+        before = previous.get(_result_key(result))
+        if before is None:
+            continue
+
+        comparison = {
+            "name": result["name"],
+            "size": result["size"],
+            "params": result["params"],
+            "regressed": False,
+        }
+        for metric in ("seconds", "queries", "peak_memory_bytes"):
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            ratio = new / old if old else (1.0 if not new else float("inf"))
+            comparison[metric] = {"before": old, "after": new, "ratio": round(ratio, 3)}
+            if ratio > threshold:
+                comparison["regressed"] = True
+        comparisons.append(comparison)
+
+    return comparisons
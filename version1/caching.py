@@ -0,0 +1,89 @@
+"""
+HTTP caching of read endpoints keyed on the sync generation.
+
+The synced tables only change when a sync runs, so a response stays valid
+for as long as the sync generation it was rendered at. Rendered bodies are
+kept in the Django cache under a key that includes the generation, which
+invalidates them all at once when the next sync bumps it.
+
+Views reading from the fleet snapshot take the generation from the snapshot
+instead, so that answering them does not touch the database at all.
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from version1.snapshot import get_fleet_snapshot
+from version1.utils import current_sync_generation
+
+
+def sync_generation_etag(generation: int, path: str) -> str:
+    return quote_etag(f"sync-{generation}-{path}")
+
+
+class SyncGenerationCacheMixin:
+    """
+    APIView mixin answering GET requests from the sync generation.
+
+    The ETag is given per URL and media type, and only with a 200, so clients
+    sending it back in ``If-None-Match`` get a 304 for the resource they
+    already hold, and a missing resource still gets its 404. Others get the
+    rendered body from the cache when another client already asked for the
+    same URL and media type in this generation.
+
+    Responses are shared between all clients, so the mixin only belongs on
+    views whose output does not depend on who is asking.
+
+    Views setting ``use_fleet_snapshot`` find the published FleetSnapshot, or
+    None, in ``self.snapshot`` and are answered at its generation. Those that
+    answer only some requests from it override ``wants_fleet_snapshot``.
+    """
+
+    use_fleet_snapshot = False
+    snapshot = None
+
+    def wants_fleet_snapshot(self, request) -> bool:
+        return self.use_fleet_snapshot
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != "GET":
+            return super().dispatch(request, *args, **kwargs)
+
+        if self.wants_fleet_snapshot(request):
+            self.snapshot = get_fleet_snapshot()
+        if self.snapshot is not None:
+            generation = self.snapshot.generation
+        else:
+            generation = current_sync_generation()
+        path = hashlib.blake2b(
+            f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}".encode(),
+            digest_size=16,
+        ).hexdigest()
+        etag = sync_generation_etag(generation, path)
+
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
+        key = f"version1:sync:{generation}:{path}"
+
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            if not response.streaming:
+                response.render()
+                cache.set(
+                    key,
+                    (response.content, response["Content-Type"]),
+                    settings.SYNC_CACHE_TIMEOUT,
+                )
+
+        response["ETag"] = etag
+        return response
@@ -0,0 +1,38 @@
+"""
+Per-connection database setup for the profiles configured in settings.
+"""
+from django.conf import settings
+from django.db import connections
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Switch new SQLite connections to the configured journal mode and
+    synchronous level. Under WAL readers see the last committed data while
+    a sync writes, and NORMAL only syncs to disk at checkpoints.
+    """
+    if connection.vendor != "sqlite":
+        return
+
+    with connection.cursor() as cursor:
+        if settings.SQLITE_JOURNAL_MODE:
+            cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        if settings.SQLITE_SYNCHRONOUS:
+            cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+
+
+def check_connection_health(**kwargs):
+    """
+    Close persistent connections that stopped working, for example after a
+    database restart, so the request opens a fresh one instead of failing.
+    """
+    if not settings.DB_CONN_HEALTH_CHECKS:
+        return
+
+    for connection in connections.all():
+        if (
+            connection.connection is not None
+            and not connection.in_atomic_block
+            and not connection.is_usable()
+        ):
+            connection.close()
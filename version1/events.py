@@ -0,0 +1,187 @@
+"""
+Server-Sent Events stream of violation changes, served as a raw ASGI app
+next to the Django application.
+
+Each sync saves the drivers whose violations appeared or cleared as a
+ViolationChangeSet. One broadcaster per process watches the sync generation
+and fans every new change set out to all connected clients, so the cost per
+sync does not depend on how many clients are listening.
+"""
+import asyncio
+import json
+import logging
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from version1.models import ViolationChangeSet
+from version1.utils import VIOLATION_CHANGE_RETENTION, current_sync_generation
+
+VIOLATION_STREAM_PATH = "/api/v1/violations/stream/"
+
+# Seconds between sync generation checks of the broadcaster.
+POLL_INTERVAL = 1.0
+
+# Longest pause, in seconds, between retries of a failing broadcaster poll.
+MAX_RETRY_INTERVAL = 30.0
+
+# Seconds between keep-alive comments on an idle stream.
+KEEPALIVE_INTERVAL = 15.0
+
+# Events buffered per client; a client falling further behind is disconnected
+# and catches up from Last-Event-ID when it reconnects.
+CLIENT_QUEUE_SIZE = 100
+
+logger = logging.getLogger(__name__)
+
+
+def encode_event(generation, changes) -> bytes:
+    data = json.dumps({"generation": generation, "changes": changes})
+    return f"id: {generation}\nevent: violations\ndata: {data}\n\n".encode()
+
+
+def _change_sets_after(generation):
+    return list(
+        ViolationChangeSet.objects.filter(generation__gt=generation)
+        .order_by("generation")
+        .values_list("generation", "changes")
+    )
+
+
+class ViolationBroadcaster:
+    """
+    Polls the sync generation while clients are connected and pushes the
+    encoded change sets of new generations to every client queue.
+    """
+
+    def __init__(self):
+        self.clients = set()
+        self.generation = None
+        self._task = None
+
+    async def subscribe(self) -> asyncio.Queue:
+        if self._task is None or self._task.done():
+            self.generation = await sync_to_async(current_sync_generation)()
+            self._task = asyncio.ensure_future(self._run())
+        queue = asyncio.Queue()
+        self.clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.clients.discard(queue)
+
+    async def _run(self):
+        delay = POLL_INTERVAL
+        while self.clients:
+            await asyncio.sleep(delay)
+            try:
+                await self._poll()
+            except Exception:
+                # Keep serving connected clients once the database is back,
+                # dropping a connection the error may have left unusable.
+                delay = min(delay * 2, MAX_RETRY_INTERVAL)
+                logger.exception(
+                    "Violation broadcaster poll failed, retrying in %.1fs", delay
+                )
+                await sync_to_async(close_old_connections)()
+            else:
+                delay = POLL_INTERVAL
+
+    async def _poll(self):
+        generation = await sync_to_async(current_sync_generation)()
+        if generation == self.generation:
+            return
+
+        change_sets = await sync_to_async(_change_sets_after)(self.generation)
+        self.generation = generation
+        for change_set in change_sets:
+            self.publish(encode_event(*change_set))
+
+    def publish(self, event: bytes):
+        for queue in list(self.clients):
+            if queue.qsize() >= CLIENT_QUEUE_SIZE:
+                self.clients.discard(queue)
+                queue.put_nowait(None)
+            else:
+                queue.put_nowait(event)
+
+
+broadcaster = ViolationBroadcaster()
+
+
+def _last_event_id(scope):
+    for name, value in scope.get("headers", []):
+        if name == b"last-event-id":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+async def violation_stream(scope, receive, send):
+    """
+    ASGI app streaming ``violations`` events, one per sync generation that
+    changed violations. Clients reconnecting with Last-Event-ID first get the
+    change sets they missed, or a ``reset`` event when those are no longer
+    stored and the full list has to be fetched again.
+    """
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        }
+    )
+
+    queue = await broadcaster.subscribe()
+    # Generations after this one reach the client through its queue.
+    subscribed_at = broadcaster.generation
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        last_event_id = _last_event_id(scope)
+        if last_event_id is not None:
+            # Every change set after the client's is still stored.
+            if last_event_id >= subscribed_at - VIOLATION_CHANGE_RETENTION:
+                missed = await sync_to_async(_change_sets_after)(last_event_id)
+                for generation, changes in missed:
+                    if generation <= subscribed_at:
+                        await _send(send, encode_event(generation, changes))
+            else:
+                await _send(send, b"event: reset\ndata: {}\n\n")
+
+        while not disconnected.done():
+            next_event = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {next_event, disconnected},
+                timeout=KEEPALIVE_INTERVAL,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if next_event not in done:
+                next_event.cancel()
+                if not disconnected.done():
+                    await _send(send, b": keep-alive\n\n")
+                continue
+
+            event = next_event.result()
+            if event is None:
+                break
+            await _send(send, event)
+    finally:
+        broadcaster.unsubscribe(queue)
+        disconnected.cancel()
+
+    await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def _send(send, body: bytes):
+    await send({"type": "http.response.body", "body": body, "more_body": True})
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
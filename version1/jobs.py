@@ -0,0 +1,216 @@
+"""
+Background ProLogs syncs and the in-process scheduler that keeps the data
+fresh.
+
+Jobs are SyncJob rows run on a single worker thread per process, so syncs
+never hold up a request thread. A partial unique index allows one queued or
+running job per model, which merges overlapping requests across processes
+into one run. Syncs commit chunk by chunk, so progress and heartbeats are
+written to the job row as the sync goes and any process can report them.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from version1.models import ACTIVE_SYNC_JOB_STATUSES, SyncJob
+from version1.utils import db_update_all, db_update_drivers, db_update_trucks
+
+SYNC_FUNCTIONS = {
+    "trucks": db_update_trucks,
+    "drivers": db_update_drivers,
+    "all": db_update_all,
+}
+
+# Seconds between heartbeats of the running and locally queued jobs.
+HEARTBEAT_INTERVAL = 30
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+# Jobs queued on this process's executor, kept alive by its heartbeats.
+_queued_jobs = set()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="sync-job"
+            )
+        return _executor
+
+
+def _reset_executor():
+    # Worker threads, and the jobs queued on them, do not survive a fork.
+    global _executor
+    _executor = None
+    _queued_jobs.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_executor)
+
+
+def _is_stale(job) -> bool:
+    cutoff = timezone.now() - timedelta(seconds=settings.SYNC_JOB_TIMEOUT)
+    return job.heartbeat_at < cutoff
+
+
+def enqueue_sync(model: str):
+    """
+    Queue a background sync of ``model``, or join the one already queued or
+    running for it.
+
+    The active job is looked up with a plain read first, so joining a
+    running sync never waits behind the sync's writes. A job whose process
+    stopped beating for SYNC_JOB_TIMEOUT seconds is failed and replaced.
+
+    :return: (SyncJob, True if a new job was queued)
+    """
+    job = SyncJob.objects.filter(
+        model=model, status__in=ACTIVE_SYNC_JOB_STATUSES
+    ).first()
+    if job is not None and not _is_stale(job):
+        SyncJob.objects.filter(pk=job.pk).update(requests=F("requests") + 1)
+        job.requests += 1
+        return job, False
+
+    if job is not None:
+        SyncJob.objects.filter(
+            pk=job.pk,
+            status__in=ACTIVE_SYNC_JOB_STATUSES,
+            heartbeat_at=job.heartbeat_at,
+        ).update(status="failed", error="Timed out", finished_at=timezone.now())
+
+    try:
+        with transaction.atomic():
+            job = SyncJob.objects.create(model=model)
+    except IntegrityError:
+        # Another request queued one in between; join it.
+        return enqueue_sync(model)
+
+    _queued_jobs.add(job.pk)
+    _get_executor().submit(run_sync_job, job.pk)
+    return job, True
+
+
+def _beat(pks):
+    SyncJob.objects.filter(
+        pk__in=pks, status__in=ACTIVE_SYNC_JOB_STATUSES
+    ).update(heartbeat_at=timezone.now())
+
+
+def _heartbeat(pk, stopped: threading.Event):
+    """
+    Refresh the heartbeat of the running job and of the jobs queued behind
+    it until ``stopped`` is set.
+    """
+    try:
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                _beat([pk, *_queued_jobs])
+            except Exception:
+                logger.exception("Heartbeat of sync job %s failed", pk)
+    finally:
+        connection.close()
+
+
+def run_sync_job(pk):
+    """
+    Run a queued SyncJob, recording per-phase counts and elapsed time as
+    progress and the final counts or failure on the job.
+
+    Final states are only written while the job is still running, so a job
+    failed as stale never has its status overwritten.
+    """
+    _queued_jobs.discard(pk)
+    started = time.monotonic()
+    stopped = threading.Event()
+    try:
+        if not SyncJob.objects.filter(pk=pk, status="queued").update(
+            status="running", started_at=timezone.now(), heartbeat_at=timezone.now()
+        ):
+            return
+        job = SyncJob.objects.get(pk=pk)
+        threading.Thread(
+            target=_heartbeat,
+            args=(pk, stopped),
+            name=f"sync-job-heartbeat-{pk}",
+            daemon=True,
+        ).start()
+        running = SyncJob.objects.filter(pk=pk, status="running")
+        phases = {}
+
+        def progress(phase, counts):
+            phases[phase] = {
+                **counts,
+                "elapsed_seconds": round(time.monotonic() - started, 3),
+            }
+            running.update(progress=phases, heartbeat_at=timezone.now())
+
+        result = SYNC_FUNCTIONS[job.model](progress=progress)
+        if result is False:
+            running.update(
+                status="failed",
+                error="Sync failed, see the server log",
+                finished_at=timezone.now(),
+            )
+        else:
+            running.update(
+                status="succeeded", result=result, finished_at=timezone.now()
+            )
+    except Exception as ex:
+        logger.exception("Sync job %s failed", pk)
+        SyncJob.objects.filter(pk=pk, status="running").update(
+            status="failed", error=str(ex), finished_at=timezone.now()
+        )
+    finally:
+        stopped.set()
+        close_old_connections()
+
+
+def schedule_due_syncs(interval: int):
+    """
+    Queue an ``all`` sync unless one was requested within the interval.
+    Every process runs the scheduler; the check and the one-active-job
+    constraint keep them from syncing more often than that.
+    """
+    cutoff = timezone.now() - timedelta(seconds=interval)
+    if not SyncJob.objects.filter(model="all", created_at__gte=cutoff).exists():
+        enqueue_sync("all")
+
+
+_scheduler = None
+
+
+def start_sync_scheduler(interval=None):
+    """
+    Start a daemon thread queueing syncs every ``interval`` seconds
+    (settings.SYNC_INTERVAL, 0 disables it). Safe to call more than once.
+    """
+    global _scheduler
+    interval = settings.SYNC_INTERVAL if interval is None else interval
+    if not interval or (_scheduler is not None and _scheduler.is_alive()):
+        return None
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                schedule_due_syncs(interval)
+            except Exception:
+                logger.exception("Sync scheduler failed")
+            finally:
+                close_old_connections()
+
+    _scheduler = threading.Thread(target=run, name="sync-scheduler", daemon=True)
+    _scheduler.start()
+    return _scheduler
@@ -0,0 +1,120 @@
+import json
+import tempfile
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from version1.benchmarks import compare_results, run_benchmarks
+
+SUITES = ["hos", "planner", "sync", "fleet"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the HOS, planner, sync and list paths over a synthetic fleet "
+        "in a throwaway test database"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[1000, 10000],
+            help="Fleet sizes (drivers and trucks) to benchmark, up to 1000000",
+        )
+        parser.add_argument(
+            "--log-entries",
+            type=int,
+            nargs="+",
+            default=[100, 1000, 10000],
+            help="Duty status log lengths for check_hos_violation",
+        )
+        parser.add_argument(
+            "--suites", nargs="+", choices=SUITES, default=SUITES
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--no-memory",
+            action="store_true",
+            help="Skip the tracemalloc pass that records peak memory",
+        )
+        parser.add_argument("--output", help="Write the results to this JSON file")
+        parser.add_argument(
+            "--compare", help="JSON results of an earlier run to compare against"
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=1.2,
+            help="Ratio over the earlier run that counts as a regression",
+        )
+
+    def handle(self, *args, **kwargs):
+        baseline = None
+        if kwargs["compare"]:
+            with open(kwargs["compare"]) as f:
+                baseline = json.load(f)
+
+        # Never write the synthetic fleet into the real database or snapshots.
+        # The test environment also lets the API client's host through.
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        snapshot_dir = settings.FLEET_SNAPSHOT_DIR
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                if snapshot_dir:
+                    settings.FLEET_SNAPSHOT_DIR = tmp_dir
+                results = run_benchmarks(
+                    kwargs["sizes"],
+                    kwargs["log_entries"],
+                    kwargs["suites"],
+                    seed=kwargs["seed"],
+                    track_memory=not kwargs["no_memory"],
+                    report=self._write_result,
+                )
+        finally:
+            settings.FLEET_SNAPSHOT_DIR = snapshot_dir
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {kwargs['output']}")
+
+        if baseline is not None:
+            regressions = self._write_comparison(
+                compare_results(baseline, results, kwargs["threshold"])
+            )
+            if regressions:
+                raise CommandError(f"{regressions} benchmarks regressed")
+
+    def _label(self, result):
+        params = " ".join(f"{k}={v}" for k, v in result["params"].items())
+        return f"{result['name']}[{result['size']}{' ' + params if params else ''}]"
+
+    def _write_result(self, result):
+        memory = result["peak_memory_bytes"]
+        self.stdout.write(
+            f"{self._label(result)}: {result['seconds'] * 1e3:.1f}ms "
+            f"({result['per_item_us']:.1f}us/item), {result['queries']} queries"
+            + (f", peak {memory / 2**20:.1f}MiB" if memory is not None else "")
+        )
+
+    def _write_comparison(self, comparisons):
+        regressions = 0
+        for comparison in comparisons:
+            moves = ", ".join(
+                f"{metric} x{comparison[metric]['ratio']}"
+                for metric in ("seconds", "queries", "peak_memory_bytes")
+                if metric in comparison
+            )
+            if comparison["regressed"]:
+                regressions += 1
+                self.stdout.write(
+                    self.style.ERROR(f"REGRESSED {self._label(comparison)}: {moves}")
+                )
+            else:
+                self.stdout.write(f"{self._label(comparison)}: {moves}")
+        return regressions
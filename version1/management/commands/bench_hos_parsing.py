@@ -0,0 +1,72 @@
+import time
+from datetime import datetime, timedelta, timezone
+from dateutil import parser as dateutil_parser
+from django.core.management.base import BaseCommand
+from version1.serializers import DutyStatusSerializer
+from version1.utils import check_hos_violation, parse_timestamp
+
+
+class Command(BaseCommand):
+    help = "Benchmark per-entry timestamp parsing cost of duty status logs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--entries",
+            type=int,
+            nargs="+",
+            default=[1000, 10000, 50000],
+            help="Log lengths to benchmark",
+        )
+
+    def handle(self, *args, **kwargs):
+        for count in kwargs["entries"]:
+            payload = self._payload(count)
+            timestamps = [
+                value
+                for entry in payload["duty_statuses"]
+                for value in (entry["start_time"], entry["end_time"])
+            ]
+
+            dateutil_time = self._time(lambda: [dateutil_parser.parse(v) for v in timestamps])
+            fast_time = self._time(lambda: [parse_timestamp(v) for v in timestamps])
+
+            serializer = DutyStatusSerializer(data=payload)
+            validate_time = self._time(lambda: serializer.is_valid(raise_exception=True))
+            data = serializer.validated_data
+            check_time = self._time(lambda: check_hos_violation(**data))
+
+            self.stdout.write(
+                f"{count} entries: dateutil {dateutil_time / count * 1e6:.1f}us/entry, "
+                f"fromisoformat {fast_time / count * 1e6:.1f}us/entry "
+                f"({dateutil_time / fast_time:.0f}x), "
+                f"serializer {validate_time * 1e3:.0f}ms, "
+                f"check_hos_violation {check_time * 1e3:.0f}ms"
+            )
+
+    def _time(self, fn):
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
+
+    def _payload(self, count):
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        statuses = ["D", "ODND", "OFF", "SB"]
+        duty_statuses = []
+
+        for i in range(count):
+            end = start + timedelta(minutes=45)
+            duty_statuses.append(
+                {
+                    "status": statuses[i % len(statuses)],
+                    "start_time": start.isoformat().replace("+00:00", "Z"),
+                    "end_time": end.isoformat().replace("+00:00", "Z"),
+                }
+            )
+            start = end
+
+        return {
+            "pickup_time": duty_statuses[0]["start_time"],
+            "dropoff_time": duty_statuses[-1]["end_time"],
+            "truck_type": "property",
+            "duty_statuses": duty_statuses,
+        }
@@ -0,0 +1,58 @@
+import asyncio
+import time
+from django.core.management.base import BaseCommand
+from version1.proLogsClient import AsyncPrologsAPIClient, PrologsAPIClient
+from version1.prologs_stub import generate_drivers, generate_trucks, run_stub_server
+
+
+class Command(BaseCommand):
+    help = "Benchmark the ProLogs clients against the local stub server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--drivers", type=int, default=20000)
+        parser.add_argument("--trucks", type=int, default=20000)
+        parser.add_argument("--latency", type=float, default=0.05)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--page-size", type=int, default=1000)
+
+    def handle(self, *args, **kwargs):
+        with run_stub_server(
+            trucks=generate_trucks(kwargs["trucks"]),
+            drivers=generate_drivers(kwargs["drivers"], truck_count=kwargs["trucks"]),
+            latency=kwargs["latency"],
+        ) as server:
+            client = PrologsAPIClient(
+                base_url=server.base_url, token_url=server.token_url
+            )
+            start = time.perf_counter()
+            trucks = client.get_trucks()
+            drivers = client.get_drivers()
+            self._report("sync, whole collections", start, trucks, drivers)
+
+            async_client = AsyncPrologsAPIClient(
+                concurrency=kwargs["concurrency"],
+                page_size=kwargs["page_size"],
+                base_url=server.base_url,
+                token_url=server.token_url,
+            )
+            try:
+                start = time.perf_counter()
+                trucks, drivers = asyncio.run(self._fetch_async(async_client))
+                self._report("async, concurrent pages", start, trucks, drivers)
+            finally:
+                async_client.close()
+
+            self.stdout.write(f"Stub served {server.request_count} requests")
+
+    async def _fetch_async(self, client):
+        return await asyncio.gather(
+            client.get_trucks_async(), client.get_drivers_async()
+        )
+
+    def _report(self, label, start, trucks, drivers):
+        elapsed = time.perf_counter() - start
+        records = len(trucks or []) + len(drivers or [])
+        self.stdout.write(
+            f"{label}: {records} records in {elapsed:.3f}s "
+            f"({records / elapsed:.0f} records/s)"
+        )
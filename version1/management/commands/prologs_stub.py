@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from version1.prologs_stub import (
+    PrologsStubServer,
+    generate_drivers,
+    generate_trucks,
+)
+
+
+class Command(BaseCommand):
+    help = "Serve a local stub of the ProLogs identity and public API"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", type=str, default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8001)
+        parser.add_argument("--trucks", type=int, default=1000)
+        parser.add_argument("--drivers", type=int, default=1000)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.0,
+            help="Seconds to wait before answering each request",
+        )
+
+    def handle(self, *args, **kwargs):
+        server = PrologsStubServer(
+            address=(kwargs["host"], kwargs["port"]),
+            trucks=generate_trucks(kwargs["trucks"]),
+            drivers=generate_drivers(kwargs["drivers"], truck_count=kwargs["trucks"]),
+            latency=kwargs["latency"],
+        )
+        self.stdout.write(
+            f"Serving ProLogs stub at {server.base_url} "
+            f"(set PROLOGS_BASE_URL={server.base_url} "
+            f"PROLOGS_TOKEN_URL={server.token_url})"
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
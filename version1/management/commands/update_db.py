@@ -1,16 +1,25 @@
 from django.core.management.base import BaseCommand, CommandError
-from version1.utils import db_update_trucks, db_update_drivers
+from version1.snapshot import publish_fleet_snapshot
+from version1.utils import (
+    db_update_all,
+    db_update_trucks,
+    db_update_drivers,
+    refresh_driver_violations,
+)
 
 
 class Command(BaseCommand):
-    help = "Update the database with specified data: trucks, drivers, or all"
+    help = (
+        "Update the database with specified data: trucks, drivers, all, "
+        "or violations, or republish the fleet snapshot"
+    )
 
     def add_arguments(self, parser):
         parser.add_argument(
             "option",
             type=str,
-            choices=["trucks", "drivers", "all"],
-            help="Specify the data to update: trucks, drivers, or all",
+            choices=["trucks", "drivers", "all", "violations", "snapshot"],
+            help="Specify the data to update: trucks, drivers, all, violations or snapshot",
         )
 
     def handle(self, *args, **kwargs):
@@ -19,25 +28,47 @@ class Command(BaseCommand):
         try:
             if option == "trucks":
                 self.stdout.write("Updating trucks data...")
-                if db_update_trucks():
+                updated = db_update_trucks()
+                if updated:
                     self.stdout.write(self.style.SUCCESS("Successfully updated trucks"))
+                    self._write_counts("trucks", updated)
                 else:
                     self.stdout.write(self.style.ERROR("Something went wrong"))
 
             elif option == "drivers":
                 self.stdout.write("Updating drivers data...")
-                if db_update_drivers():
+                updated = db_update_drivers()
+                if updated:
                     self.stdout.write(
                         self.style.SUCCESS("Successfully updated drivers")
                     )
+                    self._write_counts("drivers", updated)
                 else:
                     self.stdout.write(self.style.ERROR("Something went wrong"))
             elif option == "all":
                 self.stdout.write("Updating drivers and trucks data...")
-                if db_update_trucks() and db_update_drivers():
+                updated = db_update_all()
+                if updated:
                     self.stdout.write(
                         self.style.SUCCESS("Successfully updated drivers and trucks")
                     )
+                    self._write_counts("trucks", updated["trucks"])
+                    self._write_counts("drivers", updated["drivers"])
+                else:
+                    self.stdout.write(self.style.ERROR("Something went wrong"))
+            elif option == "violations":
+                self.stdout.write("Rebuilding stored violations...")
+                stored = refresh_driver_violations()
+                self.stdout.write(
+                    self.style.SUCCESS(f"Successfully stored {stored} violations")
+                )
+            elif option == "snapshot":
+                self.stdout.write("Publishing the fleet snapshot...")
+                published = publish_fleet_snapshot(force=True)
+                if published:
+                    self.stdout.write(
+                        self.style.SUCCESS(f"Successfully published {published}")
+                    )
                 else:
                     self.stdout.write(self.style.ERROR("Something went wrong"))
             else:
@@ -47,3 +78,9 @@ class Command(BaseCommand):
 
         except CommandError as e:
             self.stdout.write(self.style.ERROR(f"Error: {str(e)}"))
+
+    def _write_counts(self, label, counts):
+        self.stdout.write(
+            f"{label}: {counts['inserted']} inserted, "
+            f"{counts['updated']} updated, {counts['unchanged']} unchanged"
+        )
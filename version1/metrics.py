@@ -0,0 +1,229 @@
+"""
+Process-local metrics rendered in the Prometheus text exposition format.
+
+Each worker process keeps its own counters and histograms, the way
+Prometheus client libraries do without a multiprocess collector, so scrape
+every worker (or run a single one) to see the whole picture.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from django.db import connection
+from django.http import HttpResponse
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SYNC_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, key, extra, value in self.samples():
+            labels = _format_labels(self.labelnames, key, extra)
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield "", key, (), value
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total))
+                for key, (counts, total) in self._values.items()
+            )
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield "_bucket", key, (("le", _format_value(bound)),), cumulative
+            yield "_count", key, (), cumulative
+            yield "_sum", key, (), total
+
+
+REQUEST_LATENCY = Histogram(
+    "eld_http_request_duration_seconds",
+    "Time spent producing a response, per route.",
+    ["route", "method", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "eld_http_request_db_queries",
+    "Database queries run while producing a response, per route.",
+    ["route", "method"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+PROLOGS_LATENCY = Histogram(
+    "eld_prologs_request_duration_seconds",
+    "Time until ProLogs answered, per endpoint and status code.",
+    ["endpoint", "status"],
+)
+TOKEN_REFRESHES = Counter(
+    "eld_prologs_token_refreshes_total",
+    "Access tokens requested from the ProLogs identity server.",
+    ["outcome"],
+)
+SYNC_PHASE_DURATION = Histogram(
+    "eld_sync_phase_duration_seconds",
+    "Time a sync spent fetching, diffing and writing records.",
+    ["model", "phase"],
+    buckets=SYNC_BUCKETS,
+)
+SYNC_ROWS = Counter(
+    "eld_sync_rows_total",
+    "Records processed by syncs, by outcome.",
+    ["model", "outcome"],
+)
+SYNC_FAILURES = Counter(
+    "eld_sync_failures_total",
+    "Syncs that raised an error.",
+    ["model"],
+)
+
+REGISTRY = [
+    REQUEST_LATENCY,
+    REQUEST_QUERIES,
+    PROLOGS_LATENCY,
+    TOKEN_REFRESHES,
+    SYNC_PHASE_DURATION,
+    SYNC_ROWS,
+    SYNC_FAILURES,
+]
+
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+@contextmanager
+def phase_timer(timings: dict, phase: str):
+    """
+    Add the time spent in the block to ``timings[phase]``.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - started
+
+
+def timed_iter(iterable, timings: dict, phase: str):
+    """
+    Yield from ``iterable``, adding the time spent waiting on it to
+    ``timings[phase]``.
+    """
+    iterator = iter(iterable)
+    while True:
+        with phase_timer(timings, phase):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def record_sync(model: str, counts: dict, timings: dict):
+    for phase, seconds in timings.items():
+        SYNC_PHASE_DURATION.observe(seconds, model=model, phase=phase)
+    for outcome, count in counts.items():
+        SYNC_ROWS.inc(count, model=model, outcome=outcome)
+
+
+class MetricsMiddleware:
+    """
+    Record the latency and database query count of every request, labelled
+    with the matched URL route rather than the raw path.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count_query):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        route = match.route if match else "unmatched"
+        REQUEST_LATENCY.observe(
+            elapsed, route=route, method=request.method, status=response.status_code
+        )
+        REQUEST_QUERIES.observe(queries[0], route=route, method=request.method)
+        return response
+
+
+def metrics_view(request):
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE)
@@ -0,0 +1,179 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Driver',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('driver_id', models.CharField(db_index=True, max_length=255, unique=True)),
+                ('duty_status', models.CharField(choices=[('D', 'Driving'), ('SB', 'Sleeper Berth'), ('OFF', 'Off-Duty'), ('ODND', 'On-Duty Not Driving')], max_length=50)),
+                ('duty_status_start_time', models.DateTimeField(blank=True, null=True)),
+                ('shift_work_minutes', models.IntegerField(default=0)),
+                ('shift_drive_minutes', models.IntegerField(default=0)),
+                ('cycle_work_minutes', models.IntegerField(default=0)),
+                ('max_shift_work_minutes', models.IntegerField(default=840)),
+                ('max_shift_drive_minutes', models.IntegerField(default=660)),
+                ('max_cycle_work_minutes', models.IntegerField(default=4200)),
+                ('took_break', models.BooleanField(default=False)),
+                ('home_terminal_timezone_windows', models.CharField(blank=True, max_length=255, null=True)),
+                ('home_terminal_timezone_iana', models.CharField(blank=True, max_length=255, null=True)),
+                ('truck_type', models.CharField(choices=[('property', 'Property-Carrying'), ('passenger', 'Passenger-Carrying')], default='property', max_length=20)),
+                ('sleeper_berth_time', models.IntegerField(default=0)),
+                ('content_hash', models.CharField(blank=True, editable=False, max_length=32, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DriverViolation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('violation_type', models.CharField(max_length=255)),
+                ('violation_description', models.TextField()),
+                ('truck_type', models.CharField(choices=[('property', 'Property-Carrying'), ('passenger', 'Passenger-Carrying')], max_length=20)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DutyStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('duty_status', models.CharField(choices=[('D', 'Driving'), ('SB', 'Sleeper Berth'), ('OFF', 'Off-Duty'), ('ODND', 'On-Duty Not Driving')], max_length=50)),
+                ('start_time', models.DateTimeField()),
+                ('end_time', models.DateTimeField(blank=True, null=True)),
+                ('on_duty_seconds_before', models.BigIntegerField(default=0)),
+                ('driving_seconds_before', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SyncJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('model', models.CharField(choices=[('trucks', 'Trucks'), ('drivers', 'Drivers'), ('all', 'Trucks and drivers')], max_length=20)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('requests', models.PositiveIntegerField(default=1)),
+                ('progress', models.JSONField(blank=True, default=dict)),
+                ('result', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('heartbeat_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Truck',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=255, unique=True)),
+                ('location', models.CharField(blank=True, max_length=255, null=True)),
+                ('latitude', models.FloatField(blank=True, null=True)),
+                ('longitude', models.FloatField(blank=True, null=True)),
+                ('speed', models.IntegerField(blank=True, null=True)),
+                ('content_hash', models.CharField(blank=True, editable=False, max_length=32, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ViolationChangeSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generation', models.BigIntegerField(unique=True)),
+                ('changes', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TruckPosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('recorded_at', models.DateTimeField()),
+                ('latitude_e6', models.IntegerField()),
+                ('longitude_e6', models.IntegerField()),
+                ('speed', models.SmallIntegerField(blank=True, null=True)),
+                ('truck', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='positions', to='version1.truck')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='syncjob',
+            index=models.Index(fields=['model', 'created_at'], name='version1_sy_model_8573dc_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='syncjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ('queued', 'running'))), fields=('model',), name='unique_active_sync_job'),
+        ),
+        migrations.AddField(
+            model_name='dutystatusevent',
+            name='driver',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duty_status_events', to='version1.driver'),
+        ),
+        migrations.AddField(
+            model_name='driverviolation',
+            name='driver',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='violations', to='version1.driver'),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='truck',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='version1.truck'),
+        ),
+        migrations.AddIndex(
+            model_name='truckposition',
+            index=models.Index(fields=['truck', 'recorded_at'], name='version1_tr_truck_i_4f22c7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='truckposition',
+            index=models.Index(fields=['day'], name='version1_tr_day_815ef6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dutystatusevent',
+            index=models.Index(fields=['driver', 'start_time'], name='version1_du_driver__bba736_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driverviolation',
+            index=models.Index(fields=['violation_type', 'truck_type'], name='version1_dr_violati_a6f921_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='driverviolation',
+            constraint=models.UniqueConstraint(fields=('driver', 'violation_type'), name='unique_driver_violation_type'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(fields=['duty_status', 'truck_type'], name='version1_dr_duty_st_f92e1a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(django.db.models.expressions.CombinedExpression(django.db.models.expressions.F('max_shift_drive_minutes'), '-', django.db.models.expressions.F('shift_drive_minutes')), name='driver_drive_remaining_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(django.db.models.expressions.CombinedExpression(django.db.models.expressions.F('max_shift_work_minutes'), '-', django.db.models.expressions.F('shift_work_minutes')), name='driver_duty_remaining_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(django.db.models.expressions.CombinedExpression(django.db.models.expressions.F('max_cycle_work_minutes'), '-', django.db.models.expressions.F('cycle_work_minutes')), name='driver_cycle_remaining_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='driver',
+            index=models.Index(django.db.models.expressions.F('duty_status'), django.db.models.expressions.CombinedExpression(django.db.models.expressions.F('max_shift_drive_minutes'), '-', django.db.models.expressions.F('shift_drive_minutes')), name='driver_status_drive_idx'),
+        ),
+    ]
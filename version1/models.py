@@ -1,4 +1,7 @@
+import uuid
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 
 class Truck(models.Model):
     name = models.CharField(max_length=255, unique=True, db_index=True)
@@ -6,6 +9,7 @@ class Truck(models.Model):
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     speed = models.IntegerField(null=True, blank=True)
+    content_hash = models.CharField(max_length=32, null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.name
@@ -21,6 +25,16 @@ DUTY_STATUS = [
     ('OFF', 'Off-Duty'),
     ('ODND', 'On-Duty Not Driving'),
 ]
+
+# Minutes left before each HOS limit, computed by the database. Filters on
+# them match the expression indexes of Driver.
+DRIVER_HEADROOM = {
+    "drive_remaining": F("max_shift_drive_minutes") - F("shift_drive_minutes"),
+    "duty_remaining": F("max_shift_work_minutes") - F("shift_work_minutes"),
+    "cycle_remaining": F("max_cycle_work_minutes") - F("cycle_work_minutes"),
+}
+
+
 class Driver(models.Model):
 
     driver_id = models.CharField(max_length=255, unique=True,db_index=True)
@@ -38,6 +52,192 @@ class Driver(models.Model):
     home_terminal_timezone_iana = models.CharField(max_length=255, null=True, blank=True)
     truck_type = models.CharField(max_length=20, choices=TRUCK_TYPE_CHOICES, default='property')
     sleeper_berth_time = models.IntegerField(default=0)
+    content_hash = models.CharField(max_length=32, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["duty_status", "truck_type"]),
+            *(
+                models.Index(expression, name=f"driver_{name}_idx")
+                for name, expression in DRIVER_HEADROOM.items()
+            ),
+            # Drivers of one duty status running out of drive time.
+            models.Index(
+                F("duty_status"),
+                DRIVER_HEADROOM["drive_remaining"],
+                name="driver_status_drive_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.driver_id
+
+
+class DriverViolation(models.Model):
+    """
+    HOS violation of a driver, recomputed for changed drivers on each sync.
+    """
+
+    driver = models.ForeignKey(
+        Driver, on_delete=models.CASCADE, related_name="violations"
+    )
+    violation_type = models.CharField(max_length=255)
+    violation_description = models.TextField()
+    truck_type = models.CharField(max_length=20, choices=TRUCK_TYPE_CHOICES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["driver", "violation_type"],
+                name="unique_driver_violation_type",
+            )
+        ]
+        indexes = [models.Index(fields=["violation_type", "truck_type"])]
+
+    def __str__(self):
+        return f"{self.driver_id}: {self.violation_type}"
+
+
+ON_DUTY_STATUSES = ("D", "ODND")
+
+
+class DutyStatusEvent(models.Model):
+    """
+    A duty status period of a driver, appended by the sync whenever the
+    driver's duty status changes.
+
+    ``on_duty_seconds_before`` and ``driving_seconds_before`` are running
+    totals of the driver's history up to ``start_time``, so the on-duty time
+    between any two instants is the difference of two indexed lookups no
+    matter how long the history is.
+    """
+
+    driver = models.ForeignKey(
+        Driver, on_delete=models.CASCADE, related_name="duty_status_events"
+    )
+    duty_status = models.CharField(max_length=50, choices=DUTY_STATUS)
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField(null=True, blank=True)
+    on_duty_seconds_before = models.BigIntegerField(default=0)
+    driving_seconds_before = models.BigIntegerField(default=0)
+
+    class Meta:
+        indexes = [models.Index(fields=["driver", "start_time"])]
+
+    def __str__(self):
+        return f"{self.driver_id}: {self.duty_status} at {self.start_time}"
+
+
+# Truck positions are stored as integer microdegrees (about 0.1 m).
+COORDINATE_SCALE = 1_000_000
+
+
+class TruckPosition(models.Model):
+    """
+    A truck position observed by a sync, appended whenever the truck's
+    position changed.
+
+    Rows are partitioned by UTC ``day`` so that retention drops whole days
+    through the day index instead of scanning the table.
+    """
+
+    truck = models.ForeignKey(Truck, on_delete=models.CASCADE, related_name="positions")
+    day = models.DateField()
+    recorded_at = models.DateTimeField()
+    latitude_e6 = models.IntegerField()
+    longitude_e6 = models.IntegerField()
+    speed = models.SmallIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["truck", "recorded_at"]),
+            models.Index(fields=["day"]),
+        ]
+
+    @property
+    def latitude(self):
+        return self.latitude_e6 / COORDINATE_SCALE
+
+    @property
+    def longitude(self):
+        return self.longitude_e6 / COORDINATE_SCALE
+
+    def __str__(self):
+        return f"{self.truck_id}: {self.latitude}, {self.longitude} at {self.recorded_at}"
+
+
+class SyncState(models.Model):
+    """
+    Single row holding the sync generation, bumped by every sync that
+    changed data. Read endpoints use it to validate cached responses.
+    """
+
+    generation = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"generation {self.generation}"
+
+
+class ViolationChangeSet(models.Model):
+    """
+    Drivers whose violations appeared or cleared in one sync generation,
+    pushed to the clients of the violation stream.
+    """
+
+    generation = models.BigIntegerField(unique=True)
+    changes = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"generation {self.generation}: {len(self.changes)} drivers"
+
+
+SYNC_JOB_MODELS = [
+    ('trucks', 'Trucks'),
+    ('drivers', 'Drivers'),
+    ('all', 'Trucks and drivers'),
+]
+
+SYNC_JOB_STATUS = [
+    ('queued', 'Queued'),
+    ('running', 'Running'),
+    ('succeeded', 'Succeeded'),
+    ('failed', 'Failed'),
+]
+
+ACTIVE_SYNC_JOB_STATUSES = ("queued", "running")
+
+
+class SyncJob(models.Model):
+    """
+    A background ProLogs sync. At most one job per model is queued or running
+    at a time; ``requests`` counts the sync requests merged into it.
+
+    The process running or queueing the job refreshes ``heartbeat_at`` while
+    the job is alive, and writes ``progress`` after every committed chunk.
+    """
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    model = models.CharField(max_length=20, choices=SYNC_JOB_MODELS)
+    status = models.CharField(max_length=20, choices=SYNC_JOB_STATUS, default="queued")
+    requests = models.PositiveIntegerField(default=1)
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    heartbeat_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["model"],
+                condition=models.Q(status__in=ACTIVE_SYNC_JOB_STATUSES),
+                name="unique_active_sync_job",
+            )
+        ]
+        indexes = [models.Index(fields=["model", "created_at"])]
 
     def __str__(self):
-        return self.driver_id
\ No newline at end of file
+        return f"{self.model} sync {self.job_id}: {self.status}"
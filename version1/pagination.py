@@ -0,0 +1,152 @@
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+
+
+def _parse_int(value, name, minimum, maximum=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+
+    if value < minimum:
+        raise ValueError(f"{name} must be at least {minimum}")
+
+    return min(value, maximum) if maximum else value
+
+
+def is_paginated(request) -> bool:
+    return "cursor" in request.query_params or "page_size" in request.query_params
+
+
+def is_streamed(request) -> bool:
+    return request.query_params.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def _page_params(request):
+    """
+    :return: (page_size, cursor id or None)
+    """
+    page_size = _parse_int(
+        request.query_params.get("page_size", DEFAULT_PAGE_SIZE),
+        "page_size",
+        1,
+        MAX_PAGE_SIZE,
+    )
+    cursor = request.query_params.get("cursor")
+    return page_size, _parse_int(cursor, "cursor", 0) if cursor else None
+
+
+def keyset_paginated_response(request, queryset, serializer_class):
+    """
+    Return one page of the queryset ordered by id, starting after ?cursor=<id>.
+
+    The next page is found with an indexed ``id > cursor`` lookup, so the cost
+    of a page does not grow with how deep into the table it is.
+
+    :return: Response with ``results`` and the ``next_cursor`` to pass back
+    """
+    try:
+        page_size, cursor = _page_params(request)
+    except ValueError as ex:
+        return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+    if cursor is not None:
+        queryset = queryset.filter(id__gt=cursor)
+
+    # Fetch one extra row to know whether there is a next page.
+    rows = list(queryset.order_by("id")[: page_size + 1])
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+
+    serializer = serializer_class(rows, many=True)
+    return Response(
+        {
+            "next_cursor": rows[-1].id if has_next else None,
+            "results": serializer.data,
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+def streamed_response(queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Stream the queryset as a JSON array, serializing rows as they are read.
+
+    Rows are read with ``.iterator()`` and written out every ``chunk_size``
+    rows, so memory stays flat regardless of the table size.
+    """
+
+    def generate():
+        encoder = JSONEncoder()
+        yield "["
+        separator = ""
+        chunk = []
+        for obj in queryset.order_by("id").iterator(chunk_size=chunk_size):
+            chunk.append(encoder.encode(serializer_class(obj).data))
+            if len(chunk) >= chunk_size:
+                yield separator + ",".join(chunk)
+                separator = ","
+                chunk = []
+        if chunk:
+            yield separator + ",".join(chunk)
+        yield "]"
+
+    return StreamingHttpResponse(generate(), content_type="application/json")
+
+
+def list_response(request, queryset, serializer_class):
+    """
+    Serve a list endpoint as a stream (?stream=true), a keyset page
+    (?page_size=/?cursor=) or, by default, the full list.
+    """
+    if is_streamed(request):
+        return streamed_response(queryset, serializer_class)
+
+    if is_paginated(request):
+        return keyset_paginated_response(request, queryset, serializer_class)
+
+    serializer = serializer_class(queryset, many=True)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+def snapshot_list_response(request, table):
+    """
+    list_response over a SnapshotTable of the fleet snapshot, with the same
+    stream, page and full list modes and output.
+    """
+    if is_streamed(request):
+
+        def generate():
+            encoder = JSONEncoder()
+            yield "["
+            for start in range(0, len(table), STREAM_CHUNK_SIZE):
+                rows = table.rows(start, start + STREAM_CHUNK_SIZE)
+                separator = "," if start else ""
+                yield separator + ",".join(encoder.encode(row) for row in rows)
+            yield "]"
+
+        return StreamingHttpResponse(generate(), content_type="application/json")
+
+    if is_paginated(request):
+        try:
+            page_size, cursor = _page_params(request)
+        except ValueError as ex:
+            return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+
+        start = table.index_after(cursor) if cursor is not None else 0
+        rows = table.rows(start, start + page_size)
+        has_next = start + page_size < len(table)
+        return Response(
+            {
+                "next_cursor": rows[-1]["id"] if has_next else None,
+                "results": rows,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    return Response(table.rows(), status=status.HTTP_200_OK)
@@ -1,42 +1,249 @@
+import asyncio
+import codecs
+import os
 import requests
 import json
-from typing import Dict, Any, Optional
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, AsyncIterator, Iterable, Iterator, List, Optional
 from pathlib import Path
 from django.conf import settings
+from version1.metrics import PROLOGS_LATENCY, TOKEN_REFRESHES
+
+try:
+    import fcntl
+except ImportError:  # Windows: refreshes are only single-flight within a process
+    fcntl = None
+
+
+def create_session(pool_maxsize: int = 10) -> requests.Session:
+    """
+    Create a session with a keep-alive connection pool of ``pool_maxsize``.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+STREAM_READ_SIZE = 64 * 1024
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """
+    Incrementally parse a top-level JSON array from an iterable of UTF-8
+    byte chunks, yielding each item as soon as it is complete.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        pos = 0
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buffer):
+                break
+
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                return
+
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # the item continues in the next chunk
+            if end == len(buffer):
+                break  # a trailing number may continue in the next chunk
+
+            yield item
+            pos = end
+
+        buffer = buffer[pos:]
+
+    raise ValueError("Truncated JSON array")
+
+
+# Shared by every client in the process so connections to ProLogs are reused.
+_session = create_session()
+
+
+def _reset_session():
+    # Pooled sockets must not be shared with a forked worker process.
+    global _session
+    _session = create_session()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_session)
+
+
+class AccessTokenCache:
+    """
+    Process-wide cache of a ProLogs access token and its expiry.
+
+    The token is served from memory and refreshed shortly before it expires.
+    Only one refresh runs at a time: threads are serialized by a lock and
+    worker processes by an flock on ``<token_file>.lock``, and whoever waited
+    picks up the token the winner wrote to ``token_file`` instead of asking the
+    identity server again.
+    """
+
+    REFRESH_MARGIN = 60  # seconds before expiry to refresh proactively
+
+    def __init__(self, token_file: str = None):
+        self.token_file = Path(token_file) if token_file else None
+        self._lock = threading.Lock()
+        self._access_token = None
+        self._expires_at = 0.0
+        self._loaded = False
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._access_token is not None
+            and time.time() < self._expires_at - self.REFRESH_MARGIN
+        )
+
+    def get(self, fetch) -> str:
+        """
+        Return a valid access token, calling ``fetch`` to request a new
+        token object only when neither memory nor the token file has one.
+        """
+        if self._is_fresh():
+            return self._access_token
+
+        with self._lock:
+            if not self._loaded:
+                self._loaded = True
+                self._load_file()
+            if not self._is_fresh():
+                self._refresh(fetch, self._access_token)
+            return self._access_token
+
+    def invalidate(self, stale_token: str, fetch) -> str:
+        """
+        Refresh after the API rejected ``stale_token``, unless another caller
+        already replaced it.
+        """
+        with self._lock:
+            if self._access_token == stale_token or not self._is_fresh():
+                self._refresh(fetch, stale_token)
+            return self._access_token
+
+    def _refresh(self, fetch, stale_token):
+        with self._file_lock():
+            # Another process may have refreshed while we waited for the lock.
+            self._load_file()
+            if self._access_token != stale_token and self._is_fresh():
+                return
+
+            tokenObj = fetch()
+            tokenObj["expires_at"] = time.time() + tokenObj.get("expires_in", 0)
+            self._set(tokenObj)
+            self._write_file(tokenObj)
+
+    def _set(self, tokenObj):
+        self._access_token = tokenObj.get("access_token")
+        # A token without a lifetime is used until the API rejects it.
+        self._expires_at = tokenObj.get("expires_at", float("inf"))
+
+    def _load_file(self):
+        if self.token_file is None or not self.token_file.exists():
+            return
+
+        with open(self.token_file, "r") as fp:
+            tokenObj = json.load(fp)
+
+        if "expires_at" not in tokenObj and "expires_in" in tokenObj:
+            tokenObj["expires_at"] = (
+                self.token_file.stat().st_mtime + tokenObj["expires_in"]
+            )
+        if "access_token" in tokenObj:
+            self._set(tokenObj)
+
+    def _write_file(self, tokenObj):
+        if self.token_file is None:
+            return
+
+        tmp_file = self.token_file.with_name(f".{self.token_file.name}.{os.getpid()}")
+        with open(tmp_file, "w") as fp:
+            json.dump(tokenObj, fp, indent=4)
+        os.replace(tmp_file, self.token_file)
+
+    @contextmanager
+    def _file_lock(self):
+        if self.token_file is None or fcntl is None:
+            yield
+            return
+
+        with open(f"{self.token_file}.lock", "w") as lock_fp:
+            fcntl.flock(lock_fp, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_fp, fcntl.LOCK_UN)
+
+
+_token_caches: Dict[str, AccessTokenCache] = {}
+_token_caches_lock = threading.Lock()
+
+
+def get_token_cache(token_url: str) -> AccessTokenCache:
+    """
+    Return the process-wide token cache for an identity server. Only the
+    configured server persists its token to PROLOGS_TOKEN_FILE.
+    """
+    with _token_caches_lock:
+        if token_url not in _token_caches:
+            token_file = None
+            if token_url == settings.PROLOGS_TOKEN_URL:
+                token_file = settings.PROLOGS_TOKEN_FILE
+            _token_caches[token_url] = AccessTokenCache(token_file)
+        return _token_caches[token_url]
+
 
 class PrologsAPIClient:
     PROLOGS_TOKEN_URL = "https://identity-stage.prologs.us/connect/token"
     BASE_URL = "https://publicapi-stage.prologs.us"
 
-    def __init__(self):
+    def __init__(self, base_url: str = None, token_url: str = None, session=None):
+        self.base_url = base_url or getattr(settings, "PROLOGS_BASE_URL", self.BASE_URL)
+        self.token_url = token_url or getattr(
+            settings, "PROLOGS_TOKEN_URL", self.PROLOGS_TOKEN_URL
+        )
+        self.session = session or _session
+        self.token_cache = get_token_cache(self.token_url)
         self.access_token = self.get_access_token()
         self.headers = self._create_headers()
 
-    def _create_headers(self) -> Dict[str, str]:
-        return {"Authorization": f"Bearer {self.access_token}"}
+    def _create_headers(self, access_token: str = None) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {access_token or self.access_token}"}
 
     def get_access_token(self, refresh: bool = False) -> str:
         """
-        Obtain access token from token.json file.
+        Obtain access token from the process-wide token cache.
         """
+        if refresh:
+            return self.token_cache.invalidate(
+                self.access_token, self._request_new_access_token
+            )
+        return self.token_cache.get(self._request_new_access_token)
 
-        token_file = 'token.json'
-        tokenObj = {}
-
-        if not refresh and Path(token_file).exists():
-            with open(token_file,'r') as fp:
-                tokenObj = json.load(fp)
-                if 'access_token' in tokenObj:
-                    return tokenObj['access_token']
-
-        else:
-            tokenObj = self._request_new_access_token()
-            with open(token_file,'w') as fp:
-                json.dump(tokenObj,fp,indent=4)
-            
-        return tokenObj['access_token'] if 'access_token' in tokenObj else None
-
-    def _request_new_access_token(self) -> str:
+    def _request_new_access_token(self) -> Dict[str, Any]:
         """
         Obtain an access token from the ProLogs API.
         """
@@ -47,32 +254,94 @@ class PrologsAPIClient:
             'client_secret': settings.PROLOG_CLIENT_SECRET
         }
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        
-        response = requests.post(self.PROLOGS_TOKEN_URL, data=data, headers=headers)
-        
+
+        started = time.perf_counter()
+        response = self.session.post(self.token_url, data=data, headers=headers)
+        PROLOGS_LATENCY.observe(
+            time.perf_counter() - started,
+            endpoint="/connect/token",
+            status=response.status_code,
+        )
+
         if response.status_code == 200:
+            TOKEN_REFRESHES.inc(outcome="success")
             return response.json()
         else:
+            TOKEN_REFRESHES.inc(outcome="failure")
             raise Exception(f"Failed to obtain access token: {response.text}")
 
-    def _make_request(self, endpoint: str) -> Optional[Dict[str, Any]]:
+    def _get(self, endpoint: str, params: Dict[str, Any] = None, stream=False):
         """
-        Make a GET request to the given endpoint and handle authorization.
+        Send a GET request to the given endpoint, refreshing the access token
+        and retrying once if it was rejected.
         """
-        url = f"{self.BASE_URL}{endpoint}"
-        response = requests.get(url, headers=self.headers)
+        url = f"{self.base_url}{endpoint}"
+        access_token = self.token_cache.get(self._request_new_access_token)
+        response = self._timed_get(endpoint, url, access_token, params, stream)
 
         if response.status_code == 401:
-            self.access_token = self.get_access_token(refresh=True)
-            self.headers = self._create_headers()
-            response = requests.get(url, headers=self.headers)
+            response.close()
+            access_token = self.token_cache.invalidate(
+                access_token, self._request_new_access_token
+            )
+            response = self._timed_get(endpoint, url, access_token, params, stream)
+
+        self.access_token = access_token
+        self.headers = self._create_headers()
+        return response
+
+    def _timed_get(self, endpoint, url, access_token, params, stream):
+        """
+        Send one GET request, recording how long ProLogs took to answer.
+        """
+        started = time.perf_counter()
+        try:
+            response = self.session.get(
+                url,
+                headers=self._create_headers(access_token),
+                params=params,
+                stream=stream,
+            )
+        except requests.RequestException:
+            PROLOGS_LATENCY.observe(
+                time.perf_counter() - started, endpoint=endpoint, status="error"
+            )
+            raise
+        PROLOGS_LATENCY.observe(
+            time.perf_counter() - started,
+            endpoint=endpoint,
+            status=response.status_code,
+        )
+        return response
+
+    def _make_request(
+        self, endpoint: str, params: Dict[str, Any] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Make a GET request to the given endpoint and handle authorization.
+        """
+        response = self._get(endpoint, params)
 
         if response.status_code == 200:
             return response.json()
 
-        print(f"Failed to fetch data from {url}: {response.status_code}")
+        print(f"Failed to fetch data from {response.url}: {response.status_code}")
         return None
 
+    def _stream_request(self, endpoint: str) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the records of a JSON array endpoint as they are downloaded,
+        without holding the whole body in memory.
+        """
+        with self._get(endpoint, stream=True) as response:
+            if response.status_code != 200:
+                raise Exception(
+                    f"Failed to fetch data from {response.url}: {response.status_code}"
+                )
+            yield from iter_json_array(
+                response.iter_content(chunk_size=STREAM_READ_SIZE)
+            )
+
     def get_trucks(self) -> Optional[Dict[str, Any]]:
         """
         Fetch data about trucks.
@@ -84,3 +353,164 @@ class PrologsAPIClient:
         Fetch data about drivers.
         """
         return self._make_request("/api/v1/drivers")
+
+    def stream_trucks(self) -> Iterator[Dict[str, Any]]:
+        """
+        Stream data about trucks one record at a time.
+        """
+        return self._stream_request("/api/v1/trucks")
+
+    def stream_drivers(self) -> Iterator[Dict[str, Any]]:
+        """
+        Stream data about drivers one record at a time.
+        """
+        return self._stream_request("/api/v1/drivers")
+
+
+class AsyncPrologsAPIClient(PrologsAPIClient):
+    """
+    ProLogs client that fetches pages of a collection concurrently.
+
+    Requests run on a private keep-alive pool of ``concurrency`` connections,
+    so at most ``concurrency`` pages are in flight at any time.
+    """
+
+    PAGE_PARAM = "page"
+    PAGE_SIZE_PARAM = "pageSize"
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        page_size: int = 500,
+        base_url: str = None,
+        token_url: str = None,
+    ):
+        super().__init__(
+            base_url=base_url,
+            token_url=token_url,
+            session=create_session(pool_maxsize=concurrency),
+        )
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self._executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="prologs"
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    async def _make_request_async(
+        self, endpoint: str, params: Dict[str, Any] = None
+    ) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._make_request, endpoint, params
+        )
+
+    async def get_page(self, endpoint: str, page: int) -> Optional[List[Dict]]:
+        """
+        Fetch a single 1-based page of the given collection endpoint.
+        """
+        return await self._make_request_async(
+            endpoint, {self.PAGE_PARAM: page, self.PAGE_SIZE_PARAM: self.page_size}
+        )
+
+    async def get_pages(self, endpoint: str, pages) -> Optional[List[Dict]]:
+        """
+        Fetch the given pages concurrently and concatenate them in page order.
+        """
+        results = await asyncio.gather(*(self.get_page(endpoint, p) for p in pages))
+        if any(result is None for result in results):
+            return None
+        return [record for result in results for record in result]
+
+    async def iter_pages(self, endpoint: str) -> AsyncIterator[List[Dict]]:
+        """
+        Yield the pages of a collection in order, fetching ``concurrency``
+        pages at a time until a short page marks the end of it.
+
+        The first page is fetched on its own. An endpoint that ignores the
+        paging parameters answers with the whole collection every time, which
+        shows as a first page longer than ``page_size`` or as a later page
+        equal to the first one, and is then read only once.
+        """
+        first = await self.get_page(endpoint, 1)
+        if first is None:
+            raise Exception(f"Failed to fetch page 1 of {endpoint}")
+        yield first
+        if len(first) != self.page_size:
+            return
+
+        next_page = 2
+        while True:
+            pages = range(next_page, next_page + self.concurrency)
+            results = await asyncio.gather(
+                *(self.get_page(endpoint, page) for page in pages)
+            )
+            for page, result in zip(pages, results):
+                if result is None:
+                    raise Exception(f"Failed to fetch page {page} of {endpoint}")
+                if result == first:
+                    return
+                yield result
+                if len(result) < self.page_size:
+                    return
+            next_page += self.concurrency
+
+    async def get_collection(self, endpoint: str) -> List[Dict]:
+        """
+        Fetch a whole collection, paging concurrently.
+        """
+        return [record async for page in self.iter_pages(endpoint) for record in page]
+
+    def _stream_request(self, endpoint: str) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the records of a collection as its pages arrive, so the sync
+        streams stay bounded to ``concurrency`` pages in memory.
+        """
+        loop = asyncio.new_event_loop()
+        pages = self.iter_pages(endpoint)
+        try:
+            while True:
+                try:
+                    page = loop.run_until_complete(pages.__anext__())
+                except StopAsyncIteration:
+                    return
+                yield from page
+        finally:
+            loop.run_until_complete(pages.aclose())
+            loop.close()
+
+    async def get_trucks_async(self) -> List[Dict]:
+        """
+        Fetch data about trucks, paging concurrently.
+        """
+        return await self.get_collection("/api/v1/trucks")
+
+    async def get_drivers_async(self) -> List[Dict]:
+        """
+        Fetch data about drivers, paging concurrently.
+        """
+        return await self.get_collection("/api/v1/drivers")
+
+
+@contextmanager
+def open_sync_client():
+    """
+    ProLogs client for the syncs: pages collections concurrently when
+    PROLOGS_PAGE_CONCURRENCY is set, otherwise streams each collection in a
+    single request.
+    """
+    if not settings.PROLOGS_PAGE_CONCURRENCY:
+        yield PrologsAPIClient()
+        return
+
+    client = AsyncPrologsAPIClient(
+        concurrency=settings.PROLOGS_PAGE_CONCURRENCY,
+        page_size=settings.PROLOGS_PAGE_SIZE,
+    )
+    try:
+        yield client
+    finally:
+        client.close()
@@ -0,0 +1,172 @@
+"""
+Local stand-in for the ProLogs identity and public API, used to exercise and
+benchmark the ProLogs clients and the sync without network access.
+"""
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STUB_ACCESS_TOKEN = "stub-access-token"
+
+
+def generate_trucks(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"TRUCK-{i:07d}",
+            "location": f"Mile marker {rng.randint(0, 500)}",
+            "lat": round(rng.uniform(25.0, 49.0), 6),
+            "lng": round(rng.uniform(-124.0, -67.0), 6),
+            "speed": rng.randint(0, 75),
+        }
+        for i in range(count)
+    ]
+
+
+def generate_drivers(count, truck_count=None, seed=0):
+    rng = random.Random(seed)
+    truck_count = count if truck_count is None else truck_count
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    drivers = []
+
+    for i in range(count):
+        shift_drive = rng.randint(0, 720)
+        drivers.append(
+            {
+                "driverId": f"{i + 1}",
+                "truckName": f"TRUCK-{rng.randrange(truck_count):07d}"
+                if truck_count
+                else None,
+                "dutyStatus": rng.choice(["D", "SB", "OFF", "ODND"]),
+                "dutyStatusStartTime": (
+                    now - timedelta(minutes=rng.randint(0, 600))
+                ).isoformat(),
+                "shiftWorkMinutes": shift_drive + rng.randint(0, 240),
+                "shiftDriveMinutes": shift_drive,
+                "cycleWorkMinutes": rng.randint(0, 4500),
+                "maxShiftWorkMinutes": 840,
+                "maxShiftDriveMinutes": 660,
+                "maxCycleWorkMinutes": 4200,
+                "homeTerminalTimeZoneWindows": "Central Standard Time",
+                "homeTerminalTimeZoneIana": "America/Chicago",
+            }
+        )
+
+    return drivers
+
+
+class PrologsStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive between requests
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self.server.request_count += 1
+
+        if urlparse(self.path).path != "/connect/token":
+            return self._send_json(404, {"error": "not found"})
+
+        self.server.token_requests += 1
+        time.sleep(self.server.latency)
+        self._send_json(
+            200,
+            {
+                "access_token": STUB_ACCESS_TOKEN,
+                "expires_in": 3600,
+                "token_type": "Bearer",
+                "scope": "public_api_client",
+            },
+        )
+
+    def do_GET(self):
+        self.server.request_count += 1
+        url = urlparse(self.path)
+        collection = self.server.collections.get(url.path)
+
+        if collection is None:
+            return self._send_json(404, {"error": "not found"})
+
+        authorization = self.headers.get("Authorization", "")
+        if not authorization.startswith("Bearer ") or (
+            self.server.require_token
+            and authorization != f"Bearer {STUB_ACCESS_TOKEN}"
+        ):
+            return self._send_json(401, {"error": "unauthorized"})
+
+        time.sleep(self.server.latency)
+
+        query = parse_qs(url.query)
+        if self.server.paging and "page" in query:
+            page = int(query["page"][0])
+            page_size = int(query.get("pageSize", ["500"])[0])
+            start = (page - 1) * page_size
+            collection = collection[start : start + page_size]
+
+        self._send_json(200, collection)
+
+
+class PrologsStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        trucks=None,
+        drivers=None,
+        latency=0.0,
+        require_token=False,
+        paging=True,
+    ):
+        super().__init__(address, PrologsStubHandler)
+        self.collections = {
+            "/api/v1/trucks": trucks or [],
+            "/api/v1/drivers": drivers or [],
+        }
+        self.latency = latency
+        self.require_token = require_token
+        # False answers every request with the whole collection, like an
+        # API that ignores the paging parameters.
+        self.paging = paging
+        self.request_count = 0
+        self.token_requests = 0
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def token_url(self):
+        return f"{self.base_url}/connect/token"
+
+
+@contextmanager
+def run_stub_server(**kwargs):
+    """
+    Serve a PrologsStubServer on a background thread for the duration of the
+    block, on an ephemeral port unless ``address`` is given.
+    """
+    server = PrologsStubServer(**kwargs)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
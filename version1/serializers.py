@@ -1,17 +1,84 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Truck, Driver
+from .models import (
+    DUTY_STATUS,
+    TRUCK_TYPE_CHOICES,
+    Driver,
+    DutyStatusEvent,
+    SyncJob,
+    Truck,
+)
+from .utils import parse_timestamp
+
+
+class ISODateTimeField(serializers.DateTimeField):
+    """
+    DateTimeField that parses strings with the fast ISO-8601 path of
+    parse_timestamp, falling back to dateutil for unusual formats.
+    """
+
+    def to_internal_value(self, value):
+        if not isinstance(value, str):
+            return super().to_internal_value(value)
+
+        try:
+            parsed = parse_timestamp(value)
+        except (ValueError, OverflowError):
+            self.fail("invalid", format="ISO 8601")
+        return self.enforce_timezone(parsed)
 
 
 class TruckSerializer(serializers.ModelSerializer):
     class Meta:
         model = Truck
-        fields = "__all__"
+        exclude = ["content_hash"]
 
 
 class DriverSerializer(serializers.ModelSerializer):
     class Meta:
         model = Driver
-        fields = "__all__"
+        exclude = ["content_hash"]
+
+
+class DriverFilterSerializer(serializers.Serializer):
+    """
+    Query parameters narrowing the driver list, headroom in minutes left
+    before the shift drive, shift duty and cycle limits.
+    """
+
+    duty_status = serializers.ChoiceField(choices=DUTY_STATUS, required=False)
+    truck_type = serializers.ChoiceField(choices=TRUCK_TYPE_CHOICES, required=False)
+    min_drive_remaining = serializers.IntegerField(required=False)
+    max_drive_remaining = serializers.IntegerField(required=False)
+    min_duty_remaining = serializers.IntegerField(required=False)
+    max_duty_remaining = serializers.IntegerField(required=False)
+    min_cycle_remaining = serializers.IntegerField(required=False)
+    max_cycle_remaining = serializers.IntegerField(required=False)
+
+
+class NearbyTrucksSerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lng = serializers.FloatField(min_value=-180, max_value=180)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=10)
+    radius_km = serializers.FloatField(min_value=0, required=False)
+
+
+class BoundingBoxSerializer(serializers.Serializer):
+    min_lat = serializers.FloatField(min_value=-90, max_value=90)
+    min_lng = serializers.FloatField(min_value=-180, max_value=180)
+    max_lat = serializers.FloatField(min_value=-90, max_value=90)
+    max_lng = serializers.FloatField(min_value=-180, max_value=180)
+
+    def validate(self, data):
+        if data["max_lat"] < data["min_lat"]:
+            raise serializers.ValidationError("max_lat must not be below min_lat")
+        return data
+
+
+class TrackRequestSerializer(serializers.Serializer):
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    points = serializers.IntegerField(min_value=2, max_value=10000, default=500)
 
 
 class ScheduleRequestSerializer(serializers.Serializer):
@@ -23,12 +90,83 @@ class ScheduleRequestSerializer(serializers.Serializer):
     )
 
 
+class LoadSerializer(serializers.Serializer):
+    id = serializers.CharField()
+    pickup_time = serializers.DateTimeField()
+    dropoff_time = serializers.DateTimeField()
+    loading_time = serializers.IntegerField(min_value=0)
+    truck_type = serializers.ChoiceField(
+        choices=[("property", "Property"), ("passenger", "Passenger")],
+        default="property",
+    )
+
+    def validate(self, data):
+        if data["dropoff_time"] <= data["pickup_time"]:
+            raise serializers.ValidationError("dropoff_time must be after pickup_time")
+        return data
+
+
+class DispatchRequestSerializer(serializers.Serializer):
+    loads = LoadSerializer(many=True)
+
+
+class DutyStatusEntrySerializer(serializers.Serializer):
+    status = serializers.CharField()
+    start_time = ISODateTimeField()
+    end_time = ISODateTimeField()
+
+
 class DutyStatusSerializer(serializers.Serializer):
     pickup_time = serializers.DateTimeField()
     dropoff_time = serializers.DateTimeField()
     truck_type = serializers.ChoiceField(
         choices=[("property", "Property"), ("passenger", "Passenger")]
     )
-    duty_statuses = serializers.ListField(
-        child=serializers.DictField(child=serializers.CharField())
-    )
+    duty_statuses = serializers.ListField(child=DutyStatusEntrySerializer())
+
+
+class BatchDutyStatusSerializer(DutyStatusSerializer):
+    id = serializers.CharField()
+
+
+class DutyStatusEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DutyStatusEvent
+        fields = ["duty_status", "start_time", "end_time"]
+
+
+class DutyHistoryRequestSerializer(serializers.Serializer):
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+
+class SyncJobSerializer(serializers.ModelSerializer):
+    queued_seconds = serializers.SerializerMethodField()
+    run_seconds = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SyncJob
+        fields = [
+            "job_id",
+            "model",
+            "status",
+            "requests",
+            "progress",
+            "result",
+            "error",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "queued_seconds",
+            "run_seconds",
+        ]
+
+    def get_queued_seconds(self, job):
+        end = job.started_at or timezone.now()
+        return round((end - job.created_at).total_seconds(), 3)
+
+    def get_run_seconds(self, job):
+        if job.started_at is None:
+            return None
+        end = job.finished_at or timezone.now()
+        return round((end - job.started_at).total_seconds(), 3)
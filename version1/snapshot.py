@@ -0,0 +1,584 @@
+"""
+Columnar snapshot of the synced fleet, published after every sync and read
+by every worker process through memory maps.
+
+A snapshot is a directory of ``.npy`` columns: numbers in fixed-width arrays
+and strings interned into one table shared by all columns, stored as int32
+codes. Workers open the columns with ``mmap_mode="r"``, so all processes
+share the same page cache pages and opening a snapshot copies and parses
+nothing. Publishing writes a new directory and repoints the ``current``
+symlink with a single rename, so readers see the old snapshot or the new one
+and never a partial write.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from rest_framework.utils import model_meta
+from version1.models import Driver, DriverViolation, SyncState, Truck
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+SNAPSHOT_FORMAT = 1
+CURRENT_LINK = "current"
+
+# Published snapshots kept on disk, the current one included. Workers keep
+# older ones mapped until they move on, unlinking them does not affect that.
+SNAPSHOTS_KEPT = 2
+
+# Rows read and encoded at a time while building a snapshot, so only one chunk
+# of the tables is held as Python objects.
+SNAPSHOT_CHUNK_SIZE = 2000
+
+NULL_CODE = -1
+NULL_ID = -1
+NULL_INT = np.iinfo(np.int32).min
+NULL_TIME = np.iinfo(np.int64).min
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Column kind of each model field type; fields of any other type are not
+# snapshotted.
+FIELD_KINDS = {
+    "AutoField": "id",
+    "BigAutoField": "id",
+    "ForeignKey": "id",
+    "CharField": "str",
+    "TextField": "str",
+    "FloatField": "float",
+    "IntegerField": "int",
+    "SmallIntegerField": "int",
+    "BooleanField": "bool",
+    "DateTimeField": "datetime",
+}
+
+VIOLATION_FIELDS = ("violation_type", "violation_description", "truck_type")
+
+_datetime_field = serializers.DateTimeField()
+
+logger = logging.getLogger(__name__)
+
+
+def serialized_fields(model) -> list:
+    """
+    (name, kind) of the fields the model's API serializer outputs, in the
+    order a ModelSerializer outputs them: primary key, fields, relations.
+    """
+    info = model_meta.get_field_info(model)
+    fields = [info.pk, *info.fields.values()]
+    fields.extend(relation.model_field for relation in info.forward_relations.values())
+    return [
+        (field.name, FIELD_KINDS[field.get_internal_type()])
+        for field in fields
+        if field.name != "content_hash"
+    ]
+
+
+class _StringInterner:
+    def __init__(self):
+        self.codes = {}
+        self.strings = []
+
+    def code(self, value) -> int:
+        if value is None:
+            return NULL_CODE
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.strings)
+            self.strings.append(value)
+        return code
+
+    def columns(self) -> dict:
+        encoded = [value.encode() for value in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(
+            np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)),
+            out=offsets[1:],
+        )
+        return {
+            "strings_offsets": offsets,
+            "strings_data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        }
+
+
+def _encode(kind, values, strings) -> np.ndarray:
+    if kind == "id":
+        return np.array(
+            [NULL_ID if value is None else value for value in values], dtype=np.int64
+        )
+    if kind == "int":
+        return np.array(
+            [NULL_INT if value is None else value for value in values], dtype=np.int32
+        )
+    if kind == "float":
+        return np.array(
+            [np.nan if value is None else value for value in values], dtype=np.float64
+        )
+    if kind == "bool":
+        return np.array(
+            [-1 if value is None else value for value in values], dtype=np.int8
+        )
+    if kind == "datetime":
+        return np.array(
+            [
+                NULL_TIME if value is None else (value - EPOCH) // timedelta(microseconds=1)
+                for value in values
+            ],
+            dtype=np.int64,
+        )
+    return np.array([strings.code(value) for value in values], dtype=np.int32)
+
+
+def _encode_rows(rows, kinds, strings) -> list:
+    """
+    Encode value rows into one array per column, SNAPSHOT_CHUNK_SIZE rows at
+    a time.
+    """
+    parts = [[] for _ in kinds]
+    while True:
+        chunk = list(islice(rows, SNAPSHOT_CHUNK_SIZE))
+        if not chunk:
+            break
+        for column_parts, kind, values in zip(parts, kinds, zip(*chunk)):
+            column_parts.append(_encode(kind, values, strings))
+    return [
+        np.concatenate(column_parts) if column_parts else _encode(kind, (), strings)
+        for column_parts, kind in zip(parts, kinds)
+    ]
+
+
+def _table_columns(queryset, fields, strings, prefix) -> dict:
+    names = [name for name, _ in fields]
+    rows = queryset.order_by("id").values_list(*names).iterator(
+        chunk_size=SNAPSHOT_CHUNK_SIZE
+    )
+    values = _encode_rows(rows, [kind for _, kind in fields], strings)
+    return {f"{prefix}.{name}": column for name, column in zip(names, values)}
+
+
+def _key_order(codes, strings) -> np.ndarray:
+    """
+    Row indexes sorted by the string key, for binary search lookups.
+    """
+    keys = [strings.strings[code] for code in codes.tolist()]
+    return np.array(sorted(range(len(keys)), key=keys.__getitem__), dtype=np.int32)
+
+
+def _sync_generation() -> int:
+    generation = SyncState.objects.filter(pk=1).values_list("generation", flat=True)
+    return generation.first() or 0
+
+
+def build_fleet_columns():
+    """
+    Read trucks, drivers and violations into snapshot columns.
+
+    :return: (generation, columns), or (None, None) when a sync committed
+        while the tables were read and the columns may mix two generations
+    """
+    strings = _StringInterner()
+    truck_fields = serialized_fields(Truck)
+    driver_fields = serialized_fields(Driver)
+
+    with transaction.atomic():
+        generation = _sync_generation()
+        columns = _table_columns(Truck.objects.all(), truck_fields, strings, "trucks")
+        columns.update(
+            _table_columns(Driver.objects.all(), driver_fields, strings, "drivers")
+        )
+        violations = (
+            DriverViolation.objects.order_by("driver_id", "id")
+            .values_list("driver_id", *VIOLATION_FIELDS)
+            .iterator(chunk_size=SNAPSHOT_CHUNK_SIZE)
+        )
+        violation_columns = _encode_rows(
+            violations, ["id"] + ["str"] * len(VIOLATION_FIELDS), strings
+        )
+        if _sync_generation() != generation:
+            return None, None
+
+    columns["trucks.name_order"] = _key_order(columns["trucks.name"], strings)
+    columns["drivers.driver_id_order"] = _key_order(
+        columns["drivers.driver_id"], strings
+    )
+
+    # Violations are sorted by driver like the drivers table, so the
+    # violations of driver row i are rows offsets[i]:offsets[i + 1].
+    driver_rows = np.searchsorted(columns["drivers.id"], violation_columns[0])
+    columns["violations.driver"] = driver_rows.astype(np.int32)
+    for name, column in zip(VIOLATION_FIELDS, violation_columns[1:]):
+        columns[f"violations.{name}"] = column
+    columns["violations.driver_offsets"] = np.searchsorted(
+        driver_rows, np.arange(len(columns["drivers.id"]) + 1)
+    ).astype(np.int64)
+
+    columns.update(strings.columns())
+    return generation, columns
+
+
+@contextmanager
+def _publish_lock(directory):
+    if fcntl is None:
+        yield
+        return
+
+    with open(os.path.join(directory, ".lock"), "w") as lock_fp:
+        fcntl.flock(lock_fp, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_fp, fcntl.LOCK_UN)
+
+
+def _read_meta(path) -> dict:
+    with open(os.path.join(path, "meta.json")) as f:
+        return json.load(f)
+
+
+def _current_generation(directory):
+    try:
+        return _read_meta(os.path.join(directory, CURRENT_LINK))["generation"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_snapshot(directory, generation, columns) -> str:
+    """
+    Write the columns to a new snapshot directory under ``directory``.
+
+    :return: name of the snapshot directory
+    """
+    name = f"fleet-{generation}-{uuid.uuid4().hex[:8]}"
+    staging = os.path.join(directory, f".{name}.tmp")
+    os.makedirs(staging)
+    try:
+        for column, values in columns.items():
+            np.save(os.path.join(staging, f"{column}.npy"), values)
+        with open(os.path.join(staging, "meta.json"), "w") as f:
+            json.dump(
+                {
+                    "format": SNAPSHOT_FORMAT,
+                    "generation": generation,
+                    "created_at": datetime.now(dt_timezone.utc).isoformat(),
+                    "columns": sorted(columns),
+                },
+                f,
+            )
+        os.rename(staging, os.path.join(directory, name))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return name
+
+
+def _swap_current(directory, name):
+    link = os.path.join(directory, f".{CURRENT_LINK}.{uuid.uuid4().hex[:8]}")
+    os.symlink(name, link)
+    os.replace(link, os.path.join(directory, CURRENT_LINK))
+
+
+def _prune_snapshots(directory, current):
+    snapshots = sorted(
+        (
+            entry
+            for entry in os.scandir(directory)
+            if entry.name.startswith("fleet-") and entry.is_dir(follow_symlinks=False)
+        ),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    kept = 1
+    for entry in snapshots:
+        if entry.name == current:
+            continue
+        if kept < SNAPSHOTS_KEPT:
+            kept += 1
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def publish_fleet_snapshot(force: bool = False):
+    """
+    Publish a snapshot of the current sync generation, unless it or a newer
+    one is already published. Runs after each sync transaction commits.
+
+    On failure the current snapshot is withdrawn, so that readers go back to
+    the database instead of serving an outdated snapshot.
+
+    :param force: publish even if a snapshot of the same or a newer
+        generation exists, e.g. after the database was restored
+    :return: name of the published snapshot directory, None if nothing was
+        published
+    """
+    directory = settings.FLEET_SNAPSHOT_DIR
+    if not directory:
+        return None
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        if not force:
+            current = _current_generation(directory)
+            if current is not None and current >= _sync_generation():
+                return None
+
+        generation, columns = build_fleet_columns()
+        if columns is None:
+            # The sync that interrupted us publishes when it commits.
+            return None
+
+        name = write_snapshot(directory, generation, columns)
+        with _publish_lock(directory):
+            current = _current_generation(directory)
+            if not force and current is not None and current >= generation:
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+                return None
+            _swap_current(directory, name)
+            _prune_snapshots(directory, name)
+        return name
+    except Exception:
+        logger.exception("Failed to publish the fleet snapshot")
+        withdraw_fleet_snapshot()
+        return None
+
+
+def withdraw_fleet_snapshot():
+    directory = settings.FLEET_SNAPSHOT_DIR
+    if not directory:
+        return
+    try:
+        os.unlink(os.path.join(directory, CURRENT_LINK))
+    except FileNotFoundError:
+        pass
+    except OSError:
+        logger.exception("Failed to withdraw the fleet snapshot")
+
+
+class SnapshotTable:
+    """
+    Rows of one model in a FleetSnapshot, ordered by id and rendered the way
+    the model's serializer renders them.
+    """
+
+    def __init__(self, snapshot, name, model, key_field):
+        self.snapshot = snapshot
+        self.fields = serialized_fields(model)
+        self.columns = [snapshot.column(f"{name}.{field}") for field, _ in self.fields]
+        self.ids = snapshot.column(f"{name}.id")
+        self.keys = snapshot.column(f"{name}.{key_field}")
+        self.key_order = snapshot.column(f"{name}.{key_field}_order")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _decode(self, kind, values) -> list:
+        if kind == "str":
+            return self.snapshot.strings(values)
+        values = values.tolist()
+        if kind == "id":
+            return [None if value == NULL_ID else value for value in values]
+        if kind == "int":
+            return [None if value == NULL_INT else value for value in values]
+        if kind == "float":
+            return [None if value != value else value for value in values]
+        if kind == "bool":
+            return [None if value < 0 else bool(value) for value in values]
+        return [
+            None
+            if value == NULL_TIME
+            else _datetime_field.to_representation(EPOCH + timedelta(microseconds=value))
+            for value in values
+        ]
+
+    def rows(self, start: int = 0, stop: int = None) -> list:
+        names = [name for name, _ in self.fields]
+        columns = [
+            self._decode(kind, column[start:stop])
+            for (_, kind), column in zip(self.fields, self.columns)
+        ]
+        return [dict(zip(names, values)) for values in zip(*columns)]
+
+    def row(self, index: int) -> dict:
+        return self.rows(index, index + 1)[0]
+
+    def find(self, key: str):
+        """
+        Binary search of the key column. URL routes may pass the key as an
+        int, which the database lookup would match as its string.
+
+        :return: row index, None if no row has the key
+        """
+        key = str(key)
+        lo, hi = 0, len(self.key_order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            index = int(self.key_order[mid])
+            value = self.snapshot.string(int(self.keys[index]))
+            if value == key:
+                return index
+            if value < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def index_after(self, id_: int) -> int:
+        """
+        Index of the first row with an id greater than ``id_``.
+        """
+        return int(np.searchsorted(self.ids, id_, side="right"))
+
+
+class FleetSnapshot:
+    """
+    A published snapshot opened read-only through memory maps.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        meta = _read_meta(path)
+        if meta["format"] != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {meta['format']}")
+        self.generation = meta["generation"]
+        self._columns = {}
+        self._offsets = self.column("strings_offsets")
+        self._data = memoryview(self.column("strings_data"))
+        self.trucks = SnapshotTable(self, "trucks", Truck, "name")
+        self.drivers = SnapshotTable(self, "drivers", Driver, "driver_id")
+        self._violation_codes = {}
+
+    def column(self, name) -> np.ndarray:
+        if name not in self._columns:
+            self._columns[name] = np.load(
+                os.path.join(self.path, f"{name}.npy"), mmap_mode="r"
+            )
+        return self._columns[name]
+
+    def string(self, code: int):
+        if code == NULL_CODE:
+            return None
+        return str(self._data[self._offsets[code] : self._offsets[code + 1]], "utf-8")
+
+    def strings(self, codes) -> list:
+        codes = np.asarray(codes, dtype=np.int64)
+        starts = self._offsets[codes].tolist()
+        ends = self._offsets[codes + 1].tolist()
+        data = self._data
+        return [
+            None if code == NULL_CODE else str(data[start:end], "utf-8")
+            for code, start, end in zip(codes.tolist(), starts, ends)
+        ]
+
+    def _violation_rows(self, start, stop) -> list:
+        types = self.strings(self.column("violations.violation_type")[start:stop])
+        descriptions = self.strings(
+            self.column("violations.violation_description")[start:stop]
+        )
+        return [
+            {"violation_type": type_, "violation_description": description}
+            for type_, description in zip(types, descriptions)
+        ]
+
+    def driver_violations(self, driver_row: int) -> list:
+        offsets = self.column("violations.driver_offsets")
+        return self._violation_rows(
+            int(offsets[driver_row]), int(offsets[driver_row + 1])
+        )
+
+    def _string_mask(self, column, value):
+        codes = self.column(column)
+        if column not in self._violation_codes:
+            self._violation_codes[column] = {
+                self.string(code): code for code in np.unique(codes).tolist()
+            }
+        code = self._violation_codes[column].get(value)
+        if code is None:
+            return np.zeros(len(codes), dtype=bool)
+        return codes == code
+
+    def fleet_violations(self, violation_type=None, truck_type=None) -> list:
+        """
+        The snapshot's answer to utils.get_fleet_violations.
+        """
+        driver_rows = self.column("violations.driver")
+        mask = np.ones(len(driver_rows), dtype=bool)
+        if violation_type:
+            mask &= self._string_mask("violations.violation_type", violation_type)
+        if truck_type:
+            mask &= self._string_mask("violations.truck_type", truck_type)
+
+        selected = np.flatnonzero(mask)
+        if not len(selected):
+            return []
+
+        rows = driver_rows[selected]
+        types = self.column("violations.violation_type")[selected]
+        descriptions = self.column("violations.violation_description")[selected]
+        # Start of each run of violations of the same driver.
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]).tolist()
+        driver_ids = self.strings(self.drivers.keys[rows[starts]])
+        types = self.strings(types)
+        descriptions = self.strings(descriptions)
+
+        return [
+            {
+                driver_id: [
+                    {"violation_type": type_, "violation_description": description}
+                    for type_, description in zip(
+                        types[start:stop], descriptions[start:stop]
+                    )
+                ]
+            }
+            for driver_id, start, stop in zip(
+                driver_ids, starts, starts[1:] + [len(selected)]
+            )
+        ]
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_fleet_snapshot():
+    """
+    The current published snapshot, reopened when a newer one was published
+    by any process.
+
+    :return: FleetSnapshot, None when snapshots are disabled or none is
+        published
+    """
+    global _snapshot
+
+    directory = settings.FLEET_SNAPSHOT_DIR
+    if not directory:
+        return None
+    try:
+        path = os.path.join(
+            directory, os.readlink(os.path.join(directory, CURRENT_LINK))
+        )
+    except OSError:
+        return None
+
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.path == path:
+        return snapshot
+
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot.path != path:
+            try:
+                _snapshot = FleetSnapshot(path)
+            except (OSError, ValueError, KeyError):
+                # Pruned between the readlink and the open, or unreadable.
+                logger.exception("Failed to open the fleet snapshot %s", path)
+                return None
+        return _snapshot
@@ -0,0 +1,214 @@
+"""
+In-memory grid index over truck positions for nearest-truck and bounding-box
+queries, rebuilt after each truck sync.
+"""
+import math
+import threading
+import time
+import numpy as np
+from version1.models import Truck
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Seconds after which a worker rebuilds its index even without a local sync,
+# to pick up syncs that ran in other processes.
+TRUCK_INDEX_TTL = 60
+
+# Rings of cells searched around the query point before falling back to a
+# scan of every truck, which only happens for points far from the fleet.
+MAX_SEARCH_RINGS = 16
+
+
+def haversine_km(lat, lng, lats, lngs):
+    lat, lng = math.radians(lat), math.radians(lng)
+    lats, lngs = np.radians(lats), np.radians(lngs)
+    a = (
+        np.sin((lats - lat) / 2) ** 2
+        + math.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class TruckSpatialIndex:
+    """
+    Trucks bucketed into fixed-size lat/lng cells.
+
+    Rows are sorted by cell id (``row * columns + column``), so the cells of
+    one grid row between two columns are a single contiguous slice found with
+    two binary searches. Columns wrap around at the antimeridian: longitudes
+    180 and -180 share column 0.
+    """
+
+    FIELDS = ("id", "name", "location", "latitude", "longitude", "speed")
+
+    def __init__(self, rows, cell_size=0.25):
+        self.cell_size = cell_size
+        self.grid_rows = math.ceil(180 / cell_size) + 1
+        self.grid_columns = math.ceil(360 / cell_size)
+
+        rows = [row for row in rows if row[3] is not None and row[4] is not None]
+        latitudes = np.array([row[3] for row in rows], dtype=np.float64)
+        longitudes = np.array([row[4] for row in rows], dtype=np.float64)
+        cells = self._cell_row(latitudes) * self.grid_columns + (
+            self._cell_column(longitudes) % self.grid_columns
+        )
+        order = np.argsort(cells, kind="stable")
+
+        self.cells = cells[order]
+        self.latitudes = latitudes[order]
+        self.longitudes = longitudes[order]
+        self.rows = [rows[i] for i in order.tolist()]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _cell_row(self, latitudes):
+        return np.floor((np.clip(latitudes, -90, 90) + 90) / self.cell_size).astype(
+            np.int64
+        )
+
+    def _cell_column(self, longitudes):
+        return np.floor(
+            (np.clip(longitudes, -180, 180) + 180) / self.cell_size
+        ).astype(np.int64)
+
+    def _column_ranges(self, column_min, column_max):
+        """
+        Column ranges covering column_min to column_max, which may run past
+        either edge of the grid and wrap around the antimeridian.
+        """
+        if column_max - column_min + 1 >= self.grid_columns:
+            return [(0, self.grid_columns - 1)]
+        column_min %= self.grid_columns
+        column_max %= self.grid_columns
+        if column_min <= column_max:
+            return [(column_min, column_max)]
+        return [(column_min, self.grid_columns - 1), (0, column_max)]
+
+    def _slices(self, row_min, row_max, column_min, column_max):
+        """Index slices of the trucks in a rectangle of cells."""
+        row_min, row_max = max(row_min, 0), min(row_max, self.grid_rows - 1)
+        if row_min > row_max or column_min > column_max:
+            return []
+
+        rows = np.arange(row_min, row_max + 1) * self.grid_columns
+        slices = []
+        for first, last in self._column_ranges(column_min, column_max):
+            starts = np.searchsorted(self.cells, rows + first, side="left")
+            ends = np.searchsorted(self.cells, rows + last, side="right")
+            slices.extend(
+                slice(s, e) for s, e in zip(starts.tolist(), ends.tolist()) if e > s
+            )
+        return slices
+
+    def _candidates(self, slices):
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([np.arange(s.start, s.stop) for s in slices])
+
+    def _result(self, indexes, distances=None):
+        results = []
+        for n, i in enumerate(indexes):
+            truck = dict(zip(self.FIELDS, self.rows[i]))
+            if distances is not None:
+                truck["distance_km"] = round(float(distances[n]), 3)
+            results.append(truck)
+        return results
+
+    def within(self, min_lat, min_lng, max_lat, max_lng):
+        """
+        Trucks inside a bounding box. A box with ``min_lng > max_lng`` is
+        taken to cross the antimeridian.
+        """
+        if min_lng > max_lng:
+            return self.within(min_lat, min_lng, max_lat, 180) + self.within(
+                min_lat, -180, max_lat, max_lng
+            )
+
+        row_min, row_max = self._cell_row(np.array([min_lat, max_lat])).tolist()
+        column_min, column_max = self._cell_column(
+            np.array([min_lng, max_lng])
+        ).tolist()
+        candidates = self._candidates(
+            self._slices(row_min, row_max, column_min, column_max)
+        )
+        lats, lngs = self.latitudes[candidates], self.longitudes[candidates]
+        mask = (
+            (lats >= min_lat) & (lats <= max_lat) & (lngs >= min_lng) & (lngs <= max_lng)
+        )
+        return self._result(candidates[mask].tolist())
+
+    def nearest(self, lat, lng, limit=10, radius_km=None):
+        """
+        The ``limit`` trucks closest to a point, nearest first, searching
+        outwards ring by ring of cells until no unseen cell can hold a closer
+        truck.
+        """
+        if not self.rows:
+            return []
+
+        row = int(self._cell_row(np.array([lat]))[0])
+        column = int(self._cell_column(np.array([lng]))[0])
+        for ring in range(MAX_SEARCH_RINGS + 1):
+            seen = self._candidates(
+                self._slices(row - ring, row + ring, column - ring, column + ring)
+            )
+            # Anything outside the searched rings is at least ``ring`` cells
+            # away in latitude or longitude; a degree of longitude is shortest
+            # at the highest latitude those cells reach.
+            edge_lat = min(abs(lat) + (ring + 1) * self.cell_size, 90)
+            bound_km = (
+                ring * self.cell_size * KM_PER_DEGREE * math.cos(math.radians(edge_lat))
+            )
+            if radius_km is not None and radius_km <= bound_km:
+                break
+            if len(seen) >= limit:
+                distances = haversine_km(
+                    lat, lng, self.latitudes[seen], self.longitudes[seen]
+                )
+                if np.partition(distances, limit - 1)[limit - 1] <= bound_km:
+                    break
+        else:
+            seen = np.arange(len(self.rows))
+
+        distances = haversine_km(lat, lng, self.latitudes[seen], self.longitudes[seen])
+        if radius_km is not None:
+            keep = distances <= radius_km
+            seen, distances = seen[keep], distances[keep]
+
+        if len(seen) > limit:
+            closest = np.argpartition(distances, limit - 1)[:limit]
+        else:
+            closest = np.arange(len(seen))
+        closest = closest[np.argsort(distances[closest], kind="stable")]
+        return self._result(seen[closest].tolist(), distances[closest])
+
+
+_index = None
+_index_built_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_truck_index() -> TruckSpatialIndex:
+    """
+    The process-wide truck index, rebuilt when it was invalidated by a
+    local sync or is older than TRUCK_INDEX_TTL.
+    """
+    global _index, _index_built_at
+
+    if _index is not None and time.monotonic() - _index_built_at < TRUCK_INDEX_TTL:
+        return _index
+
+    with _index_lock:
+        if _index is None or time.monotonic() - _index_built_at >= TRUCK_INDEX_TTL:
+            _index = TruckSpatialIndex(
+                Truck.objects.values_list(*TruckSpatialIndex.FIELDS)
+            )
+            _index_built_at = time.monotonic()
+        return _index
+
+
+def invalidate_truck_index():
+    global _index
+    _index = None
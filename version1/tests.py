@@ -1,3 +1,984 @@
-from django.test import TestCase
+import asyncio
+import os
+import random
+import re
+import shutil
+import signal
+import tempfile
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from version1 import caching, snapshot, utils
+from version1.models import Driver, DriverViolation, Truck, TruckPosition
+from version1.proLogsClient import AsyncPrologsAPIClient
+from version1.prologs_stub import generate_drivers, generate_trucks, run_stub_server
+from version1.views import DriverViolationBatchView
+from version1.utils import (
+    DISPATCH_PROBE_LIMIT_REASON,
+    HOS_COMPLIANCE_FIELDS,
+    assign_loads,
+    check_fleet_hos_compliance,
+    check_hos_compliance,
+    check_hos_violation,
+    db_update_all,
+    evaluate_hos_compliance,
+    sync_drivers,
+    sync_trucks,
+    truck_track,
+)
+
+START = datetime(2026, 10, 1, 6, tzinfo=timezone.utc)
+
+
+def duty_log(*entries):
+    """
+    Duty statuses from (status, start hour, end hour) tuples, in hours after
+    START.
+    """
+    return [
+        {
+            "status": status,
+            "start_time": (START + timedelta(hours=start)).isoformat(),
+            "end_time": (START + timedelta(hours=end)).isoformat(),
+        }
+        for status, start, end in entries
+    ]
+
+
+class CheckHOSViolationTests(SimpleTestCase):
+    def check(self, *entries, truck_type="property"):
+        violation, corrected_schedule = check_hos_violation(
+            START, START + timedelta(days=2), duty_log(*entries), truck_type
+        )
+        return violation, [item["suggestion"] for item in corrected_schedule]
+
+    def assertSuggests(self, suggestions, text):
+        self.assertTrue(
+            any(text in suggestion for suggestion in suggestions),
+            f"{text!r} not in {suggestions}",
+        )
+
+    def test_clean_log(self):
+        violation, suggestions = self.check(("D", 0, 4), ("OFF", 4, 4.5), ("D", 4.5, 8))
+        self.assertFalse(violation)
+        self.assertEqual(suggestions, ["No violations detected."])
+
+    def test_eight_hours_of_driving_without_a_break(self):
+        violation, suggestions = self.check(("D", 0, 3), ("D", 3, 6), ("D", 6, 9))
+        self.assertTrue(violation)
+        self.assertSuggests(suggestions, "without taking 30 minutes break")
+
+    def test_thirty_minute_break_resets_the_eight_hours(self):
+        violation, _ = self.check(("D", 0, 5), ("OFF", 5, 5.5), ("D", 5.5, 9.5))
+        self.assertFalse(violation)
+
+    def test_on_duty_time_counts_as_a_break(self):
+        violation, _ = self.check(("D", 0, 5), ("ON", 5, 5.5), ("D", 5.5, 9.5))
+        self.assertFalse(violation)
+
+    def test_short_breaks_do_not_add_up(self):
+        violation, suggestions = self.check(
+            ("D", 0, 4), ("OFF", 4, 4.25), ("D", 4.25, 8), ("OFF", 8, 8.25), ("D", 8.25, 9)
+        )
+        self.assertTrue(violation)
+        self.assertSuggests(suggestions, "without taking 30 minutes break")
+
+    def test_eleven_hours_of_driving(self):
+        violation, suggestions = self.check(("D", 0, 6), ("ON", 6, 6.5), ("D", 6.5, 12))
+        self.assertTrue(violation)
+        self.assertSuggests(suggestions, "Exceeded driving limit")
+
+    def test_eleven_hours_of_driving_is_allowed(self):
+        violation, _ = self.check(("D", 0, 6), ("ON", 6, 6.5), ("D", 6.5, 11.5))
+        self.assertFalse(violation)
+
+    def test_passenger_ten_hours_of_driving(self):
+        violation, suggestions = self.check(
+            ("D", 0, 5), ("ON", 5, 5.5), ("D", 5.5, 11), truck_type="passenger"
+        )
+        self.assertTrue(violation)
+        self.assertSuggests(suggestions, "Exceeded driving limit")
+
+    def test_driving_past_the_fourteen_hour_window(self):
+        violation, suggestions = self.check(
+            ("D", 0, 4), ("OFF", 4, 6), ("D", 6, 10), ("OFF", 10, 12), ("D", 12, 15)
+        )
+        self.assertTrue(violation)
+        self.assertSuggests(suggestions, "14-hour on-duty limit")
+        self.assertFalse(any("Exceeded driving limit" in s for s in suggestions))
+
+    def test_window_spans_many_short_statuses(self):
+        entries = []
+        for hour in range(16):
+            entries.append(("D" if hour % 2 else "ON", hour, hour + 0.75))
+        violation, suggestions = self.check(*entries)
+        self.assertTrue(violation)
+        self.assertSuggests(suggestions, "14-hour on-duty limit")
+
+    def test_passenger_window_only_counts_on_duty_time(self):
+        violation, _ = self.check(
+            ("D", 0, 4), ("OFF", 4, 6), ("D", 6, 10), ("OFF", 10, 12), ("D", 12, 14),
+            truck_type="passenger",
+        )
+        self.assertFalse(violation)
+
+    def test_insufficient_rest_after_the_driving_limit(self):
+        violation, suggestions = self.check(
+            ("D", 0, 7), ("ON", 7, 7.5), ("D", 7.5, 11.5), ("OFF", 11.5, 16.5), ("D", 16.5, 17)
+        )
+        self.assertTrue(violation)
+        self.assertSuggests(suggestions, "Insufficient rest")
+
+    def test_on_duty_not_driving_after_the_driving_limit(self):
+        violation, _ = self.check(
+            ("D", 0, 7), ("ON", 7, 7.5), ("D", 7.5, 11.5), ("OFF", 11.5, 16.5), ("ON", 16.5, 17)
+        )
+        self.assertFalse(violation)
+
+    def test_insufficient_rest_is_reported_once_per_shift(self):
+        violation, suggestions = self.check(
+            ("D", 0, 7), ("ON", 7, 7.5), ("D", 7.5, 11.5), ("OFF", 11.5, 16.5),
+            ("ON", 16.5, 17), ("D", 17, 17.5), ("OFF", 17.5, 19), ("D", 19, 19.5),
+        )
+        self.assertTrue(violation)
+        self.assertEqual(
+            sum("Insufficient rest" in suggestion for suggestion in suggestions), 1
+        )
+        self.assertSuggests(suggestions, "Increase rest time to 5 hours")
+
+    def test_ten_hour_rest_resets_the_limits(self):
+        violation, _ = self.check(
+            ("D", 0, 7), ("ON", 7, 7.5), ("D", 7.5, 11.5), ("OFF", 11.5, 21.5), ("D", 21.5, 27)
+        )
+        self.assertFalse(violation)
+
+    def test_gap_between_entries_counts_as_rest(self):
+        violation, _ = self.check(
+            ("D", 0, 7), ("ON", 7, 7.5), ("D", 7.5, 11.5), ("D", 21.5, 27)
+        )
+        self.assertFalse(violation)
+
+    def test_passenger_eight_hour_rest(self):
+        violation, _ = self.check(
+            ("D", 0, 6), ("ON", 6, 6.5), ("D", 6.5, 10.5), ("SB", 10.5, 18.5), ("D", 18.5, 20),
+            truck_type="passenger",
+        )
+        self.assertFalse(violation)
+
+    def test_entries_out_of_order(self):
+        with self.assertRaises(Exception):
+            self.check(("D", 2, 3), ("D", 1, 2))
+
+
+def per_driver_hos_compliance(driver):
+    """
+    The per-driver rules evaluate_hos_compliance replaced, kept as the
+    reference the vectorized engine must agree with.
+    """
+    violations = []
+
+    def add(violation_type, description):
+        violations.append(
+            {"violation_type": violation_type, "violation_description": description}
+        )
+
+    cycle_exceeded = driver.cycle_work_minutes > driver.max_cycle_work_minutes
+    cycle_description = (
+        f"Driver {driver.driver_id} exceeded their cycle limit of "
+        f"{driver.max_cycle_work_minutes / 60} hours."
+    )
+    sleeper_description = (
+        f"Driver {driver.driver_id} did not meet the sleeper berth requirement."
+    )
+
+    if driver.truck_type == "property":
+        if driver.shift_drive_minutes > (driver.max_shift_drive_minutes or 660):
+            add(
+                "11-Hour Driving Limit",
+                f"Driver {driver.driver_id} drove for more than 11 hours.",
+            )
+        if driver.shift_work_minutes > (driver.max_shift_work_minutes or 840):
+            add(
+                "14-Hour On-Duty Limit",
+                f"Driver {driver.driver_id} was on duty for more than 14 hours.",
+            )
+        if driver.shift_drive_minutes >= 480 and not driver.took_break:
+            add(
+                "30-Minute Break Requirement",
+                f"Driver {driver.driver_id} did not take a 30-minute break after 8 hours of driving.",
+            )
+        if cycle_exceeded:
+            add("60/70-Hour On-Duty Limit", cycle_description)
+        if driver.sleeper_berth_time < 420:
+            add("Sleeper Berth Provision", sleeper_description)
+
+    elif driver.truck_type == "passenger":
+        if driver.shift_drive_minutes > (driver.max_shift_drive_minutes or 600):
+            add(
+                "10-Hour Driving Limit",
+                f"Driver {driver.driver_id} drove for more than 10 hours.",
+            )
+        if driver.shift_work_minutes > (driver.max_shift_work_minutes or 900):
+            add(
+                "15-Hour On-Duty Limit",
+                f"Driver {driver.driver_id} was on duty for more than 15 hours.",
+            )
+        if cycle_exceeded:
+            add("60/70-Hour On Duty Limit", cycle_description)
+        if driver.sleeper_berth_time < 480:
+            add("Sleeper Berth Provision", sleeper_description)
+
+    return violations
+
+
+def random_driver_values(rng, i):
+    """
+    Driver columns clustered around every limit, including the 0 limits that
+    fall back to the regulatory defaults.
+    """
+    return {
+        "driver_id": f"driver-{i}",
+        "truck_type": rng.choice(["property", "passenger"]),
+        "shift_work_minutes": rng.choice([0, 839, 840, 841, 899, 900, 901, 1000]),
+        "shift_drive_minutes": rng.choice([0, 479, 480, 599, 600, 601, 660, 661]),
+        "cycle_work_minutes": rng.choice([0, 3599, 3600, 3601, 4200, 4201]),
+        "max_shift_work_minutes": rng.choice([0, 840, 900]),
+        "max_shift_drive_minutes": rng.choice([0, 600, 660]),
+        "max_cycle_work_minutes": rng.choice([3600, 4200]),
+        "took_break": rng.random() < 0.5,
+        "sleeper_berth_time": rng.choice([0, 419, 420, 479, 480, 600]),
+    }
+
+
+class HOSComplianceEquivalenceTests(SimpleTestCase):
+    def test_vectorized_rules_match_the_per_driver_rules(self):
+        rng = random.Random(1)
+        drivers = [
+            SimpleNamespace(**random_driver_values(rng, i)) for i in range(2000)
+        ]
+        rows = [
+            tuple(getattr(driver, field) for field in HOS_COMPLIANCE_FIELDS)
+            for driver in drivers
+        ]
+
+        self.assertEqual(
+            evaluate_hos_compliance(rows),
+            [per_driver_hos_compliance(driver) for driver in drivers],
+        )
+
+    def test_per_driver_wrapper_matches_the_per_driver_rules(self):
+        rng = random.Random(2)
+        for i in range(200):
+            driver = SimpleNamespace(**random_driver_values(rng, i))
+            self.assertEqual(
+                check_hos_compliance(driver), per_driver_hos_compliance(driver)
+            )
+
+    def test_no_drivers(self):
+        self.assertEqual(evaluate_hos_compliance([]), [])
+
+
+class FleetHOSComplianceTests(TestCase):
+    def test_fleet_query_matches_the_per_driver_rules(self):
+        rng = random.Random(3)
+        Driver.objects.bulk_create(
+            Driver(duty_status="D", **random_driver_values(rng, i)) for i in range(300)
+        )
+
+        expected = []
+        for driver in Driver.objects.all():
+            violations = per_driver_hos_compliance(driver)
+            if violations:
+                expected.append({driver.driver_id: violations})
+
+        self.assertTrue(expected)
+        self.assertEqual(check_fleet_hos_compliance(), expected)
+
+
+@override_settings(FLEET_SNAPSHOT_DIR="")
+class DriverFilterTests(TestCase):
+    URL = "/api/v1/drivers/"
+
+    @classmethod
+    def setUpTestData(cls):
+        def driver(driver_id, duty_status, drive, duty=0, truck_type="property"):
+            return Driver(
+                driver_id=driver_id,
+                duty_status=duty_status,
+                truck_type=truck_type,
+                shift_drive_minutes=drive,
+                shift_work_minutes=duty,
+            )
+
+        Driver.objects.bulk_create(
+            [
+                driver("fresh", "D", 0),
+                driver("last-hour", "D", 600, 700),
+                driver("out-of-drive", "D", 660, 800),
+                driver("resting", "OFF", 630),
+                driver("bus", "D", 620, truck_type="passenger"),
+            ]
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def driver_ids(self, query):
+        response = self.client.get(f"{self.URL}?{query}")
+        self.assertEqual(response.status_code, 200)
+        return sorted(driver["driver_id"] for driver in response.json())
+
+    def test_drivers_running_out_of_drive_time_within_the_hour(self):
+        query = "duty_status=D&min_drive_remaining=1&max_drive_remaining=60"
+        self.assertEqual(self.driver_ids(query), ["bus", "last-hour"])
+
+    def test_filters(self):
+        self.assertEqual(self.driver_ids("duty_status=OFF"), ["resting"])
+        self.assertEqual(self.driver_ids("truck_type=passenger"), ["bus"])
+        self.assertEqual(
+            self.driver_ids("truck_type=property&max_duty_remaining=140"),
+            ["last-hour", "out-of-drive"],
+        )
+        self.assertEqual(len(self.driver_ids("min_cycle_remaining=4200")), 5)
+        self.assertEqual(self.driver_ids("min_cycle_remaining=4201"), [])
+
+    def test_invalid_filters(self):
+        for query in ("duty_status=X", "truck_type=x", "max_drive_remaining=soon"):
+            with self.subTest(query=query):
+                response = self.client.get(f"{self.URL}?{query}")
+                self.assertEqual(response.status_code, 400)
+
+    def test_filtered_lists_bypass_the_snapshot(self):
+        with mock.patch.object(
+            caching, "get_fleet_snapshot", return_value=None
+        ) as get_fleet_snapshot:
+            self.assertEqual(
+                self.driver_ids("max_drive_remaining=60"),
+                ["bus", "last-hour", "out-of-drive", "resting"],
+            )
+            get_fleet_snapshot.assert_not_called()
+
+            self.assertEqual(len(self.driver_ids("")), 5)
+            get_fleet_snapshot.assert_called_once()
+
+    def test_blank_filters_are_ignored(self):
+        with mock.patch.object(
+            caching, "get_fleet_snapshot", return_value=None
+        ) as get_fleet_snapshot:
+            self.assertEqual(
+                len(self.driver_ids("duty_status=&max_drive_remaining=")), 5
+            )
+            get_fleet_snapshot.assert_called_once()
+
+
+class SyncUpsertTests(TestCase):
+    """
+    Counts of the native upsert and the compare-and-write fallback, which
+    must agree on every sync.
+    """
+
+    def sync_both_ways(self, check):
+        for native in (True, False):
+            with self.subTest(native_upsert=native), mock.patch.object(
+                utils, "supports_native_upsert", return_value=native
+            ):
+                Driver.objects.all().delete()
+                Truck.objects.all().delete()
+                check()
+
+    def test_inserted_updated_and_unchanged(self):
+        trucks = generate_trucks(5)
+
+        def check():
+            self.assertEqual(
+                sync_trucks(trucks), {"inserted": 5, "updated": 0, "unchanged": 0}
+            )
+            self.assertEqual(
+                sync_trucks(trucks), {"inserted": 0, "updated": 0, "unchanged": 5}
+            )
+            changed = trucks[:4] + [dict(trucks[4], speed=99)] + generate_trucks(7)[5:]
+            self.assertEqual(
+                sync_trucks(changed), {"inserted": 2, "updated": 1, "unchanged": 4}
+            )
+            self.assertEqual(Truck.objects.get(name=trucks[4]["name"]).speed, 99)
+
+        self.sync_both_ways(check)
+
+    def test_only_changed_columns_are_written(self):
+        trucks = generate_trucks(4)
+        changed = [
+            dict(trucks[0], speed=99),
+            dict(trucks[1], speed=98),
+            dict(trucks[2], location="Elsewhere"),
+            trucks[3],
+        ]
+        table = connection.ops.quote_name(Truck._meta.db_table)
+
+        def check():
+            sync_trucks(trucks)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(
+                    sync_trucks(changed), {"inserted": 0, "updated": 3, "unchanged": 1}
+                )
+
+            assigned = re.compile(r'(?:^|,)\s*"(\w+)" = ')
+            written = sorted(
+                sorted(assigned.findall(sql.split(" SET ", 1)[1]))
+                for sql in (query["sql"] for query in queries.captured_queries)
+                if " SET " in sql
+                and (sql.startswith(f"UPDATE {table} ") or f"INTO {table} " in sql)
+            )
+            self.assertEqual(
+                written, [["content_hash", "location"], ["content_hash", "speed"]]
+            )
+            self.assertEqual(Truck.objects.get(name=trucks[1]["name"]).speed, 98)
+            self.assertEqual(
+                Truck.objects.get(name=trucks[2]["name"]).location, "Elsewhere"
+            )
+
+        self.sync_both_ways(check)
+
+    def test_counts_span_chunks(self):
+        trucks = generate_trucks(25)
+
+        def check():
+            self.assertEqual(
+                sync_trucks(trucks, chunk_size=10),
+                {"inserted": 25, "updated": 0, "unchanged": 0},
+            )
+            self.assertEqual(Truck.objects.count(), 25)
+
+        self.sync_both_ways(check)
+
+    def test_key_repeated_within_a_chunk(self):
+        trucks = generate_trucks(3)
+        repeated = dict(trucks[0], speed=99)
+
+        def check():
+            self.assertEqual(
+                sync_trucks(trucks + [repeated]),
+                {"inserted": 3, "updated": 0, "unchanged": 0},
+            )
+            self.assertEqual(Truck.objects.count(), 3)
+            self.assertEqual(Truck.objects.get(name=repeated["name"]).speed, 99)
+
+            self.assertEqual(
+                sync_trucks([trucks[0], repeated]),
+                {"inserted": 0, "updated": 0, "unchanged": 1},
+            )
+            self.assertEqual(
+                sync_trucks([repeated, trucks[0]]),
+                {"inserted": 0, "updated": 1, "unchanged": 0},
+            )
+
+        self.sync_both_ways(check)
+
+    def test_driver_repeated_within_a_chunk(self):
+        trucks = generate_trucks(2)
+        drivers = generate_drivers(2, truck_count=2)
+        repeated = dict(drivers[1], shiftDriveMinutes=700)
+
+        def check():
+            sync_trucks(trucks)
+            self.assertEqual(
+                sync_drivers(drivers + [repeated]),
+                {"inserted": 2, "updated": 0, "unchanged": 0},
+            )
+            driver = Driver.objects.get(driver_id=repeated["driverId"])
+            self.assertEqual(driver.shift_drive_minutes, 700)
+
+        self.sync_both_ways(check)
+
+
+@skipUnless(connection.vendor == "postgresql", "needs the PostgreSQL profile")
+class PostgreSQLUpsertTests(TestCase):
+    """
+    Run with DB_ENGINE=postgresql to cover COPY and INSERT ... ON CONFLICT.
+    """
+
+    def check_upsert(self):
+        trucks = generate_trucks(30)
+        changed = [dict(truck, speed=99) for truck in trucks[:10]]
+
+        self.assertEqual(
+            sync_trucks(trucks + changed[:2]),
+            {"inserted": 30, "updated": 0, "unchanged": 0},
+        )
+        self.assertEqual(
+            sync_trucks(changed + trucks[10:]),
+            {"inserted": 0, "updated": 8, "unchanged": 22},
+        )
+        self.assertEqual(Truck.objects.count(), 30)
+        self.assertEqual(Truck.objects.filter(speed=99).count(), 10)
+
+    @override_settings(SYNC_COPY_MIN_ROWS=1)
+    def test_copy_upsert(self):
+        self.check_upsert()
+
+    @override_settings(SYNC_COPY_MIN_ROWS=0, SYNC_UPSERT_BATCH_SIZE=7)
+    def test_insert_on_conflict(self):
+        self.check_upsert()
+
+
+class FleetSnapshotResponseTests(TestCase):
+    """
+    Every read endpoint served from the fleet snapshot must answer with the
+    same bytes as the ORM path.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        trucks = generate_trucks(60, seed=4)
+        drivers = generate_drivers(80, truck_count=60, seed=4)
+        trucks[0]["location"] = None
+        trucks[1]["speed"] = None
+        trucks[2]["name"] = "Trück ü"
+        trucks[3]["lat"] = None
+        # Detail routes look trucks up by name through an int path converter.
+        trucks[4]["name"] = "4321"
+        drivers[0]["truckName"] = "missing"
+        drivers[1]["dutyStatusStartTime"] = None
+        drivers[2]["homeTerminalTimeZoneIana"] = None
+        sync_trucks(trucks)
+        sync_drivers(drivers)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        settings_override = override_settings(FLEET_SNAPSHOT_DIR=directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        # Small chunks so the columns are built from several of them.
+        with mock.patch.object(snapshot, "SNAPSHOT_CHUNK_SIZE", 7):
+            self.assertIsNotNone(snapshot.publish_fleet_snapshot(force=True))
+        self.assertIsNotNone(snapshot.get_fleet_snapshot())
+
+    def get(self, path):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+            if response.streaming:
+                body = b"".join(response.streaming_content)
+            else:
+                body = response.content
+        return (response.status_code, body, response.get("ETag")), len(queries)
+
+    def assertSameResponses(self, paths):
+        for path in paths:
+            with self.subTest(path=path):
+                from_snapshot, snapshot_queries = self.get(path)
+                with override_settings(FLEET_SNAPSHOT_DIR=""):
+                    from_orm, orm_queries = self.get(path)
+                self.assertEqual(from_snapshot[0], 200)
+                self.assertEqual(from_snapshot, from_orm)
+                self.assertLess(snapshot_queries, orm_queries)
+
+    def test_lists(self):
+        last_driver = Driver.objects.order_by("-id")[1].pk
+        self.assertSameResponses(
+            [
+                "/api/v1/trucks/",
+                "/api/v1/drivers/",
+                "/api/v1/trucks/?page_size=7",
+                "/api/v1/trucks/?page_size=7&cursor=20",
+                f"/api/v1/drivers/?page_size=3&cursor={last_driver}",
+                "/api/v1/trucks/?stream=true",
+                "/api/v1/drivers/?stream=1",
+            ]
+        )
+
+    def test_details(self):
+        driver_id = generate_drivers(1)[0]["driverId"]
+        self.assertSameResponses(
+            ["/api/v1/trucks/4321/", f"/api/v1/drivers/{driver_id}/"]
+        )
+
+    def test_violations(self):
+        violation = DriverViolation.objects.select_related("driver").first()
+        self.assertIsNotNone(violation)
+        self.assertSameResponses(
+            [
+                "/api/v1/violations/",
+                "/api/v1/violations/?truck_type=passenger",
+                "/api/v1/violations/?truck_type=property",
+                f"/api/v1/violations/?violation_type={violation.violation_type}",
+                "/api/v1/violations/?violation_type=unknown",
+                f"/api/v1/violations/{violation.driver.driver_id}/",
+            ]
+        )
+
+
+@override_settings(FLEET_SNAPSHOT_DIR="")
+class SyncGenerationCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Truck.objects.create(name="4321")
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, path, etag=None):
+        headers = {} if etag is None else {"HTTP_IF_NONE_MATCH": etag}
+        return self.client.get(path, **headers)
+
+    def test_not_modified_for_the_same_url(self):
+        response = self.get("/api/v1/trucks/4321/")
+        self.assertEqual(response.status_code, 200)
+        response = self.get("/api/v1/trucks/4321/", response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_of_another_url_does_not_hide_a_missing_resource(self):
+        etag = self.get("/api/v1/trucks/4321/")["ETag"]
+        response = self.get("/api/v1/trucks/1234/", etag)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header("ETag"))
+        self.assertNotEqual(self.get("/api/v1/trucks/")["ETag"], etag)
+
+
+class TruckTrackTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.truck = Truck.objects.create(name="TRUCK-TRACK")
+
+    def record(self, *seconds):
+        TruckPosition.objects.bulk_create(
+            TruckPosition(
+                truck=self.truck,
+                recorded_at=START + timedelta(seconds=second),
+                day=START.date(),
+                latitude_e6=40_000_000 + second,
+                longitude_e6=-90_000_000,
+                speed=50,
+            )
+            for second in seconds
+        )
+
+    def track(self, end_seconds, points):
+        track = truck_track(
+            self.truck, START, START + timedelta(seconds=end_seconds), points
+        )
+        return [
+            (point["recorded_at"] - START).total_seconds() for point in track["points"]
+        ]
+
+    def test_last_position_is_not_repeated(self):
+        self.record(0, 1, 2, 590)
+        self.assertEqual(self.track(600, 3), [0, 590])
+
+    def test_last_position_is_kept(self):
+        self.record(0, 100, 200, 350, 500, 590)
+        self.assertEqual(self.track(600, 3), [0, 350, 590])
+
+    def test_short_tracks_are_not_downsampled(self):
+        self.record(0, 1, 2)
+        self.assertEqual(self.track(600, 3), [0, 1, 2])
+
+    def test_downsampled_track_stays_within_points(self):
+        self.record(*range(0, 3600, 7))
+        seconds = self.track(3600, 50)
+        self.assertLessEqual(len(seconds), 50)
+        self.assertEqual(seconds, sorted(set(seconds)))
+        self.assertEqual((seconds[0], seconds[-1]), (0, 3598))
+
+
+class DriverViolationBatchTests(SimpleTestCase):
+    URL = "/api/v1/violations/batch/"
+
+    def tearDown(self):
+        if utils._hos_pool is not None:
+            utils._discard_hos_pool(utils._hos_pool)
+
+    def item(self, item_id, *entries):
+        return {
+            "id": item_id,
+            "pickup_time": START.isoformat(),
+            "dropoff_time": (START + timedelta(days=2)).isoformat(),
+            "truck_type": "property",
+            "duty_statuses": duty_log(*entries),
+        }
+
+    def batch(self):
+        return [
+            self.item("clean", ("D", 0, 4)),
+            self.item("no-break", ("D", 0, 9)),
+            {"id": "invalid", "pickup_time": "not a time"},
+            {"pickup_time": "not a time"},
+            "not an object",
+            self.item("clean"),
+            self.item("out-of-order", ("D", 2, 3), ("D", 1, 2)),
+        ]
+
+    def post(self, data):
+        return self.client.post(self.URL, data, content_type="application/json")
+
+    def check_results(self, body):
+        results = body["results"]
+        self.assertEqual(
+            list(results), ["clean", "no-break", "invalid", "out-of-order"]
+        )
+        self.assertEqual(results["clean"], {"error": "Duplicate id"})
+        self.assertTrue(results["no-break"]["violation"])
+        self.assertIn("pickup_time", results["invalid"]["error"])
+        self.assertIn("Invalid start_time", results["out-of-order"]["error"])
+
+        errors = body["errors"]
+        self.assertEqual([error["index"] for error in errors], [3, 4])
+        self.assertIn("id", errors[0]["error"])
+        self.assertIn("non_field_errors", errors[1]["error"])
+
+    def test_per_item_results_inline(self):
+        response = self.post(self.batch())
+        self.assertEqual(response.status_code, 200)
+        self.check_results(response.json())
+
+    def test_invalid_item_reusing_a_valid_id_is_a_duplicate(self):
+        body = self.post(
+            [self.item("x", ("D", 0, 4)), {"id": "x", "pickup_time": "not a time"}]
+        ).json()
+        self.assertEqual(body["results"], {"x": {"error": "Duplicate id"}})
+        self.assertEqual(body["errors"], [])
+
+    def test_items_without_an_id_do_not_collide_with_client_ids(self):
+        body = self.post(
+            [{"pickup_time": "not a time"}, self.item("0", ("D", 0, 4))]
+        ).json()
+        self.assertFalse(body["results"]["0"]["violation"])
+        self.assertEqual([error["index"] for error in body["errors"]], [0])
+
+    @override_settings(HOS_BATCH_WORKERS=2)
+    def test_per_item_results_on_the_pool(self):
+        inline = self.post(self.batch()).json()
+        with mock.patch.object(utils, "HOS_BATCH_POOL_THRESHOLD", 1):
+            pooled = self.post(self.batch()).json()
+        self.check_results(pooled)
+        self.assertEqual(pooled, inline)
+
+    @override_settings(HOS_BATCH_WORKERS=2)
+    def test_broken_pool_is_replaced(self):
+        with mock.patch.object(utils, "HOS_BATCH_POOL_THRESHOLD", 1):
+            self.assertEqual(self.post(self.batch()).status_code, 200)
+            pool = utils._hos_pool
+            # Killing one worker breaks the pool, which then terminates the
+            # others itself.
+            process = next(iter(pool._processes.values()))
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+
+            response = self.post(self.batch())
+        self.assertEqual(response.status_code, 200)
+        self.check_results(response.json())
+        self.assertIsNot(utils._hos_pool, pool)
+
+    def test_distinct_ids_of_valid_items(self):
+        items = [self.item(f"log-{i}", ("D", 0, i % 10)) for i in range(20)]
+        results = self.post(items).json()["results"]
+        self.assertEqual(list(results), [f"log-{i}" for i in range(20)])
+        self.assertEqual(
+            [results[f"log-{i}"]["violation"] for i in range(20)],
+            [i % 10 > 8 for i in range(20)],
+        )
+
+    def test_rejects_a_non_list(self):
+        response = self.post({"id": "single"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_an_oversized_batch(self):
+        with mock.patch.object(DriverViolationBatchView, "MAX_BATCH_SIZE", 2):
+            response = self.post(self.batch())
+        self.assertEqual(response.status_code, 400)
+
+
+class PagingClientTests(TestCase):
+    def stub(self, trucks, drivers=(), **kwargs):
+        server = self.enter(
+            run_stub_server(trucks=list(trucks), drivers=list(drivers), **kwargs)
+        )
+        self.enter(
+            override_settings(
+                PROLOGS_BASE_URL=server.base_url,
+                PROLOGS_TOKEN_URL=server.token_url,
+                PROLOGS_TOKEN_FILE=None,
+            )
+        )
+        return server
+
+    def enter(self, context):
+        result = context.__enter__()
+        self.addCleanup(context.__exit__, None, None, None)
+        return result
+
+    def collection_requests(self, server):
+        return server.request_count - server.token_requests
+
+    def fetch(self, server, page_size=10, concurrency=3):
+        client = AsyncPrologsAPIClient(concurrency=concurrency, page_size=page_size)
+        try:
+            trucks = asyncio.run(client.get_trucks_async())
+            return trucks, self.collection_requests(server)
+        finally:
+            client.close()
+
+    def test_pages_until_a_short_page(self):
+        for count, requests in ((25, 4), (30, 4), (40, 7), (0, 1), (10, 4)):
+            with self.subTest(count=count):
+                trucks = generate_trucks(count)
+                server = self.stub(trucks)
+                self.assertEqual(self.fetch(server), (trucks, requests))
+
+    def test_endpoint_ignoring_paging(self):
+        for count, requests in ((25, 1), (10, 4)):
+            with self.subTest(count=count):
+                trucks = generate_trucks(count)
+                server = self.stub(trucks, paging=False)
+                self.assertEqual(self.fetch(server), (trucks, requests))
+
+    def test_sync_pages_concurrently(self):
+        trucks = generate_trucks(45)
+        drivers = generate_drivers(60, truck_count=45)
+        server = self.stub(trucks, drivers)
+
+        with override_settings(PROLOGS_PAGE_CONCURRENCY=3, PROLOGS_PAGE_SIZE=10):
+            paged = db_update_all()
+        self.assertEqual(
+            paged,
+            {
+                "trucks": {"inserted": 45, "updated": 0, "unchanged": 0},
+                "drivers": {"inserted": 60, "updated": 0, "unchanged": 0},
+            },
+        )
+        # The first page and two rounds of three pages per collection.
+        self.assertEqual(self.collection_requests(server), 14)
+
+        streamed = db_update_all()
+        self.assertEqual(self.collection_requests(server), 16)
+        self.assertEqual(streamed["trucks"]["unchanged"], 45)
+        self.assertEqual(streamed["drivers"]["unchanged"], 60)
+
+
+FRESH_PROPERTY_DRIVER = ("property", 660, 840, 4200, 660, 840)
+
+
+def dispatch_load(load_id, start_hour, hours, loading_time=60, truck_type="property"):
+    return {
+        "id": load_id,
+        "pickup_time": START + timedelta(hours=start_hour),
+        "dropoff_time": START + timedelta(hours=start_hour + hours),
+        "loading_time": loading_time,
+        "truck_type": truck_type,
+    }
+
+
+class AssignLoadsTests(SimpleTestCase):
+    def assigned(self, loads, drivers):
+        assignments, unassigned = assign_loads(loads, drivers)
+        return (
+            {i: [load["id"] for load in driver_loads] for i, driver_loads in assignments.items()},
+            [(load["id"], reason) for load, reason in unassigned],
+        )
+
+    def test_multi_shift_load(self):
+        for hours in (20, 40):
+            with self.subTest(hours=hours):
+                self.assertEqual(
+                    self.assigned([dispatch_load("long", 0, hours)], [FRESH_PROPERTY_DRIVER]),
+                    ({0: ["long"]}, []),
+                )
+
+    def test_first_shift_must_fit_the_remaining_drive_time(self):
+        tired = ("property", 300, 840, 4200, 660, 840)
+        self.assertEqual(
+            self.assigned([dispatch_load("long", 0, 20)], [tired]),
+            ({}, [("long", "Not enough remaining driving time")]),
+        )
+
+    def test_whole_trip_must_fit_the_cycle(self):
+        end_of_cycle = ("property", 660, 840, 1000, 660, 840)
+        self.assertEqual(
+            self.assigned([dispatch_load("long", 0, 40)], [end_of_cycle]),
+            ({}, [("long", "Not enough remaining duty or cycle time")]),
+        )
+
+    def test_back_to_back_loads_after_a_full_rest(self):
+        loads = [dispatch_load(f"day-{day}", 24 * day, 10) for day in range(5)]
+        self.assertEqual(
+            self.assigned(loads, [FRESH_PROPERTY_DRIVER]),
+            ({0: [f"day-{day}" for day in range(5)]}, []),
+        )
+
+    def test_back_to_back_loads_without_a_full_rest(self):
+        loads = [dispatch_load("first", 0, 10), dispatch_load("second", 12, 5)]
+        self.assertEqual(
+            self.assigned(loads, [FRESH_PROPERTY_DRIVER]),
+            ({0: ["first"]}, [("second", "Not enough remaining driving time")]),
+        )
+
+    def test_rest_ending_a_multi_shift_trip_counts(self):
+        # The 40 hour trip ends 7 hours into a rest, 3 more hours restore
+        # the shift limits.
+        loads = [dispatch_load("long", 0, 40), dispatch_load("next", 43, 10)]
+        self.assertEqual(
+            self.assigned(loads, [FRESH_PROPERTY_DRIVER]),
+            ({0: ["long", "next"]}, []),
+        )
+
+    def test_busy_driver_is_not_assigned_twice(self):
+        loads = [dispatch_load("first", 0, 5), dispatch_load("overlap", 2, 5)]
+        self.assertEqual(
+            self.assigned(loads, [FRESH_PROPERTY_DRIVER]),
+            ({0: ["first"]}, [("overlap", "No available driver")]),
+        )
+
+    def test_probe_limit(self):
+        no_duty_left = ("property", 660, 10, 4200, 660, 840)
+        drivers = [no_duty_left] * 40 + [("property", 600, 840, 4200, 660, 840)]
+        self.assertEqual(
+            self.assigned([dispatch_load("load", 0, 5)], drivers),
+            ({}, [("load", DISPATCH_PROBE_LIMIT_REASON)]),
+        )
+
+
+class DispatchViewTests(TestCase):
+    def test_plans_the_assigned_loads(self):
+        Driver.objects.create(driver_id="fresh", duty_status="OFF")
+        Driver.objects.create(
+            driver_id="passenger", duty_status="OFF", truck_type="passenger"
+        )
+        loads = [
+            dispatch_load("long", 0, 20),
+            dispatch_load("next-day", 48, 10),
+            dispatch_load("no-driver", 0, 5),
+        ]
+        payload = {
+            "loads": [
+                dict(
+                    load,
+                    pickup_time=load["pickup_time"].isoformat(),
+                    dropoff_time=load["dropoff_time"].isoformat(),
+                )
+                for load in loads
+            ]
+        }
+        response = self.client.post(
+            "/api/v1/dispatch/", payload, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+        data = response.json()
+        self.assertEqual(len(data["assignments"]), 1)
+        assignment = data["assignments"][0]
+        self.assertEqual(assignment["driver_id"], "fresh")
+        self.assertEqual(
+            [load["load_id"] for load in assignment["loads"]], ["long", "next-day"]
+        )
+        self.assertTrue(assignment["loads"][0]["schedule"]["rest_periods"])
+        self.assertEqual(
+            data["unassigned"],
+            [{"load_id": "no-driver", "reason": "No available driver"}],
+        )
@@ -1,20 +1,50 @@
 from django.urls import path
+from .metrics import metrics_view
 from .views import (
     DriverViolationView,
+    DriverViolationBatchView,
     ScheduleView,
+    DispatchView,
     DriverViewSet,
+    DriverDutyStatusView,
     TruckViewSet,
+    TruckTrackView,
+    NearbyTrucksView,
+    TrucksWithinView,
     UpdateDbView,
+    SyncJobView,
 )
 
 urlpatterns = [
+    path("metrics/", metrics_view, name="metrics"),
     path("trucks/", TruckViewSet.as_view(), name="truck-list"),
+    path("trucks/nearby/", NearbyTrucksView.as_view(), name="trucks-nearby"),
+    path("trucks/within/", TrucksWithinView.as_view(), name="trucks-within"),
     path("trucks/<int:truck_id>/", TruckViewSet.as_view(), name="truck"),
+    path(
+        "trucks/<str:truck_name>/track/",
+        TruckTrackView.as_view(),
+        name="truck-track",
+    ),
     path("drivers/", DriverViewSet.as_view(), name="driver-list"),
     path("drivers/<int:driver_id>/", DriverViewSet.as_view(), name="driver"),
+    path(
+        "drivers/<int:driver_id>/duty_status/",
+        DriverDutyStatusView.as_view(),
+        name="driver-duty-status",
+    ),
     path("update_db/<str:model>/", UpdateDbView.as_view(), name="update_db"),
+    path(
+        "update_db/jobs/<uuid:job_id>/", SyncJobView.as_view(), name="sync-job"
+    ),
     path("schedule/", ScheduleView.as_view(), name="plan_schedule"),
+    path("dispatch/", DispatchView.as_view(), name="dispatch"),
     path("violations/", DriverViolationView.as_view(), name="hos-violation-list"),
+    path(
+        "violations/batch/",
+        DriverViolationBatchView.as_view(),
+        name="hos-violation-batch",
+    ),
     path(
         "violations/<int:driver_id>/",
         DriverViolationView.as_view(),
@@ -1,220 +1,1177 @@
-from datetime import timedelta
-from version1.models import Truck, Driver
-from version1.proLogsClient import PrologsAPIClient
-from django.db import transaction
+import csv
+import hashlib
+import io
+import heapq
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache, partial
+from datetime import datetime, timedelta
+from itertools import groupby, islice
+from operator import itemgetter
+import django
+import numpy as np
+from version1.models import (
+    Truck,
+    Driver,
+    DRIVER_HEADROOM,
+    DriverViolation,
+    DutyStatusEvent,
+    ON_DUTY_STATUSES,
+    COORDINATE_SCALE,
+    TruckPosition,
+    SyncState,
+    ViolationChangeSet,
+)
+from version1.metrics import SYNC_FAILURES, phase_timer, record_sync, timed_iter
+from version1.proLogsClient import open_sync_client
+from version1.snapshot import publish_fleet_snapshot
+from version1.spatial import invalidate_truck_index
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
 from dateutil import parser
 
+# Number of ProLogs records upserted per batch during a sync.
+SYNC_CHUNK_SIZE = 1000
 
-def db_update_drivers() -> bool:
-    try:
-        prologObj = PrologsAPIClient()
-        drivers_data = prologObj.get_drivers()
-
-        existing_drivers = Driver.objects.in_bulk(field_name="driver_id")
-        existing_trucks = Truck.objects.in_bulk(field_name="name")
-
-        new_drivers = []
-        update_drivers = []
-
-        for driver_data in drivers_data:
-            driver_id = driver_data["driverId"].strip()
-            truck_name = driver_data.get("truckName")
-            truck = existing_trucks.get(truck_name)
-
-            driver_defaults = {
-                "truck": truck,
-                "duty_status": driver_data.get("dutyStatus"),
-                "duty_status_start_time": driver_data.get("dutyStatusStartTime"),
-                "shift_work_minutes": driver_data.get("shiftWorkMinutes"),
-                "shift_drive_minutes": driver_data.get("shiftDriveMinutes"),
-                "cycle_work_minutes": driver_data.get("cycleWorkMinutes"),
-                "max_shift_work_minutes": driver_data.get("maxShiftWorkMinutes", 840),
-                "max_shift_drive_minutes": driver_data.get("maxShiftDriveMinutes", 660),
-                "max_cycle_work_minutes": driver_data.get("maxCycleWorkMinutes", 4200),
-                "home_terminal_timezone_windows": driver_data.get(
-                    "homeTerminalTimeZoneWindows"
-                ),
-                "home_terminal_timezone_iana": driver_data.get(
-                    "homeTerminalTimeZoneIana"
-                ),
-            }
+# Bytes of the spooled drivers payload kept in memory by db_update_all before
+# it is moved to a temporary file.
+DRIVER_SPOOL_MAX_SIZE = 8 * 1024 * 1024
 
-            if driver_id in existing_drivers:
-                driver = existing_drivers[driver_id]
-                for field, value in driver_defaults.items():
-                    setattr(driver, field, value)
-                update_drivers.append(driver)
-            else:
-                new_drivers.append(Driver(driver_id=driver_id, **driver_defaults))
+logger = logging.getLogger(__name__)
 
-        with transaction.atomic():
-            Driver.objects.bulk_create(new_drivers, ignore_conflicts=True)
-            Driver.objects.bulk_update(
-                update_drivers,
-                fields=[
-                    "truck",
-                    "duty_status",
-                    "duty_status_start_time",
-                    "shift_work_minutes",
-                    "shift_drive_minutes",
-                    "cycle_work_minutes",
-                    "max_shift_work_minutes",
-                    "max_shift_drive_minutes",
-                    "max_cycle_work_minutes",
-                    "home_terminal_timezone_windows",
-                    "home_terminal_timezone_iana",
+
+def record_fingerprint(values: dict) -> str:
+    """
+    Content hash of the synced fields of a record, stored per row so that
+    unchanged records can be skipped on the next sync.
+    """
+    payload = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def _changed_fields(instance, values: dict) -> list:
+    """
+    Return the fields of ``values`` that differ from the stored instance,
+    comparing against the value as the model field would store it.
+    """
+    changed = []
+    for field, value in values.items():
+        if getattr(instance, field) != instance._meta.get_field(field).to_python(value):
+            changed.append(field)
+    return changed
+
+
+def _dedupe_records(records) -> list:
+    """
+    Keep the last of the records sharing a key, so that a key repeated within
+    a chunk is counted and written once.
+    """
+    return list(dict(records).items())
+
+
+def _apply_delta(
+    model, existing, records, key_field, changed_keys=None, timings=None
+):
+    """
+    Insert new records and write only the changed columns of changed rows.
+
+    :param existing: dict of key -> stored instance
+    :param records: iterable of (key, values) with values keyed by field
+    :param changed_keys: optional list collecting keys inserted or updated
+    :param timings: optional dict accumulating seconds spent per phase
+    :return: dict with inserted, updated and unchanged counts
+    """
+    timings = {} if timings is None else timings
+    new_objects = []
+    # Rows are bulk updated per set of changed columns so each UPDATE only
+    # touches the columns that actually changed.
+    updates = defaultdict(list)
+    unchanged = 0
+
+    with phase_timer(timings, "diff"):
+        for key, values in _dedupe_records(records):
+            content_hash = record_fingerprint(values)
+            instance = existing.get(key)
+
+            if instance is None:
+                new_objects.append(
+                    model(**{key_field: key}, content_hash=content_hash, **values)
+                )
+                if changed_keys is not None:
+                    changed_keys.append(key)
+                continue
+
+            if instance.content_hash == content_hash:
+                unchanged += 1
+                continue
+
+            if changed_keys is not None:
+                changed_keys.append(key)
+
+            changed = _changed_fields(instance, values)
+            for field in changed:
+                setattr(instance, field, values[field])
+            instance.content_hash = content_hash
+            field_names = tuple(model._meta.get_field(f).name for f in changed)
+            updates[field_names + ("content_hash",)].append(instance)
+
+    with phase_timer(timings, "write"):
+        model.objects.bulk_create(new_objects, ignore_conflicts=True)
+        for fields, instances in updates.items():
+            model.objects.bulk_update(instances, fields=list(fields))
+
+    return {
+        "inserted": len(new_objects),
+        "updated": sum(len(instances) for instances in updates.values()),
+        "unchanged": unchanged,
+    }
+
+
+def supports_native_upsert() -> bool:
+    """
+    Whether the database can upsert with INSERT ... ON CONFLICT DO UPDATE.
+    """
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 24, 0)
+    return False
+
+
+def _upsert(model, objects, key_field: str, update_fields):
+    """
+    Insert the objects, updating ``update_fields`` of the rows whose
+    ``key_field`` already exists, in batches of settings.SYNC_UPSERT_BATCH_SIZE
+    rows per statement, or through COPY for large PostgreSQL chunks.
+    """
+    if not objects:
+        return
+
+    opts = model._meta
+    fields = [field for field in opts.concrete_fields if not field.primary_key]
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(field.column) for field in fields)
+    assignments = ", ".join(
+        f"{quote(column)} = excluded.{quote(column)}"
+        for column in (opts.get_field(name).column for name in update_fields)
+    )
+    if (
+        connection.vendor == "postgresql"
+        and settings.SYNC_COPY_MIN_ROWS
+        and len(objects) >= settings.SYNC_COPY_MIN_ROWS
+    ):
+        return _copy_upsert(model, objects, key_field, fields, assignments)
+
+    row = "(" + ", ".join(["%s"] * len(fields)) + ")"
+    batch_size = min(
+        settings.SYNC_UPSERT_BATCH_SIZE,
+        connection.ops.bulk_batch_size(fields, objects) or len(objects),
+    )
+
+    with connection.cursor() as cursor:
+        for batch in _chunked(objects, batch_size):
+            cursor.execute(
+                f"INSERT INTO {quote(opts.db_table)} ({columns}) "
+                f"VALUES {', '.join([row] * len(batch))} "
+                f"ON CONFLICT ({quote(opts.get_field(key_field).column)}) "
+                f"DO UPDATE SET {assignments}",
+                [
+                    field.get_db_prep_save(field.pre_save(obj, True), connection)
+                    for obj in batch
+                    for field in fields
                 ],
             )
-    except Exception as ex:
-        print(f"Eception in db_update_drivers : {ex}")
-        return False
-    else:
-        return True
 
 
-def db_update_trucks() -> bool:
-    try:
-        prologObj = PrologsAPIClient()
-        trucks_data = prologObj.get_trucks()
-
-        new_trucks = []
-        update_trucks = []
-        existing_trucks = Truck.objects.in_bulk(field_name="name")
-
-        for truck_data in trucks_data:
-            truck_name = truck_data["name"].strip()
-            location = truck_data.get("location")
-            latitude = truck_data.get("lat")
-            longitude = truck_data.get("lng")
-            speed = truck_data.get("speed")
-
-            if truck_name in existing_trucks:
-                truck = existing_trucks[truck_name]
-                truck.location = location
-                truck.latitude = latitude
-                truck.longitude = longitude
-                truck.speed = speed
-                update_trucks.append(truck)
+# NULL marker of the CSV rows sent through COPY.
+COPY_NULL = r"\N"
+
+
+def _copy_upsert(model, objects, key_field: str, fields, assignments: str):
+    """
+    PostgreSQL bulk load: COPY the rows into a temporary table, then upsert
+    them into the model's table with a single INSERT ... SELECT.
+    """
+    opts = model._meta
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(field.column) for field in fields)
+    staging = quote(f"{opts.db_table}_sync_load")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for obj in objects:
+        writer.writerow(
+            [
+                COPY_NULL if value is None else value
+                for value in (
+                    field.get_db_prep_save(field.pre_save(obj, True), connection)
+                    for field in fields
+                )
+            ]
+        )
+    buffer.seek(0)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {quote(opts.db_table)} WITH NO DATA"
+        )
+        cursor.execute(f"TRUNCATE {staging}")
+        cursor.cursor.copy_expert(
+            f"COPY {staging} ({columns}) FROM STDIN "
+            f"WITH (FORMAT csv, NULL '{COPY_NULL}')",
+            buffer,
+        )
+        cursor.execute(
+            f"INSERT INTO {quote(opts.db_table)} ({columns}) "
+            f"SELECT {columns} FROM {staging} "
+            f"ON CONFLICT ({quote(opts.get_field(key_field).column)}) "
+            f"DO UPDATE SET {assignments}"
+        )
+
+
+def _apply_upsert(model, records, key_field, changed_keys=None, timings=None):
+    """
+    Upsert new and changed records with one native statement per batch.
+
+    Only the content hashes of the chunk's keys are read to tell inserts,
+    updates and unchanged records apart, and unchanged records are not
+    written at all. The stored rows of changed records are then loaded so
+    that, as in _apply_delta, updates are grouped by their set of changed
+    columns and each statement only assigns the columns that changed.
+
+    :param records: iterable of (key, values) with values keyed by field
+    :param changed_keys: optional list collecting keys inserted or updated
+    :param timings: optional dict accumulating seconds spent per phase
+    :return: dict with inserted, updated and unchanged counts
+    """
+    timings = {} if timings is None else timings
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    new_objects = []
+    changed_records = []
+    updates = defaultdict(list)
+    insert_fields = None
+
+    with phase_timer(timings, "diff"):
+        records = _dedupe_records(records)
+        stored_hashes = dict(
+            model.objects.filter(
+                **{f"{key_field}__in": [key for key, _ in records]}
+            ).values_list(key_field, "content_hash")
+        )
+
+        for key, values in records:
+            content_hash = record_fingerprint(values)
+            stored_hash = stored_hashes.get(key, False)
+            if stored_hash == content_hash:
+                counts["unchanged"] += 1
+                continue
+
+            if changed_keys is not None:
+                changed_keys.append(key)
+            if stored_hash is not False:
+                changed_records.append((key, values, content_hash))
+                continue
+
+            new_objects.append(
+                model(**{key_field: key}, content_hash=content_hash, **values)
+            )
+            if insert_fields is None:
+                insert_fields = [
+                    model._meta.get_field(field).name for field in values
+                ] + ["content_hash"]
+
+        existing = model.objects.in_bulk(
+            [key for key, _, _ in changed_records], field_name=key_field
+        )
+        for key, values, content_hash in changed_records:
+            instance = existing.get(key)
+            # A row deleted since the hashes were read is written in full.
+            if instance is None:
+                changed = list(values)
             else:
-                new_trucks.append(
-                    Truck(
-                        name=truck_name,
-                        location=location,
-                        latitude=latitude,
-                        longitude=longitude,
-                        speed=speed,
+                changed = _changed_fields(instance, values)
+            field_names = tuple(model._meta.get_field(f).name for f in changed)
+            updates[field_names + ("content_hash",)].append(
+                model(**{key_field: key}, content_hash=content_hash, **values)
+            )
+
+    counts["inserted"] = len(new_objects)
+    counts["updated"] = len(changed_records)
+
+    with phase_timer(timings, "write"):
+        _upsert(model, new_objects, key_field, insert_fields)
+        for fields, objects in updates.items():
+            _upsert(model, objects, key_field, fields)
+
+    return counts
+
+
+def _sync_records(model, records, key_field, changed_keys=None, timings=None):
+    """
+    Write a chunk of synced records with a native upsert where the database
+    has one, otherwise by comparing against the stored rows.
+    """
+    if supports_native_upsert():
+        return _apply_upsert(model, records, key_field, changed_keys, timings)
+
+    timings = {} if timings is None else timings
+    with phase_timer(timings, "diff"):
+        existing = model.objects.in_bulk(
+            [key for key, _ in records], field_name=key_field
+        )
+    return _apply_delta(model, existing, records, key_field, changed_keys, timings)
+
+
+# Sync generations whose violation changes are kept for clients catching up.
+VIOLATION_CHANGE_RETENTION = 100
+
+
+def current_sync_generation() -> int:
+    """
+    Generation of the synced data, changing whenever a sync wrote rows.
+    """
+    generation = SyncState.objects.filter(pk=1).values_list("generation", flat=True)
+    return generation.first() or 0
+
+
+def bump_sync_generation() -> int:
+    """
+    Move to the next sync generation once a sync's chunks are committed, and
+    drop old violation change sets. Responses rendered while the sync was
+    still writing belong to the previous generation and are invalidated with
+    it. The fleet snapshot of the new generation is published once the
+    transaction commits.
+
+    :return: the new generation
+    """
+    if not SyncState.objects.filter(pk=1).update(generation=F("generation") + 1):
+        SyncState.objects.get_or_create(pk=1, defaults={"generation": 1})
+
+    generation = current_sync_generation()
+    ViolationChangeSet.objects.filter(
+        generation__lte=generation - VIOLATION_CHANGE_RETENTION
+    ).delete()
+    transaction.on_commit(publish_fleet_snapshot)
+    return generation
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _driver_values(driver_data, truck_ids):
+    return {
+        "truck_id": truck_ids.get(driver_data.get("truckName")),
+        "duty_status": driver_data.get("dutyStatus"),
+        "duty_status_start_time": driver_data.get("dutyStatusStartTime"),
+        "shift_work_minutes": driver_data.get("shiftWorkMinutes"),
+        "shift_drive_minutes": driver_data.get("shiftDriveMinutes"),
+        "cycle_work_minutes": driver_data.get("cycleWorkMinutes"),
+        "max_shift_work_minutes": driver_data.get("maxShiftWorkMinutes", 840),
+        "max_shift_drive_minutes": driver_data.get("maxShiftDriveMinutes", 660),
+        "max_cycle_work_minutes": driver_data.get("maxCycleWorkMinutes", 4200),
+        "home_terminal_timezone_windows": driver_data.get(
+            "homeTerminalTimeZoneWindows"
+        ),
+        "home_terminal_timezone_iana": driver_data.get("homeTerminalTimeZoneIana"),
+    }
+
+
+def _truck_values(truck_data):
+    return {
+        "location": truck_data.get("location"),
+        "latitude": truck_data.get("lat"),
+        "longitude": truck_data.get("lng"),
+        "speed": truck_data.get("speed"),
+    }
+
+
+def _add_counts(counts: dict, chunk_counts: dict):
+    for key, count in chunk_counts.items():
+        counts[key] += count
+
+
+def sync_drivers(
+    drivers_data, chunk_size: int = SYNC_CHUNK_SIZE, progress=None
+) -> dict:
+    """
+    Upsert ProLogs driver records in chunks of ``chunk_size``, each chunk in
+    its own transaction, so the sync never holds the database write lock for
+    longer than one chunk. Only the drivers and trucks referenced by the
+    current chunk are loaded, so memory depends on the chunk size and not the
+    fleet size. Stored violations are recomputed and duty status changes
+    recorded for the inserted and updated drivers, and the drivers whose
+    violations changed are saved as the ViolationChangeSet of the new sync
+    generation.
+
+    :param progress: optional callable receiving ("drivers", counts so far)
+        after each committed chunk
+    :return: dict with inserted, updated and unchanged counts
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    timings = {}
+    violation_changes = []
+
+    try:
+        for chunk in timed_iter(_chunked(drivers_data, chunk_size), timings, "fetch"):
+            chunk_changes = []
+            with transaction.atomic():
+                with phase_timer(timings, "diff"):
+                    truck_names = {
+                        driver_data.get("truckName") for driver_data in chunk
+                    }
+                    truck_ids = dict(
+                        Truck.objects.filter(name__in=truck_names).values_list(
+                            "name", "id"
+                        )
                     )
+                    records = [
+                        (
+                            driver_data["driverId"].strip(),
+                            _driver_values(driver_data, truck_ids),
+                        )
+                        for driver_data in chunk
+                    ]
+                changed_driver_ids = []
+                chunk_counts = _sync_records(
+                    Driver, records, "driver_id", changed_driver_ids, timings
                 )
+                with phase_timer(timings, "write"):
+                    refresh_driver_violations(changed_driver_ids, chunk_changes)
+                    record_duty_status_events(changed_driver_ids)
+            _add_counts(counts, chunk_counts)
+            violation_changes.extend(chunk_changes)
+            if progress is not None:
+                progress("drivers", dict(counts))
+    finally:
+        # Committed chunks get a new generation even when a later one failed.
+        if counts["inserted"] or counts["updated"]:
+            with transaction.atomic():
+                generation = bump_sync_generation()
+                if violation_changes:
+                    ViolationChangeSet.objects.create(
+                        generation=generation, changes=violation_changes
+                    )
 
-        with transaction.atomic():
-            Truck.objects.bulk_create(new_trucks, ignore_conflicts=True)
-            Truck.objects.bulk_update(
-                update_trucks, fields=["location", "latitude", "longitude", "speed"]
-            )
-    except Exception as ex:
-        print(f"Eception in db_update_trucks : {ex}")
+    record_sync("drivers", counts, timings)
+    return counts
+
+
+def sync_trucks(
+    trucks_data, chunk_size: int = SYNC_CHUNK_SIZE, progress=None
+) -> dict:
+    """
+    Upsert ProLogs truck records in chunks of ``chunk_size``, each chunk in
+    its own transaction. The positions of inserted and updated trucks are
+    appended to their position history.
+
+    :param progress: optional callable receiving ("trucks", counts so far)
+        after each committed chunk
+    :return: dict with inserted, updated and unchanged counts
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    timings = {}
+    recorded_at = timezone.now()
+
+    try:
+        for chunk in timed_iter(_chunked(trucks_data, chunk_size), timings, "fetch"):
+            with transaction.atomic():
+                with phase_timer(timings, "diff"):
+                    records = [
+                        (truck_data["name"].strip(), _truck_values(truck_data))
+                        for truck_data in chunk
+                    ]
+                changed_names = []
+                chunk_counts = _sync_records(
+                    Truck, records, "name", changed_names, timings
+                )
+                with phase_timer(timings, "write"):
+                    record_truck_positions(changed_names, recorded_at)
+            _add_counts(counts, chunk_counts)
+            if progress is not None:
+                progress("trucks", dict(counts))
+
+        prune_truck_positions()
+    finally:
+        # Committed chunks get a new generation even when a later one failed.
+        if counts["inserted"] or counts["updated"]:
+            with transaction.atomic():
+                bump_sync_generation()
+                transaction.on_commit(invalidate_truck_index)
+
+    record_sync("trucks", counts, timings)
+    return counts
+
+
+def record_truck_positions(truck_names, recorded_at) -> int:
+    """
+    Append the current position of the given trucks to their history, with
+    coordinates stored as fixed-point integers.
+
+    :param truck_names: iterable of Truck.name
+    :return: number of positions appended
+    """
+    positions = [
+        TruckPosition(
+            truck_id=pk,
+            day=recorded_at.date(),
+            recorded_at=recorded_at,
+            latitude_e6=round(latitude * COORDINATE_SCALE),
+            longitude_e6=round(longitude * COORDINATE_SCALE),
+            speed=speed,
+        )
+        for pk, latitude, longitude, speed in Truck.objects.filter(
+            name__in=truck_names, latitude__isnull=False, longitude__isnull=False
+        ).values_list("id", "latitude", "longitude", "speed")
+    ]
+    TruckPosition.objects.bulk_create(positions, batch_size=SYNC_CHUNK_SIZE)
+    return len(positions)
+
+
+def prune_truck_positions(retention_days=None) -> int:
+    """
+    Drop the days of position history older than the retention period
+    (settings.TRUCK_POSITION_RETENTION_DAYS, 0 keeps everything).
+
+    :return: number of positions deleted
+    """
+    if retention_days is None:
+        retention_days = settings.TRUCK_POSITION_RETENTION_DAYS
+    if not retention_days:
+        return 0
+
+    cutoff = timezone.now().date() - timedelta(days=retention_days)
+    deleted, _ = TruckPosition.objects.filter(day__lt=cutoff).delete()
+    return deleted
+
+
+def truck_track(truck, start, end, points: int):
+    """
+    Positions of the truck between start and end, downsampled to at most
+    ``points`` positions.
+
+    The range is split into ``points - 1`` equal time buckets and the first
+    position of each bucket is kept along with the last position, so long
+    stops collapse to a single point while the track keeps its shape.
+
+    :return: dict with the number of stored positions and the kept positions
+    """
+    rows = list(
+        truck.positions.filter(recorded_at__gte=start, recorded_at__lte=end)
+        .order_by("recorded_at")
+        .values_list("recorded_at", "latitude_e6", "longitude_e6", "speed")
+    )
+    total = len(rows)
+
+    if total > points:
+        seconds = np.array([(row[0] - start).total_seconds() for row in rows])
+        bucket_seconds = max((end - start).total_seconds(), 1) / (points - 1)
+        buckets = np.minimum(seconds // bucket_seconds, points - 2)
+        _, keep = np.unique(buckets, return_index=True)
+        keep = keep.tolist()
+        if keep[-1] != total - 1:
+            keep.append(total - 1)
+        rows = [rows[i] for i in keep]
+
+    return {
+        "total_points": total,
+        "points": [
+            {
+                "recorded_at": recorded_at,
+                "latitude": latitude_e6 / COORDINATE_SCALE,
+                "longitude": longitude_e6 / COORDINATE_SCALE,
+                "speed": speed,
+            }
+            for recorded_at, latitude_e6, longitude_e6, speed in rows
+        ],
+    }
+
+
+def db_update_drivers(progress=None):
+    """
+    Sync drivers from ProLogs, streaming the payload and writing only rows
+    whose content changed.
+
+    :param progress: optional progress callable passed to sync_drivers
+    :return: dict with inserted, updated and unchanged counts, False on failure
+    """
+    try:
+        with open_sync_client() as prologObj:
+            return sync_drivers(prologObj.stream_drivers(), progress=progress)
+    except Exception:
+        logger.exception("Failed to sync drivers")
+        SYNC_FAILURES.inc(model="drivers")
         return False
-    else:
-        return True
 
 
-def check_hos_compliance(driver):
+def db_update_trucks(progress=None):
     """
-    Evaluates HOS compliance for a given driver based on FMCSA regulations.
+    Sync trucks from ProLogs, streaming the payload and writing only rows
+    whose content changed.
+
+    :param progress: optional progress callable passed to sync_trucks
+    :return: dict with inserted, updated and unchanged counts, False on failure
     """
-    violations = []
-    duty_time = driver.shift_work_minutes
+    try:
+        with open_sync_client() as prologObj:
+            return sync_trucks(prologObj.stream_trucks(), progress=progress)
+    except Exception:
+        logger.exception("Failed to sync trucks")
+        SYNC_FAILURES.inc(model="trucks")
+        return False
 
-    if driver.truck_type == "property":
-        max_drive_minutes = driver.max_shift_drive_minutes or 660  # 11 hours
-        max_duty_minutes = driver.max_shift_work_minutes or 840  # 14 hours
 
-        # Check 11-hour driving limit
-        if driver.shift_drive_minutes > max_drive_minutes:
-            violations.append(
-                {
-                    "violation_type": "11-Hour Driving Limit",
-                    "violation_description": f"Driver {driver.driver_id} drove for more than 11 hours.",
-                }
+def _spool_records(records, spool, cancelled):
+    """
+    Write streamed records to a spool file as JSON lines.
+
+    :param records: iterator of records, closed when spooling stops
+    :param spool: binary file the records are appended to
+    :param cancelled: threading.Event that stops the download when set
+    :return: number of records written, None if cancelled
+    """
+    count = 0
+    try:
+        for record in records:
+            if cancelled.is_set():
+                return None
+            spool.write(json.dumps(record).encode())
+            spool.write(b"\n")
+            count += 1
+    finally:
+        records.close()
+    return count
+
+
+def _read_spool(spool):
+    """
+    Yield the records written by _spool_records from the start of the spool.
+    """
+    spool.seek(0)
+    for line in spool:
+        yield json.loads(line)
+
+
+def db_update_all(progress=None):
+    """
+    Sync trucks and then drivers from ProLogs as one pipeline.
+
+    The drivers payload is streamed on a background thread into a spooled
+    temporary file while trucks are streamed and upserted, then drivers are
+    resolved against the freshly written trucks. Memory stays bounded by
+    DRIVER_SPOOL_MAX_SIZE whatever the fleet size, and the drivers download is
+    cancelled as soon as the trucks sync fails.
+
+    :param progress: optional progress callable passed to both syncs
+    :return: dict with trucks and drivers counts, False on failure
+    """
+    cancelled = threading.Event()
+    with open_sync_client() as prologObj, tempfile.SpooledTemporaryFile(
+        max_size=DRIVER_SPOOL_MAX_SIZE
+    ) as spool, ThreadPoolExecutor(max_workers=1) as executor:
+        try:
+            drivers_future = executor.submit(
+                _spool_records, prologObj.stream_drivers(), spool, cancelled
             )
+            try:
+                trucks = sync_trucks(prologObj.stream_trucks(), progress=progress)
+            except BaseException:
+                cancelled.set()
+                raise
+
+            drivers_future.result()
+            drivers = sync_drivers(_read_spool(spool), progress=progress)
+        except Exception:
+            logger.exception("Failed to sync trucks and drivers")
+            SYNC_FAILURES.inc(model="all")
+            return False
+
+    return {"trucks": trucks, "drivers": drivers}
+
+
+# Column order of the rows consumed by evaluate_hos_compliance.
+HOS_COMPLIANCE_FIELDS = (
+    "driver_id",
+    "truck_type",
+    "shift_work_minutes",
+    "shift_drive_minutes",
+    "cycle_work_minutes",
+    "max_shift_work_minutes",
+    "max_shift_drive_minutes",
+    "max_cycle_work_minutes",
+    "took_break",
+    "sleeper_berth_time",
+)
+
+
+def evaluate_hos_compliance(rows):
+    """
+    Evaluates HOS compliance for many drivers at once based on FMCSA regulations.
+
+    Every rule is evaluated as a NumPy mask over the whole column, so the cost
+    per driver is a handful of array operations instead of a Python call.
+
+    :param rows: sequence of tuples ordered as HOS_COMPLIANCE_FIELDS
+    :return: list with the violations of each row, in the order of rows
+    """
+    results = [[] for _ in rows]
+    if not rows:
+        return results
+
+    (
+        driver_ids,
+        truck_types,
+        shift_work,
+        shift_drive,
+        cycle_work,
+        max_shift_work,
+        max_shift_drive,
+        max_cycle_work,
+        took_break,
+        sleeper_berth,
+    ) = zip(*rows)
+
+    truck_type = np.array(truck_types, dtype=object)
+    duty_time = np.array(shift_work, dtype=np.int64)
+    drive_time = np.array(shift_drive, dtype=np.int64)
+    cycle_time = np.array(cycle_work, dtype=np.int64)
+    max_duty = np.array(max_shift_work, dtype=np.int64)
+    max_drive = np.array(max_shift_drive, dtype=np.int64)
+    max_cycle = np.array(max_cycle_work, dtype=np.int64)
+    took_break = np.array(took_break, dtype=bool)
+    sleeper_time = np.array(sleeper_berth, dtype=np.int64)
 
-        # Check 14-hour on-duty limit
-        if duty_time > max_duty_minutes:
-            violations.append(
+    is_property = truck_type == "property"
+    is_passenger = truck_type == "passenger"
+
+    # A limit of 0 falls back to the regulatory default, 11/14 hours for
+    # property and 10/15 hours for passenger carriers.
+    max_drive_minutes = np.where(
+        max_drive != 0, max_drive, np.where(is_property, 660, 600)
+    )
+    max_duty_minutes = np.where(
+        max_duty != 0, max_duty, np.where(is_property, 840, 900)
+    )
+    drive_exceeded = drive_time > max_drive_minutes
+    duty_exceeded = duty_time > max_duty_minutes
+    cycle_exceeded = cycle_time > max_cycle
+
+    # Rules are listed in the order violations are reported for a driver;
+    # property and passenger masks are disjoint so the order holds per type.
+    rules = [
+        (
+            is_property & drive_exceeded,
+            "11-Hour Driving Limit",
+            "Driver {driver_id} drove for more than 11 hours.",
+        ),
+        (
+            is_property & duty_exceeded,
+            "14-Hour On-Duty Limit",
+            "Driver {driver_id} was on duty for more than 14 hours.",
+        ),
+        (
+            is_property & (drive_time >= 480) & ~took_break,
+            "30-Minute Break Requirement",
+            "Driver {driver_id} did not take a 30-minute break after 8 hours of driving.",
+        ),
+        (
+            is_property & cycle_exceeded,
+            "60/70-Hour On-Duty Limit",
+            "Driver {driver_id} exceeded their cycle limit of {cycle_hours} hours.",
+        ),
+        (
+            is_property & (sleeper_time < 420),  # 7 hours
+            "Sleeper Berth Provision",
+            "Driver {driver_id} did not meet the sleeper berth requirement.",
+        ),
+        (
+            is_passenger & drive_exceeded,
+            "10-Hour Driving Limit",
+            "Driver {driver_id} drove for more than 10 hours.",
+        ),
+        (
+            is_passenger & duty_exceeded,
+            "15-Hour On-Duty Limit",
+            "Driver {driver_id} was on duty for more than 15 hours.",
+        ),
+        (
+            is_passenger & cycle_exceeded,
+            "60/70-Hour On Duty Limit",
+            "Driver {driver_id} exceeded their cycle limit of {cycle_hours} hours.",
+        ),
+        (
+            is_passenger & (sleeper_time < 480),  # 8 hours
+            "Sleeper Berth Provision",
+            "Driver {driver_id} did not meet the sleeper berth requirement.",
+        ),
+    ]
+
+    for mask, violation_type, description in rules:
+        for i in np.flatnonzero(mask).tolist():
+            results[i].append(
                 {
-                    "violation_type": "14-Hour On-Duty Limit",
-                    "violation_description": f"Driver {driver.driver_id} was on duty for more than 14 hours.",
+                    "violation_type": violation_type,
+                    "violation_description": description.format(
+                        driver_id=driver_ids[i],
+                        cycle_hours=max_cycle_work[i] / 60,
+                    ),
                 }
             )
 
-        # Check 30-minute driving break requirement
-        if driver.shift_drive_minutes >= 480 and not driver.took_break:
-            violations.append(
-                {
-                    "violation_type": "30-Minute Break Requirement",
-                    "violation_description": f"Driver {driver.driver_id} did not take a 30-minute break after 8 hours of driving.",
-                }
+    return results
+
+
+def check_fleet_hos_compliance(queryset=None):
+    """
+    Evaluates HOS compliance for every driver of the queryset with one query.
+
+    :return: list of {driver_id: violations} for drivers with violations
+    """
+    if queryset is None:
+        queryset = Driver.objects.all()
+
+    rows = list(queryset.values_list(*HOS_COMPLIANCE_FIELDS))
+    violations = evaluate_hos_compliance(rows)
+
+    return [
+        {row[0]: violation}
+        for row, violation in zip(rows, violations)
+        if violation
+    ]
+
+
+def _violation_changes(rows, violations, stored_violations) -> list:
+    """
+    Diff freshly evaluated violations against the stored ones.
+
+    :return: list of {driver_id, appeared, cleared} for drivers whose
+        violations changed
+    """
+    previous = defaultdict(dict)
+    for pk, violation_type, description in stored_violations.values_list(
+        "driver_id", "violation_type", "violation_description"
+    ):
+        previous[pk][violation_type] = description
+
+    changes = []
+    for row, driver_violations in zip(rows, violations):
+        before = previous.get(row[0], {})
+        current = {
+            violation["violation_type"]: violation["violation_description"]
+            for violation in driver_violations
+        }
+        appeared = [
+            {"violation_type": violation_type, "violation_description": description}
+            for violation_type, description in current.items()
+            if before.get(violation_type) != description
+        ]
+        cleared = [
+            violation_type for violation_type in before if violation_type not in current
+        ]
+        if appeared or cleared:
+            changes.append(
+                {"driver_id": row[1], "appeared": appeared, "cleared": cleared}
             )
 
-        # Check 60/70-hour limit
-        if driver.cycle_work_minutes > driver.max_cycle_work_minutes:
-            violations.append(
-                {
-                    "violation_type": "60/70-Hour On-Duty Limit",
-                    "violation_description": f"Driver {driver.driver_id} exceeded their cycle limit of {driver.max_cycle_work_minutes / 60} hours.",
-                }
+    return changes
+
+
+def refresh_driver_violations(driver_ids=None, changes=None) -> int:
+    """
+    Recompute the stored DriverViolation rows of the given drivers.
+
+    :param driver_ids: iterable of Driver.driver_id, all drivers if None
+    :param changes: optional list collecting, per driver whose violations
+        differ from the stored ones, the violations that appeared and the
+        violation types that cleared
+    :return: number of violations stored
+    """
+    if driver_ids is None:
+        # A full rebuild is its own sync generation and records its changes.
+        changes = [] if changes is None else changes
+        chunks = _chunked(
+            Driver.objects.order_by("id")
+            .values_list("id", *HOS_COMPLIANCE_FIELDS)
+            .iterator(),
+            SYNC_CHUNK_SIZE,
+        )
+    else:
+        chunks = (
+            Driver.objects.filter(driver_id__in=ids).values_list(
+                "id", *HOS_COMPLIANCE_FIELDS
             )
+            for ids in _chunked(driver_ids, SYNC_CHUNK_SIZE)
+        )
 
-        # Check sleeper berth provision
-        if driver.sleeper_berth_time < 420:  # 7 hours
-            violations.append(
-                {
-                    "violation_type": "Sleeper Berth Provision",
-                    "violation_description": f"Driver {driver.driver_id} did not meet the sleeper berth requirement.",
-                }
+    stored = 0
+    with transaction.atomic():
+        for rows in chunks:
+            rows = list(rows)
+            violations = evaluate_hos_compliance([row[1:] for row in rows])
+            new_violations = [
+                DriverViolation(driver_id=row[0], truck_type=row[2], **violation)
+                for row, driver_violations in zip(rows, violations)
+                for violation in driver_violations
+            ]
+            stored_violations = DriverViolation.objects.filter(
+                driver_id__in=[row[0] for row in rows]
             )
+            if changes is not None:
+                changes.extend(
+                    _violation_changes(rows, violations, stored_violations)
+                )
+            stored_violations.delete()
+            DriverViolation.objects.bulk_create(new_violations)
+            stored += len(new_violations)
 
-    elif driver.truck_type == "passenger":
-        max_drive_minutes = driver.max_shift_drive_minutes or 600  # 10 hours
-        max_duty_minutes = driver.max_shift_work_minutes or 900  # 15 hours
+        if driver_ids is None:
+            generation = bump_sync_generation()
+            if changes:
+                ViolationChangeSet.objects.create(
+                    generation=generation, changes=changes
+                )
 
-        # Check 10-hour driving limit
-        if driver.shift_drive_minutes > max_drive_minutes:
-            violations.append(
-                {
-                    "violation_type": "10-Hour Driving Limit",
-                    "violation_description": f"Driver {driver.driver_id} drove for more than 10 hours.",
-                }
-            )
+    return stored
 
-        # Check 15-hour on-duty limit
-        if duty_time > max_duty_minutes:
-            violations.append(
-                {
-                    "violation_type": "15-Hour On-Duty Limit",
-                    "violation_description": f"Driver {driver.driver_id} was on duty for more than 15 hours.",
-                }
+
+def record_duty_status_events(driver_ids) -> int:
+    """
+    Append a DutyStatusEvent for every given driver whose current duty status
+    differs from its open event. The open event is closed and its duration
+    added to the running totals carried by the new event.
+
+    :param driver_ids: iterable of Driver.driver_id
+    :return: number of events appended
+    """
+    appended = 0
+
+    for ids in _chunked(driver_ids, SYNC_CHUNK_SIZE):
+        drivers = list(
+            Driver.objects.filter(
+                driver_id__in=ids, duty_status_start_time__isnull=False
+            ).values_list("id", "duty_status", "duty_status_start_time")
+        )
+        open_events = {
+            event.driver_id: event
+            for event in DutyStatusEvent.objects.filter(
+                driver_id__in=[pk for pk, _, _ in drivers], end_time__isnull=True
             )
+        }
+        new_events = []
+        updated_events = []
 
-        # Check 60/70-hour limit
-        if driver.cycle_work_minutes > driver.max_cycle_work_minutes:
-            violations.append(
-                {
-                    "violation_type": "60/70-Hour On Duty Limit",
-                    "violation_description": f"Driver {driver.driver_id} exceeded their cycle limit of {driver.max_cycle_work_minutes / 60} hours.",
-                }
+        for pk, duty_status, start_time in drivers:
+            previous = open_events.get(pk)
+            on_duty_seconds = driving_seconds = 0
+
+            if previous is not None:
+                if previous.start_time == start_time:
+                    # Same period, upstream only corrected its status.
+                    if previous.duty_status != duty_status:
+                        previous.duty_status = duty_status
+                        updated_events.append(previous)
+                    continue
+                if start_time < previous.start_time:
+                    continue  # events are only appended in time order
+
+                elapsed = int((start_time - previous.start_time).total_seconds())
+                on_duty_seconds = previous.on_duty_seconds_before
+                driving_seconds = previous.driving_seconds_before
+                if previous.duty_status in ON_DUTY_STATUSES:
+                    on_duty_seconds += elapsed
+                if previous.duty_status == "D":
+                    driving_seconds += elapsed
+
+                previous.end_time = start_time
+                updated_events.append(previous)
+
+            new_events.append(
+                DutyStatusEvent(
+                    driver_id=pk,
+                    duty_status=duty_status,
+                    start_time=start_time,
+                    on_duty_seconds_before=on_duty_seconds,
+                    driving_seconds_before=driving_seconds,
+                )
             )
 
-        # Check sleeper berth provision
-        if driver.sleeper_berth_time < 480:
-            violations.append(
-                {
-                    "violation_type": "Sleeper Berth Provision",
-                    "violation_description": f"Driver {driver.driver_id} did not meet the sleeper berth requirement.",
-                }
+        with transaction.atomic():
+            DutyStatusEvent.objects.bulk_update(
+                updated_events, fields=["duty_status", "end_time"]
             )
+            DutyStatusEvent.objects.bulk_create(new_events)
+        appended += len(new_events)
+
+    return appended
+
+
+def _event_at(driver, at):
+    return (
+        driver.duty_status_events.filter(start_time__lte=at)
+        .order_by("-start_time")
+        .first()
+    )
+
+
+def _duty_seconds_until(driver, at):
+    """
+    On-duty and driving seconds of the driver's recorded history before
+    ``at``, from a single indexed lookup of the event covering ``at``.
+    """
+    event = _event_at(driver, at)
+    if event is None:
+        return 0, 0
+
+    end = min(at, event.end_time) if event.end_time else at
+    elapsed = (end - event.start_time).total_seconds()
+    on_duty_seconds = event.on_duty_seconds_before
+    driving_seconds = event.driving_seconds_before
+    if event.duty_status in ON_DUTY_STATUSES:
+        on_duty_seconds += elapsed
+    if event.duty_status == "D":
+        driving_seconds += elapsed
+
+    return on_duty_seconds, driving_seconds
+
+
+def duty_status_at(driver, at):
+    """
+    Duty status of the driver at the given time, None before its history.
+    """
+    event = _event_at(driver, at)
+    return event.duty_status if event else None
+
+
+def duty_totals_between(driver, start, end) -> dict:
+    """
+    On-duty and driving minutes of the driver between two instants.
+    """
+    on_duty_end, driving_end = _duty_seconds_until(driver, end)
+    on_duty_start, driving_start = _duty_seconds_until(driver, start)
+
+    return {
+        "on_duty_minutes": round((on_duty_end - on_duty_start) / 60, 2),
+        "driving_minutes": round((driving_end - driving_start) / 60, 2),
+    }
+
+
+def rolling_duty_totals(driver, at) -> dict:
+    """
+    On-duty minutes of the rolling 7-day and 8-day cycles and the 14-hour
+    window ending at ``at``.
+    """
+    windows = {
+        "cycle_7_day_minutes": timedelta(days=7),
+        "cycle_8_day_minutes": timedelta(days=8),
+        "window_14_hour_minutes": timedelta(hours=14),
+    }
+    on_duty_at, _ = _duty_seconds_until(driver, at)
+
+    totals = {}
+    for name, window in windows.items():
+        on_duty_before, _ = _duty_seconds_until(driver, at - window)
+        totals[name] = round((on_duty_at - on_duty_before) / 60, 2)
+
+    return totals
+
+
+def duty_status_events_between(driver, start, end):
+    """
+    Events of the driver overlapping the given range, in time order.
+    """
+    first = _event_at(driver, start)
+    events = driver.duty_status_events.filter(
+        start_time__gt=start, start_time__lt=end
+    ).order_by("start_time")
+
+    return ([first] if first else []) + list(events)
+
+
+def get_fleet_violations(violation_type=None, truck_type=None):
+    """
+    Read the stored violations of the fleet, optionally filtered.
+
+    :return: list of {driver_id: violations} for drivers with violations
+    """
+    queryset = DriverViolation.objects.order_by("driver_id", "id")
+    if violation_type:
+        queryset = queryset.filter(violation_type=violation_type)
+    if truck_type:
+        queryset = queryset.filter(truck_type=truck_type)
+
+    rows = queryset.values_list(
+        "driver__driver_id", "violation_type", "violation_description"
+    )
+    return [
+        {
+            driver_id: [
+                {"violation_type": type_, "violation_description": description}
+                for _, type_, description in violations
+            ]
+        }
+        for driver_id, violations in groupby(rows, key=itemgetter(0))
+    ]
+
+
+def filter_drivers(duty_status=None, truck_type=None, **headroom):
+    """
+    Drivers matching the given duty status, truck type and headroom bounds.
+
+    Headroom is computed by the database from the DRIVER_HEADROOM
+    expressions, which the Driver expression indexes cover, so a query such
+    as "drive time runs out within the hour" does not scan the table.
+
+    :param headroom: ``min_<name>`` / ``max_<name>`` minutes for each
+        DRIVER_HEADROOM name, e.g. ``max_drive_remaining=60``
+    :return: Driver queryset
+    """
+    queryset = Driver.objects.all()
+    if duty_status:
+        queryset = queryset.filter(duty_status=duty_status)
+    if truck_type:
+        queryset = queryset.filter(truck_type=truck_type)
+
+    for name, expression in DRIVER_HEADROOM.items():
+        minimum = headroom.get(f"min_{name}")
+        maximum = headroom.get(f"max_{name}")
+        if minimum is None and maximum is None:
+            continue
+        queryset = queryset.annotate(**{name: expression})
+        if minimum is not None:
+            queryset = queryset.filter(**{f"{name}__gte": minimum})
+        if maximum is not None:
+            queryset = queryset.filter(**{f"{name}__lte": maximum})
+
+    return queryset
+
+
+def check_hos_compliance(driver):
+    """
+    Evaluates HOS compliance for a given driver based on FMCSA regulations.
+    """
+    row = tuple(getattr(driver, field) for field in HOS_COMPLIANCE_FIELDS)
+    return evaluate_hos_compliance([row])[0]
+
+# Number of distinct trip shapes whose relative plans are memoized.
+SCHEDULE_CACHE_SIZE = 1024
+
+# Origin of relative plans, only ever subtracted back out.
+_SCHEDULE_EPOCH = datetime(2000, 1, 1)
 
-    return violations
 
 def plan_driving_schedule(
     pickup_time,
@@ -225,8 +1182,83 @@ def plan_driving_schedule(
     """
     Plan a driver's driving schedule based on pickup and dropoff times, including sleeper berth provision.
 
+    The plan only depends on the trip duration, loading time and truck type;
+    it is computed relative to the pickup, memoized, and shifted to the
+    actual pickup time.
+
     :return: A driving schedule dict with a detailed plan
     """
+    start_offset, driving_periods, rest_periods, total_driving, total_rest = (
+        _plan_schedule_offsets(dropoff_time - pickup_time, loading_time, truck_type)
+    )
+
+    def periods(offsets):
+        return [
+            {"start": pickup_time + start, "end": pickup_time + end, "hours": hours}
+            for start, end, hours in offsets
+        ]
+
+    return {
+        "start_time": pickup_time + start_offset,
+        "driving_periods": periods(driving_periods),
+        "rest_periods": periods(rest_periods),
+        "total_driving_hours": total_driving,
+        "total_rest_hours": total_rest,
+        "message": "Schedule planned successfully within the given limits.",
+    }
+
+
+def schedule_cache_info() -> dict:
+    """
+    Hit and miss statistics of the memoized schedule plans.
+    """
+    info = _plan_schedule_offsets.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        "size": info.currsize,
+        "max_size": info.maxsize,
+    }
+
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def _plan_schedule_offsets(duration, loading_time, truck_type):
+    """
+    Plan a trip of the given duration relative to its pickup.
+
+    :return: tuple - (start offset, driving periods, rest periods,
+        total driving hours, total rest hours), periods as
+        (start offset, end offset, hours) tuples
+    """
+    schedule = _plan_driving_schedule(
+        _SCHEDULE_EPOCH, _SCHEDULE_EPOCH + duration, loading_time, truck_type
+    )
+
+    def offsets(periods):
+        return tuple(
+            (
+                period["start"] - _SCHEDULE_EPOCH,
+                period["end"] - _SCHEDULE_EPOCH,
+                period["hours"],
+            )
+            for period in periods
+        )
+
+    return (
+        schedule["start_time"] - _SCHEDULE_EPOCH,
+        offsets(schedule["driving_periods"]),
+        offsets(schedule["rest_periods"]),
+        schedule["total_driving_hours"],
+        schedule["total_rest_hours"],
+    )
+
+
+def _plan_driving_schedule(
+    pickup_time,
+    dropoff_time,
+    loading_time: int,
+    truck_type: str = "property",
+):
 
     if truck_type == "property":
         MAX_DRIVING_HOURS = 11
@@ -293,7 +1325,8 @@ def plan_driving_schedule(
         if driving_start_time >= dropoff_time:
             break
     
-    if remaining_drive: # add remaining hours in driving periods
+    # add remaining hours in driving periods, only needed after a rest
+    if remaining_drive and schedule["rest_periods"]:
 
         schedule["driving_periods"].append(
             {
@@ -303,31 +1336,337 @@ def plan_driving_schedule(
             }
         )
 
-    schedule["message"] = "Schedule planned successfully within the given limits."
     return schedule
 
+# Drivers popped from the top of a capacity heap before giving up on a load
+# whose best drivers lack duty or cycle time.
+DISPATCH_MAX_PROBES = 32
+
+DISPATCH_PROBE_LIMIT_REASON = (
+    f"No driver with enough duty and cycle time among the {DISPATCH_MAX_PROBES} "
+    "with the most driving time left"
+)
+
+# Minutes off duty that restore a driver's shift limits.
+DISPATCH_REST_MINUTES = {"property": 10 * 60, "passenger": 8 * 60}
+
+
+def load_shifts(load):
+    """
+    Split the planned trip of a load into shifts at its full rests.
+
+    :param load: dict with pickup_time, dropoff_time, loading_time and
+        truck_type
+    :return: tuple - (list of [drive minutes, duty minutes] per shift, the
+        first one including the loading time; when the driver's rest at the
+        dropoff started, the dropoff itself unless the trip ends resting)
+    """
+    pickup_time, dropoff_time = load["pickup_time"], load["dropoff_time"]
+    schedule = plan_driving_schedule(
+        pickup_time, dropoff_time, load["loading_time"], load["truck_type"]
+    )
+    rest_minutes = DISPATCH_REST_MINUTES[load["truck_type"]]
+
+    periods = [(period, True) for period in schedule["driving_periods"]] + [
+        (period, False) for period in schedule["rest_periods"]
+    ]
+    periods.sort(key=lambda item: (item[0]["start"], item[1]))
+
+    shifts = [[0, load["loading_time"]]]
+    rest_from = dropoff_time
+    for period, driving in periods:
+        end = min(period["end"], dropoff_time)
+        minutes = (end - period["start"]).total_seconds() / 60
+        if minutes <= 0:
+            continue
+        if driving:
+            shifts[-1][0] += minutes
+            shifts[-1][1] += minutes
+            rest_from = dropoff_time
+            continue
+        if minutes >= rest_minutes:
+            shifts.append([0, 0])
+        if end == dropoff_time:
+            rest_from = period["start"]
+
+    return shifts, rest_from
+
+
+def assign_loads(loads, drivers):
+    """
+    Greedily assign loads to drivers within their remaining HOS capacity.
+
+    Loads are taken in pickup order. Drivers on a load wait in a heap keyed by
+    when they are free again, and free drivers sit in a max-heap per truck
+    type keyed by remaining drive and then duty/cycle minutes, so each load
+    goes to the driver with the most headroom in O(log n).
+
+    A load's trip is planned with plan_driving_schedule and only its first
+    shift, up to the first full rest, has to fit the driver's remaining drive
+    and duty minutes; the whole trip's on-duty time has to fit the cycle. A
+    driver whose trip included a full rest, or who was off for a full rest
+    between two loads, gets their shift limits back.
+
+    Drivers short of duty or cycle time are skipped, but at most
+    DISPATCH_MAX_PROBES of them per load. A load is then reported with
+    DISPATCH_PROBE_LIMIT_REASON even though a driver further down the heap
+    might have taken it, while "Not enough remaining duty or cycle time"
+    means every driver with enough driving time was checked.
+
+    :param loads: list of dicts with id, pickup_time, dropoff_time,
+        loading_time and truck_type
+    :param drivers: list of (truck_type, remaining drive minutes,
+        remaining duty minutes, remaining cycle minutes, shift drive limit,
+        shift duty limit)
+    :return: tuple - (dict of driver index -> assigned loads,
+        list of (load, reason) for loads that could not be assigned)
+    """
+    remaining_drive = [max(driver[1], 0) for driver in drivers]
+    remaining_duty = [max(driver[2], 0) for driver in drivers]
+    remaining_cycle = [max(driver[3], 0) for driver in drivers]
+    # Bumped whenever a driver's headroom or availability changes, so heap
+    # entries pushed before that are skipped when they surface.
+    versions = [0] * len(drivers)
+
+    def capacity_key(i):
+        return (
+            -remaining_drive[i],
+            -min(remaining_duty[i], remaining_cycle[i]),
+            i,
+            versions[i],
+        )
+
+    def is_current(entry):
+        return entry[3] == versions[entry[2]]
+
+    def rested(i):
+        remaining_drive[i] = max(drivers[i][4], 0)
+        remaining_duty[i] = max(drivers[i][5], 0)
+        versions[i] += 1
+
+    free = defaultdict(list)
+    for i, driver in enumerate(drivers):
+        free[driver[0]].append(capacity_key(i))
+    for heap in free.values():
+        heapq.heapify(heap)
+
+    busy = []  # (available_at, driver index, rest started at)
+    resting = []  # (rested at, driver index, version)
+    assignments = defaultdict(list)
+    unassigned = []
+
+    for load in sorted(loads, key=itemgetter("pickup_time")):
+        pickup_time = load["pickup_time"]
+        while busy and busy[0][0] <= pickup_time:
+            _, i, rest_from = heapq.heappop(busy)
+            rested_at = rest_from + timedelta(
+                minutes=DISPATCH_REST_MINUTES[drivers[i][0]]
+            )
+            if rested_at <= pickup_time:
+                rested(i)
+            else:
+                heapq.heappush(resting, (rested_at, i, versions[i]))
+            heapq.heappush(free[drivers[i][0]], capacity_key(i))
+        while resting and resting[0][0] <= pickup_time:
+            _, i, version = heapq.heappop(resting)
+            if version == versions[i]:
+                rested(i)
+                heapq.heappush(free[drivers[i][0]], capacity_key(i))
+
+        shifts, rest_from = load_shifts(load)
+        drive_needed, duty_needed = shifts[0]
+        cycle_needed = sum(duty for _, duty in shifts)
+
+        heap = free[load["truck_type"]]
+        while heap and not is_current(heap[0]):
+            heapq.heappop(heap)
+        if not heap:
+            unassigned.append((load, "No available driver"))
+            continue
+        if remaining_drive[heap[0][2]] < drive_needed:
+            unassigned.append((load, "Not enough remaining driving time"))
+            continue
+
+        probed = []
+        chosen = None
+        searched = False
+        while heap and len(probed) < DISPATCH_MAX_PROBES:
+            entry = heapq.heappop(heap)
+            if not is_current(entry):
+                continue
+            i = entry[2]
+            if remaining_drive[i] < drive_needed:
+                probed.append(i)
+                searched = True
+                break
+            if remaining_duty[i] >= duty_needed and remaining_cycle[i] >= cycle_needed:
+                chosen = i
+                break
+            probed.append(i)
+        else:
+            searched = not heap
+        for i in probed:
+            heapq.heappush(heap, capacity_key(i))
+
+        if chosen is None:
+            if searched:
+                unassigned.append((load, "Not enough remaining duty or cycle time"))
+            else:
+                unassigned.append((load, DISPATCH_PROBE_LIMIT_REASON))
+            continue
+
+        if len(shifts) > 1:
+            # Rested on the way, only the last shift counts against the limits.
+            remaining_drive[chosen] = max(drivers[chosen][4], 0) - shifts[-1][0]
+            remaining_duty[chosen] = max(drivers[chosen][5], 0) - shifts[-1][1]
+        else:
+            remaining_drive[chosen] -= drive_needed
+            remaining_duty[chosen] -= duty_needed
+        remaining_cycle[chosen] -= cycle_needed
+        versions[chosen] += 1
+        assignments[chosen].append(load)
+        heapq.heappush(busy, (load["dropoff_time"], chosen, rest_from))
+
+    return assignments, unassigned
+
+
+def plan_fleet_dispatch(loads) -> dict:
+    """
+    Assign a batch of loads to drivers and plan each assigned trip.
+
+    :param loads: list of dicts with id, pickup_time, dropoff_time,
+        loading_time and truck_type
+    :return: dict with per-driver schedules and the unassigned loads, each
+        with the reason from assign_loads
+    """
+    rows = list(
+        Driver.objects.values_list(
+            "driver_id",
+            "truck_type",
+            "shift_drive_minutes",
+            "max_shift_drive_minutes",
+            "shift_work_minutes",
+            "max_shift_work_minutes",
+            "cycle_work_minutes",
+            "max_cycle_work_minutes",
+        )
+    )
+    drivers = [
+        (
+            truck_type,
+            max_drive - drive,
+            max_work - work,
+            max_cycle - cycle,
+            max_drive,
+            max_work,
+        )
+        for _, truck_type, drive, max_drive, work, max_work, cycle, max_cycle in rows
+    ]
+    assignments, unassigned = assign_loads(loads, drivers)
+
+    return {
+        "assignments": [
+            {
+                "driver_id": rows[i][0],
+                "loads": [
+                    {
+                        "load_id": load["id"],
+                        "schedule": plan_driving_schedule(
+                            load["pickup_time"],
+                            load["dropoff_time"],
+                            load["loading_time"],
+                            load["truck_type"],
+                        ),
+                    }
+                    for load in driver_loads
+                ],
+            }
+            for i, driver_loads in sorted(assignments.items())
+        ],
+        "unassigned": [
+            {"load_id": load["id"], "reason": reason} for load, reason in unassigned
+        ],
+    }
+
+
+def parse_timestamp(value):
+    """
+    Parse a duty status timestamp, taking the fast ``datetime.fromisoformat``
+    path for ISO-8601 strings and falling back to dateutil for anything else.
+    Datetimes are returned unchanged.
+    """
+    if isinstance(value, datetime):
+        return value
+
+    try:
+        if value.endswith(("Z", "z")):  # fromisoformat only accepts Z from 3.11
+            return datetime.fromisoformat(value[:-1] + "+00:00")
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return parser.parse(value)
+
+
+DRIVING_STATUSES = ("driving", "D")
+REST_STATUSES = ("off_duty", "sleeper_berth", "SB", "OFF")
+
+
 def check_hos_violation(
     pickup_time, dropoff_time, duty_statuses, truck_type="property"
 ):
     """
     Checks for HOS violations based on given duty statuses.
 
+    The log is walked once, parsing each timestamp once and keeping running
+    totals, so cumulative rules are caught in linear time:
+
+    - property: 8 hours of driving without a 30-minute non-driving break
+    - 11/10 hours of driving since the last full rest
+    - driving past the 14-hour window (property) or after 15 hours on duty
+      (passenger) since the last full rest
+    - driving again after a limit was reached and only a short rest was
+      taken instead of 10 (property) or 8 (passenger) consecutive hours off
+      duty
+
+    Time between two entries counts as off duty.
+
     :return: tuple - (violation, corrected_schedule)
     """
 
     if truck_type == "property":
         MAX_DRIVING_HOURS = 11
         REST_HOURS = 10
+        WINDOW_HOURS = 14
     else:  # Passenger
         MAX_DRIVING_HOURS = 10
         REST_HOURS = 8
+        WINDOW_HOURS = 15
+
+    max_driving = MAX_DRIVING_HOURS * 3600
+    rest_required = REST_HOURS * 3600
+    window = WINDOW_HOURS * 3600
+    break_after = 8 * 3600
+    break_required = 30 * 60
 
-    violation = False
     corrected_schedule = []
 
+    # Running totals since the last 30-minute break / last full rest
+    drive_since_break = 0
+    drive_since_rest = 0
+    on_duty_since_rest = 0
+    driving_run_start = None
+    window_start = None
+    non_driving_run = 0
+    rest_run = 0
+    rest_start = None
+    needs_rest = False
+    short_rest = None
+    break_flagged = drive_flagged = window_flagged = rest_flagged = False
+
+    previous_end = None
+
     for i, duty_status in enumerate(duty_statuses):
-        start_time = parser.parse(duty_status["start_time"])
-        end_time = parser.parse(duty_status["end_time"])
+        start_time = parse_timestamp(duty_status["start_time"])
+        end_time = parse_timestamp(duty_status["end_time"])
 
         if end_time < start_time:
             raise Exception(f"Invalid time interval {start_time} - {end_time}")
@@ -338,42 +1677,205 @@ def check_hos_violation(
                     f"Invalid start_time {start_time} : start_time must be equal or greater than pickup_time"
                 )
         else:
-            if start_time < parser.parse(duty_statuses[i - 1]["end_time"]):
+            if start_time < previous_end:
                 raise Exception(
                     f"Invalid start_time {start_time} : start_time must be equal or greater than end_time of previous status"
                 )
 
         status = duty_status["status"]
-        duration = (end_time - start_time).total_seconds() / 3600
+        duration = (end_time - start_time).total_seconds()
 
-        if truck_type == "property" and duration > 8:
-            violation = True
-            corrected_schedule.append(
-                {
-                    "suggestion": f"Driver Drove more than 8 cumulative hours without taking 30 minutes break in between {start_time} - {end_time}. Recommended to take 30 minute break",
-                }
-            )
+        # Rest covers both logged off-duty statuses and gaps between entries.
+        rest = 0
+        if previous_end is not None and start_time > previous_end:
+            rest = (start_time - previous_end).total_seconds()
+            if rest_run == 0:
+                rest_start = previous_end
+        if status in REST_STATUSES:
+            if rest_run == 0 and rest == 0:
+                rest_start = start_time
+            rest += duration
+
+        previous_end = end_time
+
+        if rest:
+            rest_run += rest
+            non_driving_run += rest
+            if non_driving_run >= break_required:
+                drive_since_break = 0
+                break_flagged = False
+            if rest_run >= rest_required:
+                drive_since_rest = 0
+                on_duty_since_rest = 0
+                window_start = None
+                needs_rest = False
+                short_rest = None
+                drive_flagged = window_flagged = rest_flagged = False
 
-        if status in ("driving", "D") and duration > MAX_DRIVING_HOURS:
-            violation = True
+        if status in REST_STATUSES:
+            continue
+
+        # Back on duty: remember a short rest taken after reaching a limit,
+        # it is only a violation once the driver drives again.
+        if rest_run and needs_rest:
+            short_rest = (rest_start, start_time, rest_run)
+        rest_run = 0
+
+        if window_start is None:
+            window_start = start_time
+        on_duty_since_rest += duration
+
+        if status not in DRIVING_STATUSES:
+            non_driving_run += duration
+            if non_driving_run >= break_required:
+                drive_since_break = 0
+                break_flagged = False
+            continue
+
+        if needs_rest and short_rest and not rest_flagged:
+            rest_flagged = True
+            rest_from, rest_until, rested = short_rest
             corrected_schedule.append(
                 {
-                    "suggestion": f"Exceeded driving limit between {start_time} - {end_time}. Recommend rest for {REST_HOURS} hours.",
+                    "suggestion": f"Insufficient rest between {rest_from} - {rest_until}. Increase rest time to {int(REST_HOURS - rested / 3600)} hours.",
                 }
             )
 
+        if drive_since_break == 0:
+            driving_run_start = start_time
+        non_driving_run = 0
+        drive_since_break += duration
+        drive_since_rest += duration
+
         if (
-            status in ("off_duty", "sleeper_berth", "SB", "OFF")
-            and duration < REST_HOURS
+            truck_type == "property"
+            and drive_since_break > break_after
+            and not break_flagged
         ):
-            violation = True
+            break_flagged = True
             corrected_schedule.append(
                 {
-                    "suggestion": f"Insufficient rest between {start_time} - {end_time}. Increase rest time to {int(REST_HOURS - duration)} hours.",
+                    "suggestion": f"Driver Drove more than 8 cumulative hours without taking 30 minutes break in between {driving_run_start} - {end_time}. Recommended to take 30 minute break",
                 }
             )
 
+        if drive_since_rest >= max_driving:
+            needs_rest = True
+            if drive_since_rest > max_driving and not drive_flagged:
+                drive_flagged = True
+                corrected_schedule.append(
+                    {
+                        "suggestion": f"Exceeded driving limit between {start_time} - {end_time}. Recommend rest for {REST_HOURS} hours.",
+                    }
+                )
+
+        if truck_type == "property":
+            on_duty_time = (end_time - window_start).total_seconds()
+        else:
+            on_duty_time = on_duty_since_rest
+
+        if on_duty_time >= window:
+            needs_rest = True
+            if on_duty_time > window and not window_flagged:
+                window_flagged = True
+                corrected_schedule.append(
+                    {
+                        "suggestion": f"Drove beyond the {WINDOW_HOURS}-hour on-duty limit between {start_time} - {end_time}. Recommend rest for {REST_HOURS} hours.",
+                    }
+                )
+
+    violation = bool(corrected_schedule)
     if not violation:
         corrected_schedule.append({"suggestion": "No violations detected."})
 
     return violation, corrected_schedule
+
+
+# Batches smaller than this are checked inline, the process pool only pays
+# off once the pickling overhead is spread over enough logs.
+HOS_BATCH_POOL_THRESHOLD = 64
+
+_hos_pool = None
+_hos_pool_lock = threading.Lock()
+
+
+def _hos_pool_workers():
+    return settings.HOS_BATCH_WORKERS or os.cpu_count() or 1
+
+
+def _get_hos_pool():
+    global _hos_pool
+    with _hos_pool_lock:
+        if _hos_pool is None:
+            # Workers set Django up themselves so any start method works.
+            _hos_pool = ProcessPoolExecutor(
+                max_workers=_hos_pool_workers(), initializer=django.setup
+            )
+        return _hos_pool
+
+
+def _discard_hos_pool(pool):
+    global _hos_pool
+    with _hos_pool_lock:
+        if _hos_pool is pool:
+            _hos_pool = None
+    pool.shutdown(wait=False)
+
+
+def _reset_hos_pool():
+    # The pool's worker processes belong to the parent.
+    global _hos_pool, _hos_pool_lock
+    _hos_pool = None
+    _hos_pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_hos_pool)
+
+
+def _check_hos_violation_item(serializer_class, item):
+    """
+    Validate one raw batch item and check it.
+
+    :return: (id, result) for a valid item, (None, serializer errors) for an
+        invalid one
+    """
+    serializer = serializer_class(data=item)
+    if not serializer.is_valid():
+        return None, serializer.errors
+
+    data = dict(serializer.validated_data)
+    item_id = data.pop("id")
+    try:
+        violation, corrected_schedule = check_hos_violation(**data)
+    except Exception as ex:
+        return item_id, {"error": str(ex)}
+    return item_id, {"violation": violation, "corrected_schedule": corrected_schedule}
+
+
+def check_hos_violations_batch(items, serializer_class) -> list:
+    """
+    Validate and check many raw duty status logs, in parallel on a process
+    pool for large batches. Items are validated in the workers as well, so
+    the request process only pickles the raw items.
+
+    :param items: list of raw batch items
+    :param serializer_class: serializer validating an item into an ``id`` and
+        check_hos_violation keyword arguments
+    :return: list with (id, result) for each valid item and (None, errors)
+        for each invalid one, in the order of items
+    """
+    check = partial(_check_hos_violation_item, serializer_class)
+    if len(items) < HOS_BATCH_POOL_THRESHOLD:
+        return [check(item) for item in items]
+
+    chunksize = max(1, len(items) // (_hos_pool_workers() * 4))
+    for attempt in range(2):
+        pool = _get_hos_pool()
+        try:
+            return list(pool.map(check, items, chunksize=chunksize))
+        except BrokenProcessPool:
+            # A worker died, start a fresh pool and retry the batch once.
+            _discard_hos_pool(pool)
+            if attempt:
+                raise
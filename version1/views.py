@@ -1,24 +1,51 @@
+from datetime import timedelta
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from version1.models import Truck, Driver
+from rest_framework.exceptions import ValidationError
+from version1.models import Truck, Driver, SyncJob
 from version1.serializers import (
     TruckSerializer,
     DriverSerializer,
+    DriverFilterSerializer,
+    NearbyTrucksSerializer,
+    BoundingBoxSerializer,
+    TrackRequestSerializer,
+    SyncJobSerializer,
     ScheduleRequestSerializer,
+    DispatchRequestSerializer,
     DutyStatusSerializer,
+    BatchDutyStatusSerializer,
+    DutyStatusEventSerializer,
+    DutyHistoryRequestSerializer,
 )
+from version1.caching import SyncGenerationCacheMixin
+from version1.jobs import enqueue_sync
+from version1.pagination import list_response, snapshot_list_response
+from version1.spatial import get_truck_index
 from version1.utils import (
-    check_hos_compliance,
+    filter_drivers,
+    get_fleet_violations,
     plan_driving_schedule,
-    db_update_drivers,
-    db_update_trucks,
-    check_hos_violation
+    plan_fleet_dispatch,
+    schedule_cache_info,
+    check_hos_violation,
+    check_hos_violations_batch,
+    duty_status_at,
+    duty_status_events_between,
+    duty_totals_between,
+    rolling_duty_totals,
+    truck_track,
 )
 
 
-class TruckViewSet(APIView):
+class TruckViewSet(SyncGenerationCacheMixin, APIView):
+    use_fleet_snapshot = True
+
     def get(self, request, truck_id=None):
+        if self.snapshot is not None:
+            return self.get_from_snapshot(request, truck_id)
         if truck_id:
             try:
                 truckObj = Truck.objects.get(name=truck_id)
@@ -30,13 +57,80 @@ class TruckViewSet(APIView):
                 serializer = TruckSerializer(truckObj)
                 return Response(serializer.data, status=status.HTTP_200_OK)
         else:
-            trucks = Truck.objects.all()
-            serializer = TruckSerializer(trucks, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return list_response(request, Truck.objects.all(), TruckSerializer)
+
+    def get_from_snapshot(self, request, truck_id=None):
+        trucks = self.snapshot.trucks
+        if truck_id:
+            index = trucks.find(truck_id)
+            if index is None:
+                return Response(
+                    {"error": "Truck not found"}, status=status.HTTP_404_NOT_FOUND
+                )
+            return Response(trucks.row(index), status=status.HTTP_200_OK)
+        return snapshot_list_response(request, trucks)
+
+
+class TruckTrackView(APIView):
+    def get(self, request, truck_name):
+        try:
+            truckObj = Truck.objects.get(name=truck_name)
+        except Truck.DoesNotExist:
+            return Response(
+                {"error": "Truck not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        serializer = TrackRequestSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+        end = serializer.validated_data.get("end") or timezone.now()
+        start = serializer.validated_data.get("start") or end - timedelta(days=1)
+        if start > end:
+            return Response(
+                {"error": "start must not be after end"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        track = truck_track(
+            truckObj, start, end, serializer.validated_data["points"]
+        )
+        return Response(
+            {"truck": truckObj.name, "start": start, "end": end, **track},
+            status=status.HTTP_200_OK,
+        )
+
+
+class NearbyTrucksView(APIView):
+    def get(self, request):
+        serializer = NearbyTrucksSerializer(data=request.query_params)
+        if serializer.is_valid():
+            trucks = get_truck_index().nearest(**serializer.validated_data)
+            return Response(trucks, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class TrucksWithinView(APIView):
+    def get(self, request):
+        serializer = BoundingBoxSerializer(data=request.query_params)
+        if serializer.is_valid():
+            trucks = get_truck_index().within(**serializer.validated_data)
+            return Response(trucks, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class DriverViewSet(SyncGenerationCacheMixin, APIView):
+    use_fleet_snapshot = True
+
+    def wants_fleet_snapshot(self, request) -> bool:
+        # Filtered lists are answered by the database and its indexes, blank
+        # parameters are ignored like DriverFilterSerializer ignores them.
+        fields = DriverFilterSerializer().fields
+        return not any(request.GET.get(name) for name in fields)
 
-class DriverViewSet(APIView):
     def get(self, request, driver_id=None):
+        if self.snapshot is not None:
+            return self.get_from_snapshot(request, driver_id)
         if driver_id:
             try:
                 driverObj = Driver.objects.get(driver_id=driver_id)
@@ -48,14 +142,67 @@ class DriverViewSet(APIView):
                 serializer = DriverSerializer(driverObj)
                 return Response(serializer.data, status=status.HTTP_200_OK)
         else:
-            drivers = Driver.objects.all()
-            serializer = DriverSerializer(drivers, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            filters = DriverFilterSerializer(data=request.query_params)
+            if not filters.is_valid():
+                return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+            return list_response(
+                request, filter_drivers(**filters.validated_data), DriverSerializer
+            )
+
+    def get_from_snapshot(self, request, driver_id=None):
+        drivers = self.snapshot.drivers
+        if driver_id:
+            index = drivers.find(driver_id)
+            if index is None:
+                return Response(
+                    {"error": "Driver not found"}, status=status.HTTP_404_NOT_FOUND
+                )
+            return Response(drivers.row(index), status=status.HTTP_200_OK)
+        return snapshot_list_response(request, drivers)
+
 
+class DriverDutyStatusView(APIView):
+    def get(self, request, driver_id):
+        try:
+            driverObj = Driver.objects.get(driver_id=driver_id)
+        except Driver.DoesNotExist:
+            return Response(
+                {"error": "Driver not found"}, status=status.HTTP_404_NOT_FOUND
+            )
 
-class DriverViolationView(APIView):
+        serializer = DutyHistoryRequestSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        end = serializer.validated_data.get("end") or timezone.now()
+        start = serializer.validated_data.get("start") or end - timedelta(days=8)
+        if start > end:
+            return Response(
+                {"error": "start must not be after end"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        events = duty_status_events_between(driverObj, start, end)
+        return Response(
+            {
+                "driver_id": driverObj.driver_id,
+                "start": start,
+                "end": end,
+                "duty_status": duty_status_at(driverObj, end),
+                **duty_totals_between(driverObj, start, end),
+                "rolling": rolling_duty_totals(driverObj, end),
+                "events": DutyStatusEventSerializer(events, many=True).data,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class DriverViolationView(SyncGenerationCacheMixin, APIView):
+    use_fleet_snapshot = True
 
     def get(self, request, driver_id=None):
+        if self.snapshot is not None:
+            return self.get_from_snapshot(request, driver_id)
         if driver_id:
             try:
                 driverObj = Driver.objects.get(driver_id=driver_id)
@@ -64,21 +211,33 @@ class DriverViolationView(APIView):
                     {"error": "Driver not found"}, status=status.HTTP_404_NOT_FOUND
                 )
             else:
-                violations = check_hos_compliance(driver=driverObj)
-                return Response(violations, status=status.HTTP_200_OK)
+                violations = driverObj.violations.order_by("id").values(
+                    "violation_type", "violation_description"
+                )
+                return Response(list(violations), status=status.HTTP_200_OK)
         else:
-            driverList = Driver.objects.all()
-            violation_list = []
-            for driver in driverList:
-                violation = check_hos_compliance(driver=driver)
-                if violation:
-                    violationDict = {
-                        driver.driver_id : violation
-                    }
-                    violation_list.append(violationDict)
-
+            violation_list = get_fleet_violations(
+                violation_type=request.query_params.get("violation_type"),
+                truck_type=request.query_params.get("truck_type"),
+            )
             return Response(violation_list, status=status.HTTP_200_OK)
 
+    def get_from_snapshot(self, request, driver_id=None):
+        if driver_id:
+            index = self.snapshot.drivers.find(driver_id)
+            if index is None:
+                return Response(
+                    {"error": "Driver not found"}, status=status.HTTP_404_NOT_FOUND
+                )
+            return Response(
+                self.snapshot.driver_violations(index), status=status.HTTP_200_OK
+            )
+        violation_list = self.snapshot.fleet_violations(
+            violation_type=request.query_params.get("violation_type"),
+            truck_type=request.query_params.get("truck_type"),
+        )
+        return Response(violation_list, status=status.HTTP_200_OK)
+
     def post(self, request, driver_id=None):
 
         if driver_id:
@@ -101,7 +260,61 @@ class DriverViolationView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class DriverViolationBatchView(APIView):
+    MAX_BATCH_SIZE = 10000
+
+    def post(self, request):
+        """
+        Check a list of duty status logs, each with a client supplied ``id``.
+        Results are keyed by id, invalid items with a usable id get their
+        errors there too, and items without one are reported in ``errors``
+        by position. An id used more than once gets a "Duplicate id" error.
+        """
+        if not isinstance(request.data, list):
+            return Response(
+                {"error": "Expected a list of duty status logs"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(request.data) > self.MAX_BATCH_SIZE:
+            return Response(
+                {"error": f"A batch can hold at most {self.MAX_BATCH_SIZE} logs"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results = {}
+        errors = []
+        duplicate_ids = set()
+        id_field = BatchDutyStatusSerializer().fields["id"]
+        checked = check_hos_violations_batch(request.data, BatchDutyStatusSerializer)
+
+        for index, (item, (item_id, result)) in enumerate(zip(request.data, checked)):
+            if item_id is None:
+                result = {"error": result}
+                try:
+                    item_id = id_field.run_validation(
+                        item.get("id") if isinstance(item, dict) else None
+                    )
+                except ValidationError:
+                    errors.append({"index": index, **result})
+                    continue
+
+            if item_id in results:
+                duplicate_ids.add(item_id)
+                continue
+            results[item_id] = result
+
+        for item_id in duplicate_ids:
+            results[item_id] = {"error": "Duplicate id"}
+
+        return Response(
+            {"results": results, "errors": errors}, status=status.HTTP_200_OK
+        )
+
+
 class ScheduleView(APIView):
+    def get(self, request):
+        return Response({"cache": schedule_cache_info()}, status=status.HTTP_200_OK)
+
     def post(self, request):
         serializer = ScheduleRequestSerializer(data=request.data)
         if serializer.is_valid():
@@ -111,46 +324,36 @@ class ScheduleView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class DispatchView(APIView):
+    def post(self, request):
+        serializer = DispatchRequestSerializer(data=request.data)
+        if serializer.is_valid():
+            loads = serializer.validated_data["loads"]
+            return Response(plan_fleet_dispatch(loads), status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 class UpdateDbView(APIView):
     def get(self, request, model=None):
         if model not in ["drivers", "trucks", "all"]:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
-        if model == "drivers":
-            updated = db_update_drivers()
-            if updated:
-                return Response(
-                    {"message": "Drivers successfully updated in database"},
-                    status=status.HTTP_200_OK,
-                )
-            else:
-                return Response(
-                    {"message": "Not able to update drivers in database"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                )
-        elif model == "trucks":
-            updated = db_update_trucks()
-            if updated:
-                return Response(
-                    {"message": "Trucks successfully updated in database"},
-                    status=status.HTTP_200_OK,
-                )
-            else:
-                return Response(
-                    {"message": "Not able to update trucks in database"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                )
-        else:
-            updated_trucks = db_update_trucks()
-            updated_drivers = db_update_drivers()
-            if updated_drivers and updated_trucks:
-                return Response(
-                    {"message": "Drivers and Trucks successfully updated in database"},
-                    status=status.HTTP_200_OK,
-                )
-            else:
-                return Response(
-                    {"message": "Not able to update drivers/trucks in database"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                )
+        job, created = enqueue_sync(model)
+        return Response(
+            {
+                "message": "Sync queued" if created else "Sync already in progress",
+                **SyncJobSerializer(job).data,
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
 
+class SyncJobView(APIView):
+    def get(self, request, job_id):
+        try:
+            job = SyncJob.objects.get(job_id=job_id)
+        except SyncJob.DoesNotExist:
+            return Response(
+                {"error": "Sync job not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(SyncJobSerializer(job).data, status=status.HTTP_200_OK)